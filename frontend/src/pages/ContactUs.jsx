@@ -24,6 +24,7 @@ export default function ContactUs() {
       const res = await api('/api/contactus', { method: 'POST', body: JSON.stringify(form) })
       if (res && typeof res.email_sent !== 'undefined') {
         if (res.email_sent) setSendStatus({ ok: true, msg: 'Your message was sent successfully.' })
+        else if (res.email_status === 'pending') setSendStatus({ ok: true, msg: 'Your message was received and will be emailed shortly.' })
         else setSendStatus({ ok: false, msg: 'Message saved, but email delivery failed.' })
       } else {
         setSendStatus({ ok: true, msg: 'Your message was sent.' })
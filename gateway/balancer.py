@@ -0,0 +1,134 @@
+"""Upstream replica selection for the gateway.
+
+Each service has a pool of endpoints (base URLs). A request goes to the endpoint with
+the fewest outstanding requests (``least``), or to the less busy of two random ones
+(``p2c``, power of two choices). Endpoints leave the rotation when they fail
+repeatedly (passive check) or fail their /livez probe (active check), and come back
+after ``eject_sec`` or on their next passing probe. If every endpoint is out, all of
+them are used rather than failing every request.
+"""
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+from prometheus_client import Gauge
+
+logger = logging.getLogger("gateway.balancer")
+
+ENDPOINT_UP = Gauge("gateway_endpoint_up", "Whether an upstream endpoint is in rotation", ["service", "endpoint"])
+
+class Endpoint:
+    def __init__(self, service: str, url: str):
+        self.service = service
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.failures = 0  # consecutive
+        self.ejected_until = 0.0
+        self.probe_ok = True
+        self.probed = False  # whether an active /livez probe has reported on it yet
+        ENDPOINT_UP.labels(service, self.url).set_function(lambda: int(self.available(time.monotonic())))
+
+    def available(self, now: float) -> bool:
+        return self.probe_ok and self.ejected_until <= now
+
+    def stats(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "available": self.available(now),
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "probe_ok": self.probe_ok,
+            "ejected_for": max(0.0, round(self.ejected_until - now, 3)),
+        }
+
+class UpstreamPool:
+    def __init__(self, service: str, urls: Iterable[str], policy: str, eject_after: int, eject_sec: float):
+        if policy not in {"least", "p2c"}:
+            raise RuntimeError(f"Unknown load balancing policy: {policy}")
+        self.service = service
+        self.policy = policy
+        self.eject_after = eject_after
+        self.eject_sec = eject_sec
+        self.endpoints: List[Endpoint] = []
+        self.set_urls(urls)
+
+    def set_urls(self, urls: Iterable[str]) -> None:
+        """Replace the endpoint list, keeping the state of endpoints that are still listed."""
+        current = {e.url: e for e in self.endpoints}
+        endpoints = []
+        for url in urls:
+            url = url.strip().rstrip("/")
+            if url and url not in {e.url for e in endpoints}:
+                endpoints.append(current.pop(url, None) or Endpoint(self.service, url))
+        if not endpoints:
+            raise RuntimeError(f"No upstream endpoints for {self.service}")
+        for gone in current.values():
+            ENDPOINT_UP.remove(self.service, gone.url)
+        self.endpoints = endpoints
+
+    def available(self) -> List[Endpoint]:
+        now = time.monotonic()
+        return [e for e in self.endpoints if e.available(now)]
+
+    def pick(self, exclude: Optional[Endpoint] = None) -> Endpoint:
+        candidates = self.available() or list(self.endpoints)
+        if exclude is not None and len(candidates) > 1:
+            candidates = [e for e in candidates if e is not exclude]
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.policy == "p2c":
+            candidates = random.sample(candidates, 2)
+        fewest = min(e.outstanding for e in candidates)
+        return random.choice([e for e in candidates if e.outstanding == fewest])
+
+    def record(self, endpoint: Endpoint, ok: bool) -> None:
+        if ok:
+            endpoint.failures = 0
+            return
+        endpoint.failures += 1
+        if endpoint.failures >= self.eject_after and endpoint.ejected_until <= time.monotonic():
+            endpoint.ejected_until = time.monotonic() + self.eject_sec
+            logger.warning("ejected %s endpoint %s after %d failures", self.service, endpoint.url, endpoint.failures)
+
+    def record_probe(self, endpoint: Endpoint, ok: bool) -> None:
+        was_available = endpoint.available(time.monotonic())
+        endpoint.probe_ok = ok
+        endpoint.probed = True
+        if ok:
+            # A passing probe also ends a passive ejection early
+            endpoint.failures = 0
+            endpoint.ejected_until = 0.0
+        if ok and not was_available:
+            logger.info("restored %s endpoint %s", self.service, endpoint.url)
+        elif not ok and was_available:
+            logger.warning("%s endpoint %s failed its health check", self.service, endpoint.url)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {"policy": self.policy, "endpoints": [e.stats(now) for e in self.endpoints]}
+
+def split_urls(raw: str) -> List[str]:
+    return [u.strip() for u in raw.split(",") if u.strip()]
+
+class EndpointFile:
+    """JSON file mapping service -> list of base URLs (or a comma-separated string), re-read when it changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+
+    def changed(self) -> Optional[Dict[str, List[str]]]:
+        """The file's endpoint lists if it was modified since the last call, else None."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+        if mtime == self._mtime:
+            return None
+        with open(self.path, encoding="utf-8") as f:
+            raw = json.load(f)
+        self._mtime = mtime
+        return {service: split_urls(urls) if isinstance(urls, str) else list(urls) for service, urls in raw.items()}
@@ -1,10 +1,30 @@
+import asyncio
+import logging
 import os
+import hashlib
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from typing import Dict
 from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 import jwt
+from prometheus_client import Counter, Histogram
 
+from balancer import EndpointFile, UpstreamPool, split_urls
+from compression import CompressionMiddleware
+from health import READY_CHECK_TIMEOUT, setup_health
+from metrics import LATENCY_BUCKETS, instrument
+from ratelimit import MemoryBuckets, RedisBuckets, match_rule, parse_rules, retry_after
+from resilience import CircuitBreaker, CircuitOpenError, LatencyWindow, backoff
+from tracing import client_span, setup_tracing
+
+logger = logging.getLogger("gateway")
+
+# Each entry is a base URL or a comma-separated list of replica base URLs
 SERVICE_MAP: Dict[str, str] = {
     "appointments": os.getenv("APPOINTMENTS_URL", "http://localhost:8101"),
     "payments": os.getenv("PAYMENTS_URL", "http://localhost:8102"),
@@ -28,7 +48,329 @@ DEFAULT_ROOT_TAIL: Dict[str, str] = {
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 JWT_ALGO = "HS256"
 
-app = FastAPI(title="Gateway")
+# Verified-token cache: skip signature checks for tokens we already verified
+JWT_CACHE_SIZE = int(os.getenv("GATEWAY_JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_MAX_TTL = float(os.getenv("GATEWAY_JWT_CACHE_MAX_TTL", "3600"))
+
+# Upstream connection pooling: one long-lived client per service in SERVICE_MAP
+UPSTREAM_TIMEOUT = float(os.getenv("GATEWAY_UPSTREAM_TIMEOUT", "30.0"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("GATEWAY_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("GATEWAY_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_KEEPALIVE_EXPIRY", "30.0"))
+UPSTREAM_HTTP2 = os.getenv("GATEWAY_HTTP2", "false").lower() in {"1", "true", "yes"}
+
+# Streaming proxy: pipe request/response bodies through in chunks instead of buffering them
+STREAM_PROXY = os.getenv("GATEWAY_STREAMING", "true").lower() in {"1", "true", "yes"}
+STREAM_CHUNK_SIZE = int(os.getenv("GATEWAY_STREAM_CHUNK_SIZE", str(64 * 1024)))
+
+_HOP_HEADERS = {"content-encoding", "transfer-encoding", "connection", "keep-alive"}
+_MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+_IDEMPOTENT_METHODS = {"GET", "HEAD"}
+# Upstream answers that mean "not available right now": retried, and counted as breaker failures
+_UNAVAILABLE_STATUSES = {502, 503, 504}
+
+def _parse_service_map(raw: str) -> Dict[str, str]:
+    # "services=60,appointments=5" -> {"services": "60", "appointments": "5"}
+    out: Dict[str, str] = {}
+    for part in raw.split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = v.strip()
+    return out
+
+# Response cache for idempotent GETs, per-service TTL in seconds (0/absent = not cached)
+CACHE_TTLS: Dict[str, float] = {k: float(v) for k, v in _parse_service_map(os.getenv("GATEWAY_CACHE_TTLS", "services=60")).items()}
+# Services whose responses do not depend on the caller, so one entry serves every user
+CACHE_PUBLIC_SERVICES = {s.strip() for s in os.getenv("GATEWAY_CACHE_PUBLIC", "services").split(",") if s.strip()}
+CACHE_MAX_ENTRIES = int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Per-client token buckets, "<service>[/<path prefix>]=<count>/<s|m|h>[:<burst>]"; see ratelimit.py
+RATE_LIMITS = parse_rules(_parse_service_map(os.getenv("GATEWAY_RATE_LIMITS", "auth/login=30/m:10")))
+RATE_LIMIT_BACKEND = os.getenv("GATEWAY_RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("GATEWAY_RATE_LIMIT_MAX_KEYS", "100000"))
+REDIS_URL = os.getenv("GATEWAY_REDIS_URL", "redis://localhost:6379/0")
+# Only honour X-Forwarded-For behind a proxy that sets it; otherwise clients could pick their own bucket
+TRUST_FORWARDED = os.getenv("GATEWAY_TRUST_FORWARDED", "false").lower() in {"1", "true", "yes"}
+
+# Response compression (br when the brotli package is installed, else gzip) for textual bodies of at least MIN_BYTES
+COMPRESSION = os.getenv("GATEWAY_COMPRESSION", "true").lower() in {"1", "true", "yes"}
+COMPRESS_MIN_BYTES = int(os.getenv("GATEWAY_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GATEWAY_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("GATEWAY_BROTLI_QUALITY", "4"))
+
+# Per-service upstream timeouts in seconds, e.g. "invoices=60,services=5"; others use GATEWAY_UPSTREAM_TIMEOUT
+UPSTREAM_TIMEOUTS: Dict[str, float] = {k: float(v) for k, v in _parse_service_map(os.getenv("GATEWAY_TIMEOUTS", "")).items()}
+
+# Circuit breaker per service: opens when the failure rate over the window reaches the threshold
+BREAKER_WINDOW_SEC = float(os.getenv("GATEWAY_BREAKER_WINDOW_SEC", "30"))
+BREAKER_MIN_REQUESTS = int(os.getenv("GATEWAY_BREAKER_MIN_REQUESTS", "20"))
+BREAKER_FAILURE_RATE = float(os.getenv("GATEWAY_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SEC = float(os.getenv("GATEWAY_BREAKER_OPEN_SEC", "10"))
+BREAKER_HALF_OPEN_MAX = int(os.getenv("GATEWAY_BREAKER_HALF_OPEN_MAX", "3"))
+
+# Retries for idempotent requests without a body, with jittered exponential backoff
+RETRY_ATTEMPTS = int(os.getenv("GATEWAY_RETRIES", "2"))
+RETRY_BASE_SEC = float(os.getenv("GATEWAY_RETRY_BASE_SEC", "0.05"))
+RETRY_MAX_SEC = float(os.getenv("GATEWAY_RETRY_MAX_SEC", "1.0"))
+
+# Hedged reads: services whose GETs get a second request once the first outlasts the recent p95
+HEDGE_SERVICES = {s.strip() for s in os.getenv("GATEWAY_HEDGE", "").split(",") if s.strip()}
+HEDGE_QUANTILE = float(os.getenv("GATEWAY_HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY_SEC = float(os.getenv("GATEWAY_HEDGE_MIN_DELAY_SEC", "0.01"))
+
+# Load balancing across replicas ("p2c" or "least"), with passive ejection and active /livez probes
+LB_POLICY = os.getenv("GATEWAY_LB_POLICY", "p2c").lower()
+EJECT_AFTER = int(os.getenv("GATEWAY_EJECT_AFTER", "3"))
+EJECT_SEC = float(os.getenv("GATEWAY_EJECT_SEC", "30"))
+PROBE_SEC = float(os.getenv("GATEWAY_PROBE_SEC", "5"))
+# Optional JSON file {"service": ["http://host:port", ...]} overriding SERVICE_MAP; re-read when it changes
+UPSTREAMS_FILE = os.getenv("GATEWAY_UPSTREAMS_FILE", "")
+
+# Load shedding: cap on concurrent upstream requests per service, beyond which callers get 503 at once
+SHED_DEFAULT = int(os.getenv("GATEWAY_MAX_IN_FLIGHT", str(2 * UPSTREAM_MAX_CONNECTIONS)))
+SHED_LIMITS: Dict[str, int] = {k: int(v) for k, v in _parse_service_map(os.getenv("GATEWAY_SHED_LIMITS", "")).items()}
+SHED_RETRY_AFTER = os.getenv("GATEWAY_SHED_RETRY_AFTER", "1")
+
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+_IN_FLIGHT: Dict[str, int] = {}
+_BREAKERS: Dict[str, CircuitBreaker] = {
+    service: CircuitBreaker(service, BREAKER_WINDOW_SEC, BREAKER_MIN_REQUESTS, BREAKER_FAILURE_RATE,
+                            BREAKER_OPEN_SEC, BREAKER_HALF_OPEN_MAX)
+    for service in SERVICE_MAP
+}
+_LATENCIES: Dict[str, LatencyWindow] = {service: LatencyWindow() for service in SERVICE_MAP}
+_UPSTREAMS: Dict[str, UpstreamPool] = {
+    service: UpstreamPool(service, split_urls(urls), LB_POLICY, EJECT_AFTER, EJECT_SEC)
+    for service, urls in SERVICE_MAP.items()
+}
+
+def _make_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT, limits=limits, http2=UPSTREAM_HTTP2)
+
+def _client_for(service: str) -> httpx.AsyncClient:
+    client = _CLIENTS.get(service)
+    if client is None or client.is_closed:
+        # Lazily (re)create, e.g. when the app runs without lifespan events
+        client = _CLIENTS[service] = _make_client()
+    return client
+
+def _pool_stats(service: str) -> dict:
+    stats = {
+        "in_flight": _IN_FLIGHT.get(service, 0),
+        "connections": 0,
+        "idle": 0,
+        "max_connections": UPSTREAM_MAX_CONNECTIONS,
+        "max_keepalive": UPSTREAM_MAX_KEEPALIVE,
+        "http2": UPSTREAM_HTTP2,
+    }
+    client = _CLIENTS.get(service)
+    # httpx does not expose pool state publicly; read it from the httpcore pool if present
+    try:
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        conns = list(getattr(pool, "connections", []) or [])
+        stats["connections"] = len(conns)
+        stats["idle"] = sum(1 for c in conns if c.is_idle())
+    except Exception:
+        # Private API: after an httpx/httpcore upgrade report the pool as unknown rather than fail
+        stats["connections"] = stats["idle"] = None
+    return stats
+
+def _reload_upstreams(endpoint_file: EndpointFile) -> None:
+    try:
+        lists = endpoint_file.changed()
+        if lists is None:
+            return
+        for service, urls in lists.items():
+            if service not in _UPSTREAMS:
+                logger.warning("ignoring endpoints for unknown service %s in %s", service, endpoint_file.path)
+                continue
+            _UPSTREAMS[service].set_urls(urls)
+        logger.info("reloaded upstream endpoints from %s", endpoint_file.path)
+    except Exception:
+        # Keep routing to the current endpoints until the file is fixed
+        logger.exception("could not reload upstream endpoints from %s", endpoint_file.path)
+
+async def _livez(service: str, endpoint) -> bool:
+    try:
+        resp = await _client_for(service).get(f"{endpoint.url}/livez", timeout=READY_CHECK_TIMEOUT)
+        return resp.status_code < 500
+    except httpx.HTTPError:
+        return False
+    except Exception as e:
+        # e.g. httpx.InvalidURL for a bad entry in the endpoints file
+        logger.warning("could not probe %s endpoint %s: %r", service, endpoint.url, e)
+        return False
+
+async def _probe(service: str, endpoint) -> None:
+    _UPSTREAMS[service].record_probe(endpoint, await _livez(service, endpoint))
+
+async def _watch_upstreams(endpoint_file: EndpointFile | None) -> None:
+    """Probe every endpoint's /livez and pick up endpoint file changes every PROBE_SEC (5 s without probes)."""
+    while True:
+        try:
+            if endpoint_file is not None:
+                _reload_upstreams(endpoint_file)
+            if PROBE_SEC > 0:
+                await asyncio.gather(*(_probe(s, e) for s, pool in _UPSTREAMS.items() for e in pool.endpoints))
+        except Exception:
+            # One bad round must not stop probing: ejected replicas would never come back
+            logger.exception("checking upstream endpoints failed")
+        await asyncio.sleep(PROBE_SEC if PROBE_SEC > 0 else 5)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for service in SERVICE_MAP:
+        _CLIENTS[service] = _make_client()
+    _HEALTH.start()
+    watcher = None
+    if PROBE_SEC > 0 or UPSTREAMS_FILE:
+        watcher = asyncio.create_task(_watch_upstreams(EndpointFile(UPSTREAMS_FILE) if UPSTREAMS_FILE else None))
+    try:
+        yield
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+            try:
+                await watcher
+            except asyncio.CancelledError:
+                pass
+        await _HEALTH.stop()
+        await _LIMITER.close()
+        for client in _CLIENTS.values():
+            await client.aclose()
+        _CLIENTS.clear()
+
+class _TokenCache:
+    """LRU of verified JWT payloads keyed by token hash, each entry expiring at the token's exp."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, key: str, payload: dict) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + JWT_CACHE_MAX_TTL
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+_TOKEN_CACHE = _TokenCache(JWT_CACHE_SIZE)
+
+class _CachedResponse:
+    __slots__ = ("service", "status_code", "headers", "body", "etag", "expires_at")
+
+    def __init__(self, service: str, status_code: int, headers: Dict[str, str], body: bytes, etag: str, expires_at: float):
+        self.service = service
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+class _ResponseCache:
+    """LRU of upstream GET responses bounded by entry count and total body bytes.
+
+    Each service has an invalidation generation, bumped by every write. A fill
+    passes the generation it read before fetching, so a GET that was in flight
+    during a write cannot put the pre-write body back.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CachedResponse]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, key: str) -> _CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def generation(self, service: str) -> int:
+        return self._generations.get(service, 0)
+
+    def put(self, key: str, entry: _CachedResponse, generation: int) -> None:
+        if len(entry.body) > self.max_bytes or self.max_entries <= 0:
+            return
+        if generation != self.generation(entry.service):
+            # The service was written to since this fill started
+            return
+        self._pop(key)
+        self._entries[key] = entry
+        self.bytes += len(entry.body)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    def invalidate(self, service: str) -> None:
+        self._generations[service] = self.generation(service) + 1
+        for key in [k for k, e in self._entries.items() if e.service == service]:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry.body)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+_RESPONSE_CACHE = _ResponseCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+if RATE_LIMIT_BACKEND == "redis":
+    _LIMITER = RedisBuckets(REDIS_URL)
+elif RATE_LIMIT_BACKEND == "memory":
+    _LIMITER = MemoryBuckets(RATE_LIMIT_MAX_KEYS)
+else:
+    raise RuntimeError(f"Unknown GATEWAY_RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+
+app = FastAPI(title="Gateway", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,12 +378,81 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+if COMPRESSION:
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY)
+instrument(app)
+setup_tracing(app, "gateway")
+_HEALTH = setup_health(app)
+
+def _endpoints_check(service: str):
+    async def check():
+        available = _UPSTREAMS[service].available()
+        if not available:
+            raise RuntimeError("no endpoint available")
+        if any(e.probed for e in available):
+            return
+        # No probe has reported on these yet (or probes are off): the passive state alone would call a
+        # replica that never got a request "ok", so ask their /livez
+        if not any(await asyncio.gather(*(_livez(service, e) for e in available))):
+            raise RuntimeError("no endpoint answers /livez")
+    return check
+
+# Upstreams are reported in /readyz but one service being down must not take the whole gateway out of rotation
+for _service in SERVICE_MAP:
+    _HEALTH.add_check(_service, _endpoints_check(_service), critical=False)
+
+# Time until the upstream's response headers arrive (body streaming is not included)
+UPSTREAM_LATENCY = Histogram("gateway_upstream_duration_seconds", "Upstream response time per service",
+                             ["service", "status"], buckets=LATENCY_BUCKETS)
+
+RETRIES = Counter("gateway_upstream_retries_total", "Upstream requests retried", ["service"])
+HEDGES = Counter("gateway_upstream_hedges_total", "Hedged second requests sent upstream", ["service"])
+REJECTED = Counter("gateway_rejected_total", "Requests refused by the gateway before reaching a service",
+                   ["service", "reason"])
+
+def _observe_upstream(service: str, start: float, status: str) -> None:
+    UPSTREAM_LATENCY.labels(service, status).observe(time.perf_counter() - start)
 
 @app.get("/api/health")
 async def health():
     return {"status": "ok", "services": list(SERVICE_MAP.keys())}
 
+@app.get("/api/health/pool")
+async def pool_health():
+    return {service: _pool_stats(service) for service in SERVICE_MAP}
+
+@app.get("/api/health/jwt-cache")
+async def jwt_cache_health():
+    return _TOKEN_CACHE.stats()
+
+@app.get("/api/health/cache")
+async def response_cache_health():
+    return {**_RESPONSE_CACHE.stats(), "ttls": CACHE_TTLS}
+
+@app.get("/api/health/limits")
+async def limits_health():
+    return {
+        "backend": RATE_LIMIT_BACKEND,
+        "rate_limits": {k: {"per_sec": r.rate, "burst": r.burst} for k, r in RATE_LIMITS.items()},
+        "shed_limits": {service: _shed_limit(service) for service in SERVICE_MAP},
+        "in_flight": {service: _IN_FLIGHT.get(service, 0) for service in SERVICE_MAP},
+    }
+
+@app.get("/api/health/upstreams")
+async def upstreams_health():
+    return {
+        service: {
+            "timeout": _timeout(service),
+            "circuit": _BREAKERS[service].stats(),
+            "p95": _LATENCIES[service].quantile(0.95),
+            "hedged": service in HEDGE_SERVICES,
+            **_UPSTREAMS[service].stats(),
+        }
+        for service in SERVICE_MAP
+    }
+
 @app.get("/whoami")
 async def whoami(request: Request):
     payload = _decode_bearer(request.headers.get("authorization"))
@@ -53,10 +464,51 @@ def _decode_bearer(authorization: str | None):
     if not authorization or not authorization.lower().startswith("bearer "):
         return None
     token = authorization.split(" ", 1)[1]
+    key = _TokenCache.key(token)
+    payload = _TOKEN_CACHE.get(key)
+    if payload is not None:
+        return payload
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
     except Exception:
         return None
+    _TOKEN_CACHE.put(key, payload)
+    return payload
+
+def _client_ip(request: Request) -> str:
+    if TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+async def _check_rate_limit(request: Request, service: str, tail: str, payload: dict | None) -> None:
+    rule = match_rule(RATE_LIMITS, service, tail)
+    if rule is None:
+        return
+    # Authenticated callers get their own bucket wherever they connect from
+    client = f"sub:{payload['sub']}" if payload and payload.get("sub") is not None else f"ip:{_client_ip(request)}"
+    allowed, wait = await _LIMITER.take(f"{rule.key}|{client}", rule)
+    if not allowed:
+        REJECTED.labels(service, "rate_limit").inc()
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": retry_after(wait)})
+
+def _shed_limit(service: str) -> int:
+    return SHED_LIMITS.get(service, SHED_DEFAULT)
+
+def _admit(service: str) -> None:
+    # Fail fast rather than queue behind a saturated upstream pool
+    limit = _shed_limit(service)
+    if limit > 0 and _IN_FLIGHT.get(service, 0) >= limit:
+        REJECTED.labels(service, "overloaded").inc()
+        raise HTTPException(status_code=503, detail=f"Service overloaded: {service}", headers={"Retry-After": SHED_RETRY_AFTER})
+    _IN_FLIGHT[service] = _IN_FLIGHT.get(service, 0) + 1
+
+def _release(service: str) -> None:
+    _IN_FLIGHT[service] -= 1
+
+def _timeout(service: str) -> float:
+    return UPSTREAM_TIMEOUTS.get(service, UPSTREAM_TIMEOUT)
 
 def _needs_auth(service: str, path_tail: str) -> bool:
     # protect invoices service; allow auth service public; others open
@@ -65,8 +517,7 @@ def _needs_auth(service: str, path_tail: str) -> bool:
     return False
 
 async def _proxy(request: Request, service: str, tail: str = "") -> Response:
-    base_url = SERVICE_MAP.get(service)
-    if not base_url:
+    if service not in SERVICE_MAP:
         raise HTTPException(status_code=404, detail=f"Unknown service: {service}")
 
     # Normalize routing so both /api/{service} and /api/{service}/{tail}
@@ -79,7 +530,8 @@ async def _proxy(request: Request, service: str, tail: str = "") -> Response:
             effective_tail = tail
     else:
         effective_tail = resource_root
-    url = base_url.rstrip("/") + "/" + effective_tail.lstrip("/")
+    # The replica is picked per attempt; see _send
+    path = "/" + effective_tail.lstrip("/")
     method = request.method
 
     # Prepare request data
@@ -88,6 +540,8 @@ async def _proxy(request: Request, service: str, tail: str = "") -> Response:
 
     # auth handling
     payload = _decode_bearer(request.headers.get("authorization"))
+    if method != "OPTIONS":
+        await _check_rate_limit(request, service, tail, payload)
     if _needs_auth(service, tail):
         if not payload:
             raise HTTPException(status_code=401, detail="Unauthorized")
@@ -98,20 +552,251 @@ async def _proxy(request: Request, service: str, tail: str = "") -> Response:
         headers["x-user-id"] = str(payload.get("sub"))
         headers["x-user-role"] = str(payload.get("role"))
 
+    params = request.query_params
+    client = _client_for(service)
+
+    ttl = CACHE_TTLS.get(service, 0)
+    if method == "GET" and ttl > 0:
+        return await _proxy_cached(client, service, path, params, headers, ttl)
+
+    try:
+        if STREAM_PROXY:
+            return await _proxy_streaming(client, request, service, path, params, headers)
+        return await _proxy_buffered(client, request, service, path, params, headers)
+    finally:
+        if method in _MUTATING_METHODS:
+            # Writes through the gateway make that service's cached reads stale
+            _RESPONSE_CACHE.invalidate(service)
+
+async def _send(client: httpx.AsyncClient, service: str, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+    """Send a proxied request to one of the service's replicas through load shedding, its circuit breaker, retries and hedging.
+
+    With stream=True the body is left unread; the caller closes the response and then calls _release(service).
+    """
+    _admit(service)
+    release = not stream
+    # Replicas that already failed this request: retries of one client request count once towards ejection
+    failed = set()
+    try:
+        call = lambda endpoint: _attempt(client, service, endpoint, method, path, stream, failed, **kwargs)
+        idempotent = method in _IDEMPOTENT_METHODS and not kwargs.get("content")
+        retries = RETRY_ATTEMPTS if idempotent else 0
+        endpoint = None
+        for attempt in range(retries + 1):
+            if attempt:
+                RETRIES.labels(service).inc()
+                await asyncio.sleep(backoff(attempt - 1, RETRY_BASE_SEC, RETRY_MAX_SEC))
+            # Retries go to another replica when there is one
+            endpoint = _UPSTREAMS[service].pick(exclude=endpoint)
+            try:
+                resp = await (_hedged(service, call, endpoint) if idempotent and service in HEDGE_SERVICES else call(endpoint))
+            except httpx.TransportError:
+                if attempt == retries:
+                    raise
+                continue
+            if resp.status_code in _UNAVAILABLE_STATUSES and attempt < retries:
+                await resp.aclose()
+                continue
+            return resp
+    except CircuitOpenError as e:
+        release = True
+        REJECTED.labels(service, "circuit_open").inc()
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {service}", headers={"Retry-After": retry_after(e.retry_after)})
+    except httpx.TimeoutException:
+        release = True
+        raise HTTPException(status_code=504, detail=f"Upstream timed out: {service}")
+    except httpx.TransportError:
+        release = True
+        raise HTTPException(status_code=502, detail=f"Upstream unreachable: {service}")
+    except BaseException:
+        release = True
+        raise
+    finally:
+        if release:
+            _release(service)
+
+async def _attempt(client: httpx.AsyncClient, service: str, endpoint, method: str, path: str, stream: bool,
+                   failed: set, headers: dict, **kwargs) -> httpx.Response:
+    breaker = _BREAKERS[service]
+    breaker.before_call()
+    pool = _UPSTREAMS[service]
+    url = endpoint.url + path
+    headers = dict(headers)
+    start = time.perf_counter()
+    # Counted until the response headers arrive; a streamed body only occupies the gateway after that
+    endpoint.outstanding += 1
+    try:
+        # For streamed responses the span covers the wait for the upstream's headers; the body streams after it ends
+        with client_span(f"{method} {service}", headers, **{"url.full": url}) as span:
+            upstream_req = client.build_request(method, url, headers=headers, timeout=_timeout(service), **kwargs)
+            resp = await client.send(upstream_req, stream=stream)
+            span.set_attribute("http.response.status_code", resp.status_code)
+    except asyncio.CancelledError:
+        # A hedge that lost the race; it says nothing about the upstream
+        breaker.release()
+        raise
+    except httpx.TransportError:
+        breaker.record(False)
+        _record_endpoint(pool, endpoint, False, failed)
+        _observe_upstream(service, start, "error")
+        raise
+    except Exception:
+        # e.g. the client went away mid-upload; not the upstream's fault
+        breaker.release()
+        _observe_upstream(service, start, "error")
+        raise
+    finally:
+        endpoint.outstanding -= 1
+    ok = resp.status_code not in _UNAVAILABLE_STATUSES
+    breaker.record(ok)
+    _record_endpoint(pool, endpoint, ok, failed)
+    if ok:
+        _LATENCIES[service].add(time.perf_counter() - start)
+    _observe_upstream(service, start, str(resp.status_code))
+    return resp
+
+def _record_endpoint(pool: UpstreamPool, endpoint, ok: bool, failed: set) -> None:
+    if not ok:
+        if endpoint in failed:
+            return
+        failed.add(endpoint)
+    pool.record(endpoint, ok)
+
+async def _hedged(service: str, call, endpoint) -> httpx.Response:
+    """Call `endpoint`, and a second replica once the first outlasts the service's recent p95; first answer wins."""
+    first = asyncio.create_task(call(endpoint))
+    pending = {first}
+    try:
+        delay = _LATENCIES[service].quantile(HEDGE_QUANTILE)
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=max(delay, HEDGE_MIN_DELAY_SEC))
+            second = None if done else _UPSTREAMS[service].pick(exclude=endpoint)
+            # With one replica in rotation the pick is the same endpoint; a second request there only adds load
+            if second is not None and second is not endpoint:
+                HEDGES.labels(service).inc()
+                pending.add(asyncio.create_task(call(second)))
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            answered = [t.result() for t in done if t.exception() is None]
+            if answered:
+                for extra in answered[1:]:
+                    await extra.aclose()
+                return answered[0]
+            error = next(iter(done)).exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _proxy_buffered(client: httpx.AsyncClient, request: Request, service: str, path: str, params, headers: dict) -> Response:
     try:
         body = await request.body()
     except Exception:
         body = b""
 
-    params = request.query_params
-
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.request(method, url, content=body, params=params, headers=headers)
+    resp = await _send(client, service, request.method, path, content=body, params=params, headers=headers)
 
-    excluded = {"content-encoding", "transfer-encoding", "connection", "keep-alive"}
-    response_headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in excluded]
+    response_headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in _HOP_HEADERS]
     return Response(content=resp.content, status_code=resp.status_code, headers=dict(response_headers), media_type=resp.headers.get("content-type"))
 
+def _cache_key(service: str, path: str, params, headers: dict) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(params.multi_items()))
+    if service in CACHE_PUBLIC_SERVICES:
+        return f"{service}:{path}?{query}"
+    # Per-user responses (e.g. owner-filtered lists) are cached per identity
+    return f"{service}:{path}?{query}#{headers.get('x-user-id', '')}:{headers.get('x-user-role', '')}"
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    bare = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == bare:
+            return True
+    return False
+
+async def _proxy_cached(client: httpx.AsyncClient, service: str, path: str, params, headers: dict, ttl: float) -> Response:
+    key = _cache_key(service, path, params, headers)
+    # The client's conditional is answered from the cache, not forwarded
+    if_none_match = headers.pop("if-none-match", None)
+    entry = _RESPONSE_CACHE.get(key)
+    now = time.time()
+    cache_status = "HIT"
+    if entry is not None and entry.expires_at > now:
+        _RESPONSE_CACHE.hits += 1
+    else:
+        _RESPONSE_CACHE.misses += 1
+        generation = _RESPONSE_CACHE.generation(service)
+        upstream_headers = dict(headers)
+        if entry is not None:
+            # Stale entry: revalidate with the upstream instead of refetching the body
+            upstream_headers["if-none-match"] = entry.etag
+        resp = await _send(client, service, "GET", path, params=params, headers=upstream_headers)
+        if resp.status_code == 304 and entry is not None:
+            entry.expires_at = now + ttl
+            _RESPONSE_CACHE.revalidations += 1
+            cache_status = "REVALIDATED"
+        else:
+            response_headers = {k: v for k, v in resp.headers.items() if k.lower() not in _HOP_HEADERS and k.lower() != "content-length"}
+            if resp.status_code != 200 or "no-store" in resp.headers.get("cache-control", ""):
+                return Response(content=resp.content, status_code=resp.status_code, headers=response_headers)
+            body = resp.content
+            etag = resp.headers.get("etag") or f'"{hashlib.sha1(body).hexdigest()}"'
+            response_headers["etag"] = etag
+            entry = _CachedResponse(service, resp.status_code, response_headers, body, etag, now + ttl)
+            _RESPONSE_CACHE.put(key, entry, generation)
+            cache_status = "MISS"
+
+    if _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers={"etag": entry.etag, "x-gateway-cache": cache_status})
+    return Response(content=entry.body, status_code=entry.status_code, headers={**entry.headers, "x-gateway-cache": cache_status})
+
+def _has_body(request: Request) -> bool:
+    if "transfer-encoding" in request.headers:
+        return True
+    return request.headers.get("content-length", "0") not in {"", "0"}
+
+async def _proxy_streaming(client: httpx.AsyncClient, request: Request, service: str, path: str, params, headers: dict) -> Response:
+    # Pipe the request body upstream as it arrives rather than reading it into memory
+    content = request.stream() if _has_body(request) else None
+    resp = await _send(client, service, request.method, path, stream=True, content=content, params=params, headers=headers)
+
+    closed = False
+
+    async def _close():
+        # Reached from the body generator and the background task; only the first call releases
+        nonlocal closed
+        if closed:
+            return
+        closed = True
+        try:
+            await resp.aclose()
+        finally:
+            _release(service)
+
+    async def _body():
+        # Starlette skips the background task when sending the body fails, so close here as well
+        try:
+            async for chunk in resp.aiter_bytes(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            await _close()
+
+    excluded = set(_HOP_HEADERS)
+    if "content-encoding" in resp.headers:
+        # Body is decoded on the way through, so the upstream length no longer applies
+        excluded.add("content-length")
+    response_headers = {k: v for k, v in resp.headers.items() if k.lower() not in excluded}
+    return StreamingResponse(
+        _body(),
+        status_code=resp.status_code,
+        headers=response_headers,
+        media_type=resp.headers.get("content-type"),
+        background=BackgroundTask(_close),
+    )
+
 @app.api_route("/api/{service}", methods=["GET","POST","PUT","PATCH","DELETE","OPTIONS"])
 async def proxy_root(request: Request, service: str):
     return await _proxy(request, service, "")
@@ -0,0 +1,115 @@
+"""Token-bucket rate limiting for the gateway.
+
+Rules come from GATEWAY_RATE_LIMITS as comma-separated ``key=<count>/<unit>[:<burst>]``
+entries, e.g. ``auth/login=30/m:10,services=20/s,default=100/s``. A key is a
+``service/path-prefix`` route, a service name, or ``default``; the most specific
+matching rule applies. Buckets are per client: the JWT ``sub`` when the caller is
+authenticated, otherwise the client IP.
+
+The memory backend keeps buckets per gateway process. The redis backend shares them
+across replicas through an atomic Lua script, so any Redis-compatible server works.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("gateway.ratelimit")
+
+_UNITS = {"s": 1.0, "m": 60.0, "h": 3600.0}
+
+@dataclass(frozen=True)
+class Rule:
+    key: str
+    rate: float   # tokens added per second
+    burst: float  # bucket capacity
+
+def parse_rules(raw: Dict[str, str]) -> Dict[str, Rule]:
+    rules = {}
+    for key, spec in raw.items():
+        limit, _, burst = spec.partition(":")
+        count, _, unit = limit.partition("/")
+        if unit not in _UNITS:
+            raise RuntimeError(f"Invalid rate limit for {key}: {spec} (expected <count>/<s|m|h>[:<burst>])")
+        rules[key] = Rule(key, float(count) / _UNITS[unit], float(burst or count))
+    return rules
+
+def match_rule(rules: Dict[str, Rule], service: str, tail: str) -> Optional[Rule]:
+    """Most specific rule for a request: longest matching route prefix, then the service, then default."""
+    path = f"{service}/{tail.strip('/')}"
+    best: Optional[Rule] = None
+    for key, rule in rules.items():
+        if "/" in key and (path == key or path.startswith(key.rstrip("/") + "/")):
+            if best is None or len(key) > len(best.key):
+                best = rule
+    return best or rules.get(service) or rules.get("default")
+
+class MemoryBuckets:
+    """Per-process buckets, LRU-bounded so one scan of client IPs can't grow memory without limit."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rule: Rule) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (rule.burst, now))
+        tokens = min(rule.burst, tokens + (now - updated) * rule.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rule.rate
+
+    async def close(self) -> None:
+        pass
+
+# Refill, take one token and report the wait for the next one, atomically; uses the server clock
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+class RedisBuckets:
+    def __init__(self, url: str, prefix: str = "gateway:rl:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+
+    async def take(self, key: str, rule: Rule) -> Tuple[bool, float]:
+        try:
+            allowed, wait = await self._script(keys=[self.prefix + key], args=[rule.rate, rule.burst])
+        except Exception:
+            # Fail open: losing the limiter must not take the gateway down with it
+            logger.exception("rate limit backend unavailable")
+            return True, 0.0
+        return bool(allowed), float(wait)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+def retry_after(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
@@ -0,0 +1,127 @@
+"""Circuit breakers and retry/hedge helpers for gateway upstream calls.
+
+A breaker tracks the outcomes of one service's upstream calls over a sliding time
+window. Once at least ``min_requests`` calls were made and the failure rate reaches
+``failure_rate`` it opens: calls fail fast for ``open_sec``, then up to
+``half_open_max`` trial calls are let through. If those succeed it closes again;
+if any fails it re-opens.
+"""
+import random
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from prometheus_client import Gauge
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge("gateway_circuit_state", "Upstream circuit state (0 closed, 1 half-open, 2 open)", ["service"])
+
+class CircuitOpenError(Exception):
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(f"Circuit open for {service}")
+        self.service = service
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    def __init__(self, service: str, window_sec: float, min_requests: int, failure_rate: float,
+                 open_sec: float, half_open_max: int):
+        self.service = service
+        self.window_sec = window_sec
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.open_sec = open_sec
+        self.half_open_max = half_open_max
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._events: Deque[Tuple[float, bool]] = deque()  # (time, failed)
+        self._failures = 0
+        self._probes = 0
+        self._probe_successes = 0
+        CIRCUIT_STATE.labels(service).set(0)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_STATE.labels(self.service).set(_STATE_VALUES[state])
+
+    def _trim(self, now: float) -> None:
+        while self._events and self._events[0][0] <= now - self.window_sec:
+            _, failed = self._events.popleft()
+            self._failures -= failed
+
+    def before_call(self) -> None:
+        """Reserve a call, or raise CircuitOpenError when it must fail fast."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            remaining = self.opened_at + self.open_sec - now
+            if remaining > 0:
+                raise CircuitOpenError(self.service, remaining)
+            self._set_state(HALF_OPEN)
+            self._probes = self._probe_successes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_max:
+                raise CircuitOpenError(self.service, self.open_sec)
+            self._probes += 1
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._probes -= 1
+            if not ok:
+                self._open(now)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_max:
+                self._events.clear()
+                self._failures = 0
+                self._set_state(CLOSED)
+            return
+        if self.state == OPEN:
+            # A call admitted before the circuit opened has finished; it says nothing new
+            return
+        self._events.append((now, not ok))
+        self._failures += not ok
+        self._trim(now)
+        if len(self._events) >= self.min_requests and self._failures / len(self._events) >= self.failure_rate:
+            self._open(now)
+
+    def release(self) -> None:
+        """Give back a reservation whose call was abandoned (e.g. a cancelled hedge) without an outcome."""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def _open(self, now: float) -> None:
+        self.opened_at = now
+        self._events.clear()
+        self._failures = 0
+        self._set_state(OPEN)
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        return {
+            "state": self.state,
+            "window_requests": len(self._events),
+            "window_failures": self._failures,
+            "retry_after": max(0.0, round(self.opened_at + self.open_sec - time.monotonic(), 3)) if self.state == OPEN else 0.0,
+        }
+
+class LatencyWindow:
+    """Recent upstream latencies, used to pick the hedging delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+# The gateway's modules import each other flat, as they do inside its container
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("GATEWAY_PROBE_SEC", "0")
+os.environ.setdefault("GATEWAY_RETRY_BASE_SEC", "0")
+
+import main  # noqa: E402
+from balancer import UpstreamPool, split_urls  # noqa: E402
+from resilience import CircuitBreaker, LatencyWindow  # noqa: E402
+
+@pytest.fixture
+def client():
+    with TestClient(main.app, raise_server_exceptions=False) as c:
+        yield c
+
+@pytest.fixture
+def upstream(client, monkeypatch):
+    """Route a service's upstream traffic to a handler: ``upstream("payments", handler, urls=[...])``.
+
+    The service starts with a fresh breaker, latency window and replica pool (SERVICE_MAP's URLs by default).
+    """
+    def install(service: str, handler, urls=None):
+        # Replaces the pooled client the lifespan created; it closes this one on exit
+        main._CLIENTS[service] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setitem(main._IN_FLIGHT, service, 0)
+        monkeypatch.setitem(main._BREAKERS, service, CircuitBreaker(
+            service, main.BREAKER_WINDOW_SEC, main.BREAKER_MIN_REQUESTS, main.BREAKER_FAILURE_RATE,
+            main.BREAKER_OPEN_SEC, main.BREAKER_HALF_OPEN_MAX))
+        monkeypatch.setitem(main._LATENCIES, service, LatencyWindow())
+        monkeypatch.setitem(main._UPSTREAMS, service, UpstreamPool(
+            service, urls or split_urls(main.SERVICE_MAP[service]), main.LB_POLICY, main.EJECT_AFTER, main.EJECT_SEC))
+    return install
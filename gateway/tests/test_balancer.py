@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import balancer
+import main
+from balancer import EndpointFile, UpstreamPool
+
+URLS = ["http://a:8000", "http://b:8000", "http://c:8000"]
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(balancer.time, "monotonic", c)
+    return c
+
+def _pool(policy: str = "p2c", urls=URLS) -> UpstreamPool:
+    return UpstreamPool("test", urls, policy, eject_after=3, eject_sec=30)
+
+def _busy(pool: UpstreamPool, *outstanding: int) -> None:
+    for endpoint, n in zip(pool.endpoints, outstanding):
+        endpoint.outstanding = n
+
+def test_least_picks_fewest_outstanding():
+    pool = _pool("least")
+    _busy(pool, 3, 1, 2)
+    assert {pool.pick().url for _ in range(50)} == {"http://b:8000"}
+
+def test_p2c_never_picks_the_busiest():
+    pool = _pool("p2c")
+    _busy(pool, 0, 1, 5)
+    picks = Counter(pool.pick().url for _ in range(300))
+    assert "http://c:8000" not in picks
+    # a wins both pairs it is drawn in; b only the pair with c
+    assert picks["http://a:8000"] > picks["http://b:8000"] > 0
+
+def test_pick_excludes_the_previous_endpoint():
+    pool = _pool("least")
+    first = pool.endpoints[0]
+    assert all(pool.pick(exclude=first) is not first for _ in range(50))
+    single = _pool("least", urls=URLS[:1])
+    assert single.pick(exclude=single.endpoints[0]) is single.endpoints[0]
+
+def test_failures_eject_until_timeout(clock):
+    pool = _pool("least")
+    a = pool.endpoints[0]
+    pool.record(a, False)
+    pool.record(a, False)
+    pool.record(a, True)
+    # Only consecutive failures count
+    pool.record(a, False)
+    pool.record(a, False)
+    assert a in pool.available()
+    pool.record(a, False)
+    assert a not in pool.available()
+    assert all(pool.pick() is not a for _ in range(50))
+
+    clock.now += 30
+    assert a in pool.available()
+
+def test_every_endpoint_out_uses_them_all(clock):
+    pool = _pool("least", urls=URLS[:2])
+    for endpoint in pool.endpoints:
+        pool.record_probe(endpoint, False)
+    assert pool.available() == []
+    assert {pool.pick().url for _ in range(50)} == set(URLS[:2])
+
+def test_probe_removes_and_restores(clock):
+    pool = _pool("least")
+    a = pool.endpoints[0]
+    pool.record_probe(a, False)
+    assert a not in pool.available()
+    pool.record_probe(a, True)
+    assert a in pool.available()
+
+    # A passing probe also ends a passive ejection early
+    for _ in range(3):
+        pool.record(a, False)
+    assert a not in pool.available()
+    pool.record_probe(a, True)
+    assert a in pool.available()
+    assert a.failures == 0
+
+def test_set_urls_keeps_known_endpoints():
+    pool = _pool("least")
+    b = pool.endpoints[1]
+    b.failures = 2
+    pool.set_urls(["http://b:8000/", "http://d:8000", "http://d:8000"])
+    assert [e.url for e in pool.endpoints] == ["http://b:8000", "http://d:8000"]
+    assert pool.endpoints[0] is b
+    with pytest.raises(RuntimeError):
+        pool.set_urls([" "])
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(RuntimeError):
+        _pool("round-robin")
+
+def test_endpoint_file_reloads_on_change(tmp_path):
+    path = tmp_path / "upstreams.json"
+    endpoints = EndpointFile(str(path))
+    assert endpoints.changed() is None
+
+    path.write_text(json.dumps({"payments": ["http://p1:8000", "http://p2:8000"], "services": "http://s1:8000, http://s2:8000"}))
+    os.utime(path, (1_000, 1_000))
+    assert endpoints.changed() == {"payments": ["http://p1:8000", "http://p2:8000"], "services": ["http://s1:8000", "http://s2:8000"]}
+    assert endpoints.changed() is None
+
+    path.write_text(json.dumps({"payments": ["http://p3:8000"]}))
+    os.utime(path, (2_000, 2_000))
+    assert endpoints.changed() == {"payments": ["http://p3:8000"]}
+
+def test_reload_ignores_unknown_services_and_bad_files(tmp_path, monkeypatch):
+    monkeypatch.setitem(main._UPSTREAMS, "payments", UpstreamPool("payments", ["http://old:8000"], "p2c", 3, 30))
+    path = tmp_path / "upstreams.json"
+    path.write_text(json.dumps({"payments": ["http://new:8000"], "billing": ["http://x:8000"]}))
+    endpoint_file = EndpointFile(str(path))
+    main._reload_upstreams(endpoint_file)
+    assert [e.url for e in main._UPSTREAMS["payments"].endpoints] == ["http://new:8000"]
+
+    path.write_text("{not json")
+    os.utime(path, (3_000, 3_000))
+    # Keeps routing to the current endpoints
+    main._reload_upstreams(endpoint_file)
+    assert [e.url for e in main._UPSTREAMS["payments"].endpoints] == ["http://new:8000"]
+
+class _ChangedPool:
+    # Connections without is_idle(), as a newer httpcore might have them
+    connections = [object()]
+
+def test_pool_stats_survive_httpx_internals_changing(monkeypatch):
+    monkeypatch.setitem(main._CLIENTS, "payments", httpx.AsyncClient())
+    stats = main._pool_stats("payments")
+    assert (stats["connections"], stats["idle"]) == (0, 0)
+
+    monkeypatch.setitem(main._CLIENTS, "payments", SimpleNamespace(_transport=SimpleNamespace(_pool=_ChangedPool())))
+    stats = main._pool_stats("payments")
+    assert (stats["connections"], stats["idle"]) == (None, None)
+    assert stats["max_connections"] == main.UPSTREAM_MAX_CONNECTIONS
+
+def _refused(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("connection refused", request=request)
+
+def _readiness(client) -> dict:
+    main._HEALTH._cached = None
+    return client.get("/readyz").json()["checks"]
+
+def test_readyz_asks_livez_until_probes_report(client, upstream):
+    # GATEWAY_PROBE_SEC=0 in the tests: nothing but /readyz checks the replicas
+    upstream("payments", _refused, urls=["http://p1:8000", "http://p2:8000"])
+    assert _readiness(client)["payments"] == "no endpoint answers /livez"
+
+    livez = []
+    upstream("payments", lambda r: livez.append(r.url.host) or httpx.Response(200, json={"status": "ok"}))
+    assert _readiness(client)["payments"] == "ok"
+    assert livez == ["localhost"]
+
+    # Once a probe has reported, its result stands in for the request
+    livez.clear()
+    pool = main._UPSTREAMS["payments"]
+    pool.record_probe(pool.endpoints[0], True)
+    assert _readiness(client)["payments"] == "ok"
+    assert livez == []
+    pool.record_probe(pool.endpoints[0], False)
+    assert _readiness(client)["payments"] == "no endpoint available"
+
+def test_watcher_keeps_going_after_errors(monkeypatch):
+    reloads = []
+
+    def _reload(endpoint_file):
+        reloads.append(endpoint_file)
+        if len(reloads) == 1:
+            raise RuntimeError("upstreams file vanished mid-read")
+
+    pool = UpstreamPool("payments", ["http://ok:port", "http://ok:8000"], "p2c", 3, 30)
+    monkeypatch.setattr(main, "_UPSTREAMS", {"payments": pool})
+    monkeypatch.setattr(main, "_reload_upstreams", _reload)
+    monkeypatch.setattr(main, "PROBE_SEC", 0.01)
+
+    async def run():
+        monkeypatch.setitem(main._CLIENTS, "payments", httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda r: httpx.Response(200, json={"status": "ok"}))))
+        watcher = asyncio.create_task(main._watch_upstreams(object()))
+        await asyncio.sleep(0.2)
+        assert not watcher.done()
+        watcher.cancel()
+
+    asyncio.run(run())
+    assert len(reloads) > 2
+    bad, good = pool.endpoints
+    # The unparseable URL fails its probe instead of ending the watcher
+    assert (bad.probed, bad.probe_ok) == (True, False)
+    assert (good.probed, good.probe_ok) == (True, True)
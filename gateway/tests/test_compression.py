@@ -0,0 +1,136 @@
+import asyncio
+import gzip
+import zlib
+
+import brotli
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, negotiate
+
+BODY = b'{"items": [' + b", ".join(b'{"id": %d, "name": "Oil change"}' % i for i in range(200)) + b"]}"
+CHUNKS = [b"line %d of a streamed report\n" % i * 20 for i in range(5)]
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("*;q=0", None),
+    ("gzip;q=bogus", None),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
+
+def test_negotiate_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate("br, gzip") == "gzip"
+    assert negotiate("br") is None
+
+async def _json(request):
+    return Response(BODY, media_type="application/json", headers={"etag": '"v1"'})
+
+async def _weak(request):
+    return Response(BODY, media_type="application/json", headers={"etag": 'W/"v1"'})
+
+async def _small(request):
+    return Response(b'{"ok": true}', media_type="application/json", headers={"etag": '"v1"'})
+
+async def _pdf(request):
+    return Response(BODY, media_type="application/pdf")
+
+async def _encoded(request):
+    return Response(gzip.compress(BODY), media_type="application/json", headers={"content-encoding": "gzip"})
+
+async def _chunks():
+    for chunk in CHUNKS:
+        yield chunk
+
+async def _stream(request):
+    return StreamingResponse(_chunks(), media_type="text/plain")
+
+APP = CompressionMiddleware(
+    Starlette(routes=[Route(f"/{f.__name__[1:]}", f) for f in (_json, _weak, _small, _pdf, _encoded, _stream)]),
+    minimum_size=500,
+)
+
+@pytest.fixture
+def client():
+    return TestClient(APP)
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_compresses_and_weakens_etag(client, encoding):
+    resp = client.get("/json", headers={"accept-encoding": encoding})
+    assert resp.headers["content-encoding"] == encoding
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.headers["etag"] == 'W/"v1"'
+    assert int(resp.headers["content-length"]) < len(BODY)
+    assert resp.content == BODY
+
+def test_weak_etag_is_kept(client):
+    assert client.get("/weak", headers={"accept-encoding": "gzip"}).headers["etag"] == 'W/"v1"'
+
+def test_uncompressed_keeps_strong_etag(client):
+    resp = client.get("/json", headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    assert resp.headers["etag"] == '"v1"'
+
+def test_small_body_passes_through(client):
+    resp = client.get("/small", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in resp.headers
+    assert resp.headers["etag"] == '"v1"'
+    assert resp.content == b'{"ok": true}'
+
+def test_binary_and_encoded_bodies_pass_through(client):
+    assert "content-encoding" not in client.get("/pdf", headers={"accept-encoding": "gzip"}).headers
+    resp = client.get("/encoded", headers={"accept-encoding": "br"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.content == BODY
+
+def _raw_get(path: str, accept_encoding: str) -> list:
+    """Run one request through the middleware and return the ASGI messages it sent."""
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": [(b"accept-encoding", accept_encoding.encode())], "http_version": "1.1",
+             "scheme": "http", "server": ("test", 80), "client": ("test", 1), "root_path": ""}
+    messages = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            # The client stays connected; the response cancels this wait when it is done
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(APP(scope, receive, send))
+    return messages
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_stream_is_flushed_per_chunk(encoding):
+    start, *bodies = _raw_get("/stream", encoding)
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == encoding.encode()
+    assert b"content-length" not in headers
+
+    decode = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress if encoding == "gzip" else brotli.Decompressor().process
+    received = b""
+    for i, message in enumerate(bodies[:len(CHUNKS)]):
+        # Every source chunk can be decoded as soon as its compressed message arrives
+        received += decode(message["body"])
+        assert received == b"".join(CHUNKS[:i + 1])
+    for message in bodies[len(CHUNKS):]:
+        received += decode(message["body"])
+    assert received == b"".join(CHUNKS)
+    assert bodies[-1].get("more_body", False) is False
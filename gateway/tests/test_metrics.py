@@ -0,0 +1,26 @@
+import httpx
+from prometheus_client import REGISTRY
+
+import main
+
+def _requests(route: str, status: str) -> float:
+    return REGISTRY.get_sample_value("http_requests_total", {"method": "GET", "route": route, "status": status}) or 0
+
+def test_requests_are_labelled_by_route_template(client, upstream):
+    upstream("payments", lambda request: httpx.Response(200, content=b"[]"))
+    route = "/api/{service}/{tail:path}"
+    before = _requests(route, "200")
+    for payment_id in ("1", "2", "3"):
+        assert client.get(f"/api/payments/{payment_id}").status_code == 200
+    assert _requests(route, "200") == before + 3
+
+    body = client.get("/metrics").text
+    assert 'route="/api/payments/1"' not in body
+    assert f'http_request_duration_seconds_count{{method="GET",route="{route}"}}' in body
+    assert "http_requests_in_flight" in body
+
+def test_unmatched_paths_share_one_label(client):
+    before = _requests("unmatched", "404")
+    client.get("/no/such/route")
+    client.get("/another/missing/path")
+    assert _requests("unmatched", "404") == before + 2
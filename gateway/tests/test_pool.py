@@ -0,0 +1,56 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import main
+from balancer import UpstreamPool
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.peers.append(self.client_address)
+        body = b'{"ok":true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def real_upstream(monkeypatch):
+    """A local HTTP/1.1 keep-alive server behind the payments route; ``server.peers`` lists each request's client address."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    server.peers = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setitem(main._IN_FLIGHT, "payments", 0)
+    monkeypatch.setitem(main._UPSTREAMS, "payments", UpstreamPool(
+        "payments", [url], main.LB_POLICY, main.EJECT_AFTER, main.EJECT_SEC))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_requests_reuse_pooled_connections(client, real_upstream):
+    pooled = main._client_for("payments")
+    for _ in range(5):
+        assert client.get("/api/payments/1").json() == {"ok": True}
+    assert main._client_for("payments") is pooled
+    # Every request went over the same kept-alive connection
+    assert len(real_upstream.peers) == 5 and len(set(real_upstream.peers)) == 1
+
+    stats = client.get("/api/health/pool").json()["payments"]
+    assert stats["in_flight"] == 0
+    assert (stats["connections"], stats["idle"]) == (1, 1)
+    assert stats["max_connections"] == main.UPSTREAM_MAX_CONNECTIONS
+
+def test_closed_clients_are_recreated(client):
+    closed = main._client_for("payments")
+    client.portal.call(closed.aclose)
+    fresh = main._client_for("payments")
+    assert fresh is not closed and not fresh.is_closed
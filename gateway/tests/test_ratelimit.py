@@ -0,0 +1,144 @@
+import asyncio
+
+import fakeredis
+import httpx
+import pytest
+
+import main
+import ratelimit
+from ratelimit import MemoryBuckets, RedisBuckets, Rule, match_rule, parse_rules, retry_after
+
+def test_parse_rules():
+    rules = parse_rules({"auth/login": "30/m:10", "services": "20/s", "default": "3600/h"})
+    assert rules["auth/login"] == Rule("auth/login", 0.5, 10.0)
+    # Burst defaults to the count
+    assert rules["services"] == Rule("services", 20.0, 20.0)
+    assert rules["default"] == Rule("default", 1.0, 3600.0)
+
+@pytest.mark.parametrize("spec", ["30", "30/d", "30/min"])
+def test_parse_rules_rejects_bad_units(spec):
+    with pytest.raises(RuntimeError):
+        parse_rules({"auth": spec})
+
+def test_match_rule_prefers_longest_prefix():
+    rules = parse_rules({
+        "auth": "10/s", "auth/login": "30/m", "auth/login/sso": "5/m", "default": "100/s",
+    })
+    assert match_rule(rules, "auth", "login").key == "auth/login"
+    assert match_rule(rules, "auth", "/login/").key == "auth/login"
+    assert match_rule(rules, "auth", "login/sso/callback").key == "auth/login/sso"
+    # A prefix only matches whole path segments
+    assert match_rule(rules, "auth", "loginx").key == "auth"
+    assert match_rule(rules, "auth", "").key == "auth"
+    assert match_rule(rules, "payments", "1").key == "default"
+    assert match_rule(parse_rules({"auth": "1/s"}), "payments", "1") is None
+
+def test_retry_after_rounds_up_to_whole_seconds():
+    assert retry_after(0.0) == "1"
+    assert retry_after(0.2) == "1"
+    assert retry_after(1.5) == "2"
+    assert retry_after(30.0) == "30"
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_memory_bucket_burst_and_refill(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    buckets = MemoryBuckets(max_keys=10)
+    rule = Rule("auth/login", rate=0.5, burst=3)
+    take = lambda key="ip:1": asyncio.run(buckets.take(key, rule))
+
+    assert [take()[0] for _ in range(3)] == [True, True, True]
+    assert take() == (False, 2.0)
+    # Buckets are per key
+    assert take("ip:2") == (True, 0.0)
+
+    clock.now += 1
+    assert take() == (False, 1.0)
+    clock.now += 1
+    assert take() == (True, 0.0)
+    # Refill stops at the burst size
+    clock.now += 60
+    assert [take()[0] for _ in range(4)] == [True, True, True, False]
+
+def test_memory_buckets_evict_least_recent(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, "monotonic", _Clock())
+    buckets = MemoryBuckets(max_keys=2)
+    rule = Rule("default", rate=1, burst=1)
+    for key in ("a", "b", "a", "c"):
+        asyncio.run(buckets.take(key, rule))
+    assert list(buckets._buckets) == ["a", "c"]
+
+def _redis_buckets() -> RedisBuckets:
+    buckets = RedisBuckets("redis://localhost:6379/0")
+    buckets._redis = fakeredis.FakeAsyncRedis()
+    buckets._script = buckets._redis.register_script(ratelimit._TOKEN_BUCKET_LUA)
+    return buckets
+
+def test_redis_bucket_burst_and_wait():
+    async def run():
+        buckets = _redis_buckets()
+        rule = Rule("auth/login", rate=2 / 60, burst=2)
+        results = [await buckets.take("ip:1", rule) for _ in range(3)]
+        ttl = await buckets._redis.pttl("gateway:rl:ip:1")
+        other = await buckets.take("ip:2", rule)
+        await buckets.close()
+        return results, ttl, other
+
+    results, ttl, other = asyncio.run(run())
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert 29 < results[2][1] <= 30
+    # The key outlives a full refill, then expires
+    assert 60_000 < ttl <= 61_000
+    assert other == (True, 0.0)
+
+def test_redis_unavailable_fails_open():
+    async def run():
+        buckets = RedisBuckets("redis://127.0.0.1:1/0")
+        try:
+            return await buckets.take("ip:1", Rule("default", rate=1, burst=1))
+        finally:
+            await buckets.close()
+
+    assert asyncio.run(run()) == (True, 0.0)
+
+def test_rate_limited_requests_get_429(client, upstream, monkeypatch):
+    calls = []
+    upstream("payments", lambda request: calls.append(request) or httpx.Response(200, json=[]))
+    monkeypatch.setattr(main, "RATE_LIMITS", parse_rules({"payments": "2/m"}))
+    monkeypatch.setattr(main, "_LIMITER", MemoryBuckets(100))
+    assert [client.get("/api/payments").status_code for _ in range(2)] == [200, 200]
+    resp = client.get("/api/payments")
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "30"
+    assert len(calls) == 2
+    # Other services are not limited
+    upstream("appointments", lambda request: httpx.Response(200, json=[]))
+    assert client.get("/api/appointments").status_code == 200
+
+def test_saturated_service_is_shed(client, upstream, monkeypatch):
+    calls = []
+    upstream("payments", lambda request: calls.append(request) or httpx.Response(200, json=[]))
+    monkeypatch.setitem(main.SHED_LIMITS, "payments", 2)
+    main._IN_FLIGHT["payments"] = 2
+    resp = client.get("/api/payments")
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == main.SHED_RETRY_AFTER
+    assert calls == []
+    assert main._IN_FLIGHT["payments"] == 2
+
+    main._IN_FLIGHT["payments"] = 1
+    assert client.get("/api/payments").status_code == 200
+    assert main._IN_FLIGHT["payments"] == 1
+
+def test_zero_shed_limit_disables_shedding(upstream, monkeypatch):
+    upstream("payments", lambda request: httpx.Response(200))
+    monkeypatch.setitem(main.SHED_LIMITS, "payments", 0)
+    main._IN_FLIGHT["payments"] = 10_000
+    main._admit("payments")
+    assert main._IN_FLIGHT["payments"] == 10_001
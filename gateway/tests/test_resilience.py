@@ -0,0 +1,200 @@
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+import main
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, LatencyWindow, backoff
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", c)
+    return c
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    params = {"window_sec": 30, "min_requests": 4, "failure_rate": 0.5, "open_sec": 10, "half_open_max": 2, **kwargs}
+    return CircuitBreaker("test", **params)
+
+def _calls(breaker: CircuitBreaker, *outcomes: bool) -> None:
+    for ok in outcomes:
+        breaker.before_call()
+        breaker.record(ok)
+
+def test_breaker_waits_for_min_requests(clock):
+    breaker = _breaker()
+    _calls(breaker, False, False, False)
+    assert breaker.state == CLOSED
+    _calls(breaker, True)
+    assert breaker.state == OPEN
+
+def test_breaker_stays_closed_below_failure_rate(clock):
+    breaker = _breaker()
+    _calls(breaker, True, True, False, True, True, False)
+    assert breaker.state == CLOSED
+
+def test_breaker_forgets_outside_window(clock):
+    breaker = _breaker()
+    _calls(breaker, False, False, False)
+    clock.now += 31
+    _calls(breaker, False)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_requests"] == 1
+
+def test_open_breaker_fails_fast_then_half_opens(clock):
+    breaker = _breaker()
+    _calls(breaker, False, False, False, False)
+    clock.now += 4
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.before_call()
+    assert e.value.retry_after == pytest.approx(6)
+
+    clock.now += 6
+    breaker.before_call()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        # Only half_open_max trial calls at once
+        breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+def test_failed_trial_reopens(clock):
+    breaker = _breaker()
+    _calls(breaker, False, False, False, False)
+    clock.now += 10
+    breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.stats()["retry_after"] == 10
+
+def test_released_trial_frees_its_slot(clock):
+    breaker = _breaker(half_open_max=1)
+    _calls(breaker, False, False, False, False)
+    clock.now += 10
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+def test_latency_window_quantile():
+    window = LatencyWindow(size=100, min_samples=10)
+    for ms in range(9):
+        window.add(ms / 1000)
+    assert window.quantile(0.95) is None
+    for ms in range(9, 100):
+        window.add(ms / 1000)
+    assert window.quantile(0.95) == 0.095
+    assert window.quantile(1.0) == 0.099
+    window.add(1.0)
+    # Oldest sample dropped once the window is full
+    assert window.quantile(0.0) == 0.001
+
+def test_backoff_is_capped_full_jitter(monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: (low, high))
+    assert backoff(0, 0.05, 1.0) == (0, 0.05)
+    assert backoff(3, 0.05, 1.0) == (0, 0.4)
+    assert backoff(10, 0.05, 1.0) == (0, 1.0)
+
+def _unavailable(calls: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503, json={"detail": "down"})
+    return handler
+
+def test_get_is_retried(client, upstream):
+    calls = []
+    upstream("payments", _unavailable(calls))
+    assert client.get("/api/payments/1").status_code == 503
+    assert len(calls) == main.RETRY_ATTEMPTS + 1
+
+@pytest.mark.parametrize("method", ["POST", "PUT", "PATCH", "DELETE"])
+def test_writes_are_not_retried(client, upstream, method):
+    calls = []
+    upstream("payments", _unavailable(calls))
+    assert client.request(method, "/api/payments/1", json={"amount": 1}).status_code == 503
+    assert len(calls) == 1
+
+def test_get_with_body_is_not_retried(client, upstream):
+    calls = []
+    upstream("payments", _unavailable(calls))
+    assert client.request("GET", "/api/payments/1", content=b'{"q": 1}').status_code == 503
+    assert len(calls) == 1
+
+def test_transport_errors_are_retried_for_reads_only(client, upstream):
+    calls = []
+
+    def refuse(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        raise httpx.ConnectError("refused")
+
+    upstream("payments", refuse)
+    assert client.get("/api/payments/1").status_code == 502
+    assert len(calls) == main.RETRY_ATTEMPTS + 1
+    calls.clear()
+    assert client.post("/api/payments", json={}).status_code == 502
+    assert len(calls) == 1
+
+def _hedges(service: str) -> float:
+    return REGISTRY.get_sample_value("gateway_upstream_hedges_total", {"service": service}) or 0.0
+
+def _slow(calls: list, seconds: float):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        await asyncio.sleep(seconds)
+        return httpx.Response(200, json={"host": request.url.host})
+    return handler
+
+@pytest.fixture
+def hedged(monkeypatch):
+    monkeypatch.setattr(main, "HEDGE_SERVICES", {"payments"})
+
+    def warm(service: str):
+        # A p95 to hedge after: recent calls took 1 ms
+        for _ in range(main._LATENCIES[service].min_samples):
+            main._LATENCIES[service].add(0.001)
+    return warm
+
+def test_slow_read_is_hedged_to_another_replica(client, upstream, hedged):
+    calls = []
+    upstream("payments", _slow(calls, 0.1), urls=["http://pay-a:8000", "http://pay-b:8000"])
+    hedged("payments")
+    before = _hedges("payments")
+    assert client.get("/api/payments/1").status_code == 200
+    assert sorted(calls) == ["pay-a", "pay-b"]
+    assert _hedges("payments") == before + 1
+
+def test_single_replica_is_not_hedged(client, upstream, hedged):
+    calls = []
+    upstream("payments", _slow(calls, 0.05), urls=["http://pay-a:8000"])
+    hedged("payments")
+    before = _hedges("payments")
+    assert client.get("/api/payments/1").status_code == 200
+    assert calls == ["pay-a"]
+    assert _hedges("payments") == before
+
+def test_retries_count_once_towards_ejection(client, upstream):
+    calls = []
+    upstream("payments", _unavailable(calls), urls=["http://pay-a:8000"])
+    endpoint = main._UPSTREAMS["payments"].endpoints[0]
+    assert client.get("/api/payments/1").status_code == 503
+    assert len(calls) == main.RETRY_ATTEMPTS + 1
+    # One failed client request, however many attempts it took
+    assert endpoint.failures == 1
+    assert main._UPSTREAMS["payments"].available() == [endpoint]
+
+    for _ in range(main.EJECT_AFTER - 1):
+        client.get("/api/payments/1")
+    assert endpoint.failures == main.EJECT_AFTER
+    assert main._UPSTREAMS["payments"].available() == []
@@ -0,0 +1,100 @@
+import httpx
+import pytest
+
+import main
+from main import _CachedResponse, _ResponseCache
+
+@pytest.fixture
+def catalog(upstream, monkeypatch):
+    """The catalog upstream, answering GETs with the current ``state["body"]`` and honouring If-None-Match."""
+    monkeypatch.setattr(main, "_RESPONSE_CACHE", _ResponseCache(100, 1 << 20))
+    state = {"body": b'[{"id":"1"}]', "gets": [], "on_get": None}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            state["body"] = request.content
+            return httpx.Response(201, content=request.content)
+        state["gets"].append(request.headers.get("if-none-match"))
+        etag = f'"{len(state["body"])}-{hash(state["body"])}"'
+        if state["on_get"]:
+            state["on_get"]()
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"etag": etag})
+        return httpx.Response(200, content=state["body"], headers={"etag": etag, "content-type": "application/json"})
+
+    upstream("services", handler)
+    return state
+
+def _expire_all():
+    for entry in main._RESPONSE_CACHE._entries.values():
+        entry.expires_at = 0
+
+def test_hits_and_conditional_requests(client, catalog):
+    first = client.get("/api/services")
+    assert first.headers["x-gateway-cache"] == "MISS" and first.content == catalog["body"]
+    second = client.get("/api/services")
+    assert second.headers["x-gateway-cache"] == "HIT" and second.content == catalog["body"]
+    assert len(catalog["gets"]) == 1
+
+    r = client.get("/api/services", headers={"If-None-Match": second.headers["etag"]})
+    assert r.status_code == 304 and r.content == b""
+    assert client.get("/api/services", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert len(catalog["gets"]) == 1
+
+def test_stale_entries_are_revalidated(client, catalog):
+    etag = client.get("/api/services").headers["etag"]
+    _expire_all()
+    r = client.get("/api/services")
+    assert r.headers["x-gateway-cache"] == "REVALIDATED" and r.content == catalog["body"]
+    # The upstream was asked with the cached ETag and only answered 304
+    assert catalog["gets"] == [None, etag]
+    assert client.get("/api/services").headers["x-gateway-cache"] == "HIT"
+
+def test_writes_invalidate_the_service(client, catalog):
+    client.get("/api/services")
+    assert client.post("/api/services", content=b'[{"id":"2"}]').status_code == 201
+    r = client.get("/api/services")
+    assert r.headers["x-gateway-cache"] == "MISS" and r.content == b'[{"id":"2"}]'
+
+def test_fill_started_before_a_write_is_dropped(client, catalog):
+    # A write through the gateway completes while this GET waits for the upstream
+    catalog["on_get"] = lambda: main._RESPONSE_CACHE.invalidate("services")
+    assert client.get("/api/services").headers["x-gateway-cache"] == "MISS"
+    catalog["on_get"] = None
+    assert client.get("/api/services").headers["x-gateway-cache"] == "MISS"
+    assert client.get("/api/services").headers["x-gateway-cache"] == "HIT"
+    assert len(catalog["gets"]) == 2
+
+def test_errors_and_no_store_are_not_cached(client, upstream, monkeypatch):
+    monkeypatch.setattr(main, "_RESPONSE_CACHE", _ResponseCache(100, 1 << 20))
+    answers = [httpx.Response(500), httpx.Response(200, content=b"[]", headers={"cache-control": "no-store"})]
+    upstream("services", lambda request: answers.pop(0) if answers else httpx.Response(200, content=b"[]"))
+    assert client.get("/api/services").status_code == 500
+    assert client.get("/api/services").headers.get("x-gateway-cache") is None
+    assert client.get("/api/services").headers["x-gateway-cache"] == "MISS"
+
+def _entry(service: str, size: int) -> _CachedResponse:
+    return _CachedResponse(service, 200, {}, b"x" * size, '"e"', 1e12)
+
+def test_cache_is_bounded_by_entries_and_bytes():
+    cache = _ResponseCache(max_entries=2, max_bytes=100)
+    cache.put("a", _entry("services", 10), 0)
+    cache.put("b", _entry("services", 10), 0)
+    cache.get("a")
+    cache.put("c", _entry("services", 10), 0)
+    assert cache.get("b") is None and cache.get("a") is not None
+    cache.put("d", _entry("services", 95), 0)
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 95
+    # Larger than the whole cache: not stored at all
+    cache.put("e", _entry("services", 101), 0)
+    assert cache.get("e") is None and cache.get("d") is not None
+
+def test_invalidation_only_drops_the_written_service():
+    cache = _ResponseCache(max_entries=10, max_bytes=100)
+    cache.put("s", _entry("services", 1), cache.generation("services"))
+    cache.put("a", _entry("appointments", 1), cache.generation("appointments"))
+    generation = cache.generation("services")
+    cache.invalidate("services")
+    assert cache.get("s") is None and cache.get("a") is not None
+    cache.put("s", _entry("services", 1), generation)
+    assert cache.get("s") is None
@@ -0,0 +1,17 @@
+from pathlib import Path
+
+import pytest
+
+# Modules copied into each build context (gateway/ and services/*/app/), which must stay identical
+_REPO = Path(__file__).resolve().parents[2]
+_SHARED = ["health.py", "metrics.py", "tracing.py", "fastjson.py", "migrations.py"]
+
+@pytest.mark.parametrize("name", _SHARED)
+def test_copies_are_identical(name):
+    copies = sorted((_REPO / "services").glob(f"*/app/{name}"))
+    if (_REPO / "gateway" / name).exists():
+        copies.append(_REPO / "gateway" / name)
+    assert len(copies) >= 2, f"{name} is no longer shared"
+    reference = copies[0].read_bytes()
+    differing = [str(p.relative_to(_REPO)) for p in copies[1:] if p.read_bytes() != reference]
+    assert not differing, f"{name} differs from {copies[0].relative_to(_REPO)} in: {', '.join(differing)}"
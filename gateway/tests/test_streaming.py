@@ -0,0 +1,34 @@
+import httpx
+
+import main
+
+class _BrokenStream(httpx.AsyncByteStream):
+    """Sends one chunk, then the upstream connection drops."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        yield b"x" * 1024
+        raise httpx.ReadError("upstream went away")
+
+    async def aclose(self):
+        self.closed = True
+
+def test_streamed_body_releases_slot(client, upstream):
+    upstream("payments", lambda request: httpx.Response(200, content=b"ok" * 100))
+    resp = client.get("/api/payments/1")
+    assert resp.status_code == 200
+    assert resp.content == b"ok" * 100
+    assert main._IN_FLIGHT["payments"] == 0
+
+def test_upstream_failing_mid_body_releases_slot(client, upstream):
+    stream = _BrokenStream()
+    upstream("payments", lambda request: httpx.Response(200, stream=stream))
+    for _ in range(3):
+        try:
+            client.get("/api/payments/1")
+        except httpx.HTTPError:
+            pass
+    assert stream.closed
+    assert main._IN_FLIGHT["payments"] == 0
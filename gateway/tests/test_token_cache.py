@@ -0,0 +1,63 @@
+import time
+
+import jwt
+
+import main
+from main import _TokenCache
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _token(secret=main.JWT_SECRET, **claims) -> str:
+    payload = {"sub": "user-1", "role": "customer", "exp": int(time.time()) + 3600, **claims}
+    return jwt.encode(payload, secret, algorithm=main.JWT_ALGO)
+
+def test_entries_expire_at_the_token_exp(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(main.time, "time", clock)
+    cache = _TokenCache(10)
+    cache.put("short", {"sub": "a", "exp": clock.now + 5})
+    cache.put("no-exp", {"sub": "b"})
+    clock.now += 4.9
+    assert cache.get("short") == {"sub": "a", "exp": 1005.0}
+    clock.now += 0.1
+    assert cache.get("short") is None
+    # Without exp, GATEWAY_JWT_CACHE_MAX_TTL bounds the entry
+    assert cache.get("no-exp") == {"sub": "b"}
+    clock.now = 1000.0 + main.JWT_CACHE_MAX_TTL
+    assert cache.get("no-exp") is None
+    assert cache.stats()["size"] == 0
+
+def test_size_bound_evicts_least_recently_used():
+    cache = _TokenCache(2)
+    cache.put("a", {"sub": "a"})
+    cache.put("b", {"sub": "b"})
+    cache.get("a")
+    cache.put("c", {"sub": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"sub": "a"} and cache.get("c") == {"sub": "c"}
+    assert cache.stats()["size"] == 2
+
+def test_zero_size_disables_the_cache():
+    cache = _TokenCache(0)
+    cache.put("a", {"sub": "a"})
+    assert cache.get("a") is None
+
+def test_verified_tokens_are_served_from_the_cache(client, monkeypatch):
+    monkeypatch.setattr(main, "_TOKEN_CACHE", _TokenCache(10))
+    token = _token()
+    for _ in range(2):
+        r = client.get("/whoami", headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 200 and r.json()["sub"] == "user-1"
+    assert main._TOKEN_CACHE.stats() == {"size": 1, "max_size": 10, "hits": 1, "misses": 1}
+
+def test_invalid_tokens_are_rejected_and_not_cached(client, monkeypatch):
+    monkeypatch.setattr(main, "_TOKEN_CACHE", _TokenCache(10))
+    for token in ("not-a-jwt", _token(secret="someone-else"), _token(exp=int(time.time()) - 10)):
+        for _ in range(2):
+            assert client.get("/whoami", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+    assert main._TOKEN_CACHE.stats()["size"] == 0
@@ -0,0 +1,58 @@
+import httpx
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
+
+_EXPORTER = InMemorySpanExporter()
+
+@pytest.fixture
+def spans():
+    # The global provider can only be set once per process; the tests share one in-memory exporter
+    if not isinstance(trace.get_tracer_provider(), TracerProvider):
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(_EXPORTER))
+        trace.set_tracer_provider(provider)
+    _EXPORTER.clear()
+    yield _EXPORTER
+    _EXPORTER.clear()
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+CALLER_SPAN_ID = "b7ad6b7169203331"
+
+def test_caller_trace_is_continued_upstream(client, upstream, spans):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("traceparent"))
+        return httpx.Response(200, content=b"[]")
+
+    upstream("payments", handler)
+    r = client.get("/api/payments/1", headers={"traceparent": f"00-{TRACE_ID}-{CALLER_SPAN_ID}-01"})
+    assert r.status_code == 200
+
+    finished = {s.kind: s for s in spans.get_finished_spans()}
+    server, outbound = finished[SpanKind.SERVER], finished[SpanKind.CLIENT]
+    assert server.name == "GET /api/{service}/{tail:path}"
+    assert format(server.context.trace_id, "032x") == TRACE_ID
+    assert format(server.parent.span_id, "016x") == CALLER_SPAN_ID
+    assert outbound.parent.span_id == server.context.span_id
+    # The upstream is told to continue from the gateway's client span
+    assert seen == [f"00-{TRACE_ID}-{format(outbound.context.span_id, '016x')}-01"]
+
+def test_requests_without_traceparent_start_a_trace(client, upstream, spans):
+    seen = []
+    upstream("payments", lambda request: seen.append(request.headers.get("traceparent")) or httpx.Response(200))
+    client.get("/api/payments/1")
+    server = next(s for s in spans.get_finished_spans() if s.kind == SpanKind.SERVER)
+    assert server.parent is None
+    assert seen[0].split("-")[1] == format(server.context.trace_id, "032x")
+
+def test_server_errors_mark_the_span(client, upstream, spans):
+    upstream("payments", lambda request: httpx.Response(500))
+    client.get("/api/payments/1")
+    server = next(s for s in spans.get_finished_spans() if s.kind == SpanKind.SERVER)
+    assert server.attributes["http.response.status_code"] == 500
+    assert not server.status.is_ok
@@ -1,13 +1,29 @@
 import os
 import time
-from typing import List, Optional
+import zlib
+import asyncio
+import base64
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, TypeVar
 from uuid import uuid4
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Header
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from fastapi import FastAPI, HTTPException, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
+import httpx
 from pydantic import BaseModel
-from sqlalchemy import create_engine, String, DateTime, Float, JSON, Text, text
-from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import bindparam, create_engine, func, literal_column, select, true, update, Column, MetaData, String, DateTime, Float, Integer, JSON, Table, Text, Index, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker, Session
+
+from .fastjson import json_response
+from .health import db_check, setup_health
+from .metrics import instrument, instrument_engine
+from .migrations import add_column, create_index, create_table, drop_index, migrate
+from .schedule import BookingIndex, free_slots, opening_windows
+from .tracing import client_span, setup_tracing, trace_engine
+
+T = TypeVar("T")
 
 class AppointmentCreate(BaseModel):
     customer_name: str
@@ -15,44 +31,250 @@ class AppointmentCreate(BaseModel):
     total_price: float = 0.0
     scheduled_at: datetime
     notes: Optional[str] = None
+    # Service bay; assigned to the first free one when not given
+    bay: Optional[str] = None
 
 class Appointment(AppointmentCreate):
     id: str
     owner_id: str
+    ends_at: Optional[datetime] = None
+    version: int = 1
+    updated_at: Optional[datetime] = None
+
+class AppointmentChange(BaseModel):
+    id: str
+    op: str  # "upsert" or "delete"
+    version: int
+    # Current state for upserts; None for deletes
+    appointment: Optional[Appointment] = None
+
+class AppointmentChanges(BaseModel):
+    changes: List[AppointmentChange]
+    # Pass back as `since`; unchanged when there was nothing new
+    cursor: str
+    has_more: bool
+
+class Slot(BaseModel):
+    bay: str
+    start: datetime
+    end: datetime
+
+class AppointmentStats(BaseModel):
+    group: str
+    count: int
+    # Not split across services: None when grouping by service
+    total_price: Optional[float] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _HEALTH.start(_init_db)
+    yield
+    await _HEALTH.stop()
+    if _http is not None:
+        await _http.aclose()
+    if async_engine is not None:
+        await async_engine.dispose()
 
-app = FastAPI(title="Appointments Service")
+app = FastAPI(title="Appointments Service", lifespan=lifespan)
+instrument(app)
+setup_tracing(app, "appointments")
+_HEALTH = setup_health(app)
 
 # DB setup
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg2://garage:garage@db:5432/garage")
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# DB_ASYNC serves requests from an asyncio engine (asyncpg); the sync engine is kept for startup and as fallback
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in {"1", "true", "yes"}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def _pool_kwargs(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_recycle": DB_POOL_RECYCLE, "pool_timeout": DB_POOL_TIMEOUT}
+
+def _async_url(url: str) -> str:
+    if os.getenv("ASYNC_DATABASE_URL"):
+        return os.environ["ASYNC_DATABASE_URL"]
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            # asyncpg spells libpq's sslmode as ssl
+            return async_prefix + url[len(sync_prefix):].replace("sslmode=", "ssl=")
+    return url
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_kwargs(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+async_engine: AsyncEngine | None = None
+AsyncSessionLocal: async_sessionmaker | None = None
+if DB_ASYNC:
+    async_engine = create_async_engine(_async_url(DATABASE_URL), pool_pre_ping=True, **_pool_kwargs(DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False)
+instrument_engine(engine, "sync")
+trace_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine, "async")
+    trace_engine(async_engine.sync_engine)
 Base = declarative_base()
 
+async def run_db(fn: Callable[..., T], *args) -> T:
+    """Run ``fn(session, *args)`` on the async engine when enabled, else on the sync engine in the threadpool."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as s:
+            return await s.run_sync(fn, *args)
+
+    def _call():
+        with SessionLocal() as s:
+            return fn(s, *args)
+    return await run_in_threadpool(_call)
+
+def _naive_utc(dt: datetime | None) -> datetime | None:
+    # Columns are timezone-naive UTC; asyncpg rejects aware values for them
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
 class AppointmentRow(Base):
     __tablename__ = "appointments"
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
-    owner_id: Mapped[str] = mapped_column(String(64), index=True)
+    owner_id: Mapped[str] = mapped_column(String(64))
     customer_name: Mapped[str] = mapped_column(String(200))
     service_ids: Mapped[List[str]] = mapped_column(JSON)
     total_price: Mapped[float] = mapped_column(Float)
     scheduled_at: Mapped[datetime] = mapped_column(DateTime)
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    bay: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    ends_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Bumped on every write; recorded with each entry in appointment_changes
+    version: Mapped[int] = mapped_column(Integer, default=1)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
-def _wait_for_db(max_attempts: int = 30, delay_sec: float = 1.0) -> None:
-    attempts = 0
-    while attempts < max_attempts:
-        try:
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            return
-        except OperationalError:
-            attempts += 1
-            time.sleep(delay_sec)
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-
-_wait_for_db()
-Base.metadata.create_all(bind=engine)
+    # Keyset pagination indexes: admin listing and per-owner listing; per-bay range for conflict checks
+    __table_args__ = (
+        Index("ix_appointments_scheduled_at_id", "scheduled_at", "id"),
+        Index("ix_appointments_owner_scheduled_at_id", "owner_id", "scheduled_at", "id"),
+        Index("ix_appointments_bay_scheduled_at", "bay", "scheduled_at"),
+    )
+
+class AppointmentChangeRow(Base):
+    """Append-only log of creates, updates and deletes, read by GET /appointments/changes."""
+    __tablename__ = "appointment_changes"
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    appointment_id: Mapped[str] = mapped_column(String(64))
+    op: Mapped[str] = mapped_column(String(16))
+    version: Mapped[int] = mapped_column(Integer)
+    changed_at: Mapped[datetime] = mapped_column(DateTime)
+
+def _record_change(s: Session, row: AppointmentRow, op: str) -> None:
+    s.add(AppointmentChangeRow(appointment_id=row.id, op=op, version=row.version, changed_at=row.updated_at))
+
+# Scheduling: bays, opening hours (local to SCHEDULE_TZ) and slot length; durations come from the catalog
+BAYS = [b.strip() for b in os.getenv("BAYS", "1,2,3").split(",") if b.strip()]
+SCHEDULE_TZ = ZoneInfo(os.getenv("SCHEDULE_TZ", "UTC"))
+_opens, _closes = os.getenv("OPENING_HOURS", "08:00-18:00").split("-")
+OPENS, CLOSES = dtime.fromisoformat(_opens.strip()), dtime.fromisoformat(_closes.strip())
+_WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+OPENING_DAYS = {_WEEKDAYS.index(d.strip().lower()[:3]) for d in os.getenv("OPENING_DAYS", "mon,tue,wed,thu,fri,sat").split(",") if d.strip()}
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", "30"))
+DEFAULT_DURATION_MINUTES = int(os.getenv("DEFAULT_DURATION_MINUTES", "60"))
+MAX_BOOKING_MINUTES = int(os.getenv("MAX_BOOKING_MINUTES", "600"))
+MAX_AVAILABILITY_DAYS = int(os.getenv("MAX_AVAILABILITY_DAYS", "31"))
+# How long availability is served from the in-memory index before re-reading a day (other replicas' bookings)
+AVAILABILITY_CACHE_SEC = float(os.getenv("AVAILABILITY_CACHE_SEC", "5"))
+
+CATALOG_URL = os.getenv("CATALOG_URL", "http://catalog:8000")
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+_durations: Dict[str, tuple[float, int]] = {}
+_http: httpx.AsyncClient | None = None
+
+def _http_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(timeout=5.0, limits=httpx.Limits(max_connections=20, max_keepalive_connections=5))
+    return _http
+
+_INDEX = BookingIndex(AVAILABILITY_CACHE_SEC, timedelta(minutes=MAX_BOOKING_MINUTES))
+# Serializes conflict check + write within this process; Postgres advisory locks cover other replicas
+_BOOKING_LOCK = asyncio.Lock()
+
+# The table as create_all made it before migrations existed; later steps bring it up to AppointmentRow
+_APPOINTMENTS_V1 = Table(
+    "appointments", MetaData(),
+    Column("id", String(64), primary_key=True),
+    Column("owner_id", String(64), nullable=False, index=True),
+    Column("customer_name", String(200), nullable=False),
+    Column("service_ids", JSON, nullable=False),
+    Column("total_price", Float, nullable=False),
+    Column("scheduled_at", DateTime, nullable=False),
+    Column("notes", Text, nullable=True),
+)
+
+def _add_bays(conn) -> None:
+    add_column(conn, "appointments", Column("bay", String(32)))
+    add_column(conn, "appointments", Column("ends_at", DateTime))
+    create_index(conn, "appointments", "ix_appointments_bay_scheduled_at", "bay", "scheduled_at")
+    # Appointments booked before bays existed take the first bay and the default duration
+    conn.execute(update(AppointmentRow).where(AppointmentRow.bay.is_(None)).values(bay=BAYS[0]))
+    rows = conn.execute(select(AppointmentRow.id, AppointmentRow.scheduled_at).where(AppointmentRow.ends_at.is_(None))).all()
+    if rows:
+        conn.execute(
+            update(AppointmentRow).where(AppointmentRow.id == bindparam("row_id")).values(ends_at=bindparam("row_ends_at")),
+            [{"row_id": r.id, "row_ends_at": r.scheduled_at + timedelta(minutes=DEFAULT_DURATION_MINUTES)} for r in rows],
+        )
+
+def _add_change_log(conn) -> None:
+    add_column(conn, "appointments", Column("version", Integer))
+    add_column(conn, "appointments", Column("updated_at", DateTime))
+    create_table(conn, AppointmentChangeRow.__table__)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    conn.execute(update(AppointmentRow).where(AppointmentRow.version.is_(None)).values(version=1, updated_at=now))
+    # Start the log with every existing appointment, so reading the feed from the beginning yields the full set
+    conn.execute(AppointmentChangeRow.__table__.insert().from_select(
+        ["appointment_id", "op", "version", "changed_at"],
+        select(AppointmentRow.id, literal_column("'upsert'"), AppointmentRow.version, AppointmentRow.updated_at)
+        .order_by(AppointmentRow.scheduled_at, AppointmentRow.id),
+    ))
+
+# Append new steps; never edit or renumber one that has shipped
+MIGRATIONS = [
+    (1, "appointments table", lambda conn: create_table(conn, _APPOINTMENTS_V1)),
+    (2, "keyset pagination indexes", lambda conn: (
+        create_index(conn, "appointments", "ix_appointments_scheduled_at_id", "scheduled_at", "id"),
+        create_index(conn, "appointments", "ix_appointments_owner_scheduled_at_id", "owner_id", "scheduled_at", "id"),
+    )),
+    (3, "service bays and booking end times", _add_bays),
+    # Every owner_id lookup is served by the (owner_id, scheduled_at, id) index
+    (4, "drop ix_appointments_owner_id", lambda conn: drop_index(conn, "appointments", "ix_appointments_owner_id")),
+    (5, "versions and change log", _add_change_log),
+]
+
+def _init_db() -> None:
+    # Runs from the lifespan hook and is retried until the DB is reachable
+    migrate(engine, "appointments", MIGRATIONS)
+
+_HEALTH.add_check("db", db_check(async_engine or engine))
+
+# Also the most ids per GET /appointments?ids=; the invoices service's APPOINTMENTS_BULK_SIZE should not exceed it
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+# The change feed holds back entries younger than this, so a write that commits after a later
+# sequence number was handed out is not skipped by a consumer that already moved past it
+CHANGES_SETTLE_SEC = float(os.getenv("CHANGES_SETTLE_SEC", "1"))
+
+def encode_cursor(ts: datetime, row_id: str) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 def to_model(row: AppointmentRow) -> Appointment:
     return Appointment(
@@ -63,6 +285,10 @@ def to_model(row: AppointmentRow) -> Appointment:
         total_price=row.total_price or 0.0,
         scheduled_at=row.scheduled_at,
         notes=row.notes,
+        bay=row.bay,
+        ends_at=row.ends_at,
+        version=row.version or 1,
+        updated_at=row.updated_at,
     )
 
 @app.get("/health")
@@ -70,71 +296,341 @@ def health():
     return {"status": "ok"}
 
 @app.get("/appointments", response_model=List[Appointment])
-def list_appointments(x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+async def list_appointments(
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = Query(default=None, alias="from"),
+    date_to: Optional[datetime] = Query(default=None, alias="to"),
+    owner_id: Optional[str] = None,
+    ids: Optional[str] = Query(default=None, description="Comma-separated appointment ids (bulk lookup)"),
+    x_user_id: str | None = Header(default=None),
+    x_user_role: str | None = Header(default=None),
+):
     if not x_user_id:
         # Require auth to view appointments
         raise HTTPException(status_code=401, detail="Unauthorized")
-    with SessionLocal() as s:
+    after = decode_cursor(cursor) if cursor else None
+    id_list = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip())) if ids is not None else None
+    if id_list is not None and len(id_list) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_PAGE_SIZE} ids per request")
+
+    def _query(s: Session):
+        q = s.query(AppointmentRow)
         if x_user_role == "admin":
-            rows = s.query(AppointmentRow).all()
+            if owner_id:
+                q = q.filter(AppointmentRow.owner_id == owner_id)
         else:
-            rows = s.query(AppointmentRow).filter(AppointmentRow.owner_id == x_user_id).all()
-        return [to_model(r) for r in rows]
+            q = q.filter(AppointmentRow.owner_id == x_user_id)
+        if id_list is not None:
+            # Unknown ids (and other owners' appointments) are simply absent from the result
+            q = q.filter(AppointmentRow.id.in_(id_list))
+        if date_from:
+            q = q.filter(AppointmentRow.scheduled_at >= _naive_utc(date_from))
+        if date_to:
+            q = q.filter(AppointmentRow.scheduled_at < _naive_utc(date_to))
+        if after:
+            q = q.filter(tuple_(AppointmentRow.scheduled_at, AppointmentRow.id) > tuple_(*after))
+        q = q.order_by(AppointmentRow.scheduled_at, AppointmentRow.id)
+        if limit is None:
+            # No page requested: keep returning the full (ordered) list
+            return [to_model(r) for r in q.all()], None
+        # Fetch one extra row to learn whether another page exists
+        rows = q.limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].scheduled_at, rows[-1].id)
+        return [to_model(r) for r in rows], next_cursor
+
+    items, next_cursor = await run_db(_query)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return json_response(items, response)
+
+def _period(column, unit: str, dialect: str):
+    """`column` as text truncated to its day ("2024-05-31") or month ("2024-05")."""
+    # Formats are inlined rather than bound: with server-side parameters (asyncpg) the SELECT and
+    # GROUP BY copies of the expression would get different placeholders and no longer match
+    if dialect == "postgresql":
+        return func.to_char(column, literal_column("'YYYY-MM-DD'" if unit == "day" else "'YYYY-MM'"))
+    return func.strftime(literal_column("'%Y-%m-%d'" if unit == "day" else "'%Y-%m'"), column)
+
+@app.get("/appointments/stats", response_model=List[AppointmentStats])
+async def appointment_stats(
+    group_by: str = Query(default="day", pattern="^(day|month|service|bay)$"),
+    date_from: Optional[datetime] = Query(default=None, alias="from"),
+    date_to: Optional[datetime] = Query(default=None, alias="to"),
+    x_user_role: str | None = Header(default=None),
+):
+    """Appointment count and booked value per group, computed in the database (days are UTC)."""
+    if x_user_role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view appointment stats")
+    start, end = _naive_utc(date_from), _naive_utc(date_to)
+
+    def _query(s: Session):
+        dialect = s.get_bind().dialect.name
+        if group_by == "service":
+            # One row per element of the service_ids JSON array
+            each = "json_array_elements_text" if dialect == "postgresql" else "json_each"
+            services = getattr(func, each)(AppointmentRow.service_ids).table_valued("value")
+            group = services.c.value
+            # Functions in FROM may refer to earlier FROM items (implicitly LATERAL on Postgres)
+            q = s.query(group, func.count(), literal_column("NULL")).select_from(AppointmentRow).join(services, true())
+        else:
+            group = {
+                "day": _period(AppointmentRow.scheduled_at, "day", dialect),
+                "month": _period(AppointmentRow.scheduled_at, "month", dialect),
+                "bay": AppointmentRow.bay,
+            }[group_by]
+            q = s.query(group, func.count(), func.sum(AppointmentRow.total_price))
+        if start:
+            q = q.filter(AppointmentRow.scheduled_at >= start)
+        if end:
+            q = q.filter(AppointmentRow.scheduled_at < end)
+        return [
+            AppointmentStats(group=str(g), count=int(n), total_price=None if total is None else round(float(total), 2))
+            for g, n, total in q.group_by(group).order_by(group).all()
+        ]
+    return json_response(await run_db(_query))
+
+@app.get("/appointments/changes", response_model=AppointmentChanges)
+async def appointment_changes(
+    since: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE),
+    x_user_role: str | None = Header(default=None),
+):
+    """Appointments created, updated or deleted after the `since` cursor, oldest first.
+
+    Start without `since` to receive every appointment, then keep passing back `cursor`. Each
+    appointment appears at most once per page, with its latest state.
+    """
+    if x_user_role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can read the change feed")
+    try:
+        after = int(since) if since else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    settled = datetime.utcnow() - timedelta(seconds=CHANGES_SETTLE_SEC)
+
+    def _query(s: Session):
+        entries = (
+            s.query(AppointmentChangeRow)
+            .filter(AppointmentChangeRow.seq > after)
+            .order_by(AppointmentChangeRow.seq)
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(entries) > limit
+        latest: Dict[str, AppointmentChangeRow] = {}
+        cursor = after
+        for entry in entries[:limit]:
+            if entry.changed_at > settled:
+                # Stop at the first unsettled entry; the next call picks up from here
+                has_more = True
+                break
+            latest.pop(entry.appointment_id, None)
+            latest[entry.appointment_id] = entry
+            cursor = entry.seq
+        upserted = [aid for aid, entry in latest.items() if entry.op == "upsert"]
+        rows = {r.id: r for r in s.query(AppointmentRow).filter(AppointmentRow.id.in_(upserted))} if upserted else {}
+        changes = []
+        for aid, entry in latest.items():
+            if entry.op == "upsert":
+                row = rows.get(aid)
+                if row is None:
+                    # Deleted after this page's last entry; the delete comes in a later page
+                    continue
+                changes.append(AppointmentChange(id=aid, op="upsert", version=row.version or 1, appointment=to_model(row)))
+            else:
+                changes.append(AppointmentChange(id=aid, op="delete", version=entry.version))
+        return AppointmentChanges(changes=changes, cursor=str(cursor), has_more=has_more)
+    return json_response(await run_db(_query))
+
+async def _duration(service_ids: List[str]) -> timedelta:
+    """Total catalog duration of the booked services; DEFAULT_DURATION_MINUTES for unknown ones or no services."""
+    if not service_ids:
+        return timedelta(minutes=DEFAULT_DURATION_MINUTES)
+    now = time.time()
+    missing = [sid for sid in set(service_ids) if sid not in _durations or _durations[sid][0] <= now]
+    if missing:
+        try:
+            headers = {}
+            with client_span("GET catalog", headers, **{"catalog.ids": len(missing)}) as span:
+                resp = await _http_client().get(f"{CATALOG_URL}/services", params={"ids": ",".join(missing)}, headers=headers)
+                span.set_attribute("http.response.status_code", resp.status_code)
+            if resp.status_code == 200:
+                if len(_durations) > 1024:
+                    _durations.clear()
+                for svc in resp.json():
+                    if svc.get("duration_minutes"):
+                        _durations[svc["id"]] = (now + CATALOG_CACHE_TTL, int(svc["duration_minutes"]))
+        except Exception:
+            # Catalog unreachable: keep using expired entries, the default for the rest
+            pass
+    return timedelta(minutes=sum(_durations[sid][1] if sid in _durations else DEFAULT_DURATION_MINUTES for sid in service_ids))
+
+async def _booking_window(payload: AppointmentCreate) -> tuple[datetime, datetime]:
+    if payload.bay is not None and payload.bay not in BAYS:
+        raise HTTPException(status_code=422, detail=f"Unknown bay: {payload.bay}")
+    start = _naive_utc(payload.scheduled_at)
+    duration = await _duration(list(payload.service_ids or []))
+    if duration > timedelta(minutes=MAX_BOOKING_MINUTES):
+        raise HTTPException(status_code=422, detail=f"Booking longer than {MAX_BOOKING_MINUTES} minutes")
+    return start, start + duration
+
+_BOOKING_LOCK_KEY = zlib.crc32(b"appointments.bookings")
+
+def _assign_bay(s: Session, requested: Optional[str], start: datetime, end: datetime,
+                exclude_id: Optional[str] = None, prefer: Optional[str] = None) -> str:
+    """The requested bay, or the first free one (`prefer` first), if nothing else is booked there during [start, end); else 409."""
+    if s.get_bind().dialect.name == "postgresql":
+        # Held until commit/rollback, so two replicas can't both pass the check for the same slot
+        s.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BOOKING_LOCK_KEY})
+    candidates = [requested] if requested else sorted(BAYS, key=lambda b: b != prefer)
+    q = s.query(AppointmentRow.bay).filter(
+        AppointmentRow.bay.in_(candidates),
+        AppointmentRow.scheduled_at >= start - timedelta(minutes=MAX_BOOKING_MINUTES),
+        AppointmentRow.scheduled_at < end,
+        AppointmentRow.ends_at > start,
+    )
+    if exclude_id:
+        q = q.filter(AppointmentRow.id != exclude_id)
+    taken = {bay for (bay,) in q.distinct()}
+    free = [b for b in candidates if b not in taken]
+    if not free:
+        detail = f"Bay {requested} is already booked at that time" if requested else "No bay is free at that time"
+        raise HTTPException(status_code=409, detail=detail)
+    return free[0]
+
+def _load_bookings(s: Session, first: date, last: date) -> List[tuple]:
+    rows = (
+        s.query(AppointmentRow.bay, AppointmentRow.scheduled_at, AppointmentRow.ends_at, AppointmentRow.id)
+        .filter(
+            AppointmentRow.scheduled_at >= datetime.combine(first, dtime()),
+            AppointmentRow.scheduled_at < datetime.combine(last + timedelta(days=1), dtime()),
+        )
+        .all()
+    )
+    return [(bay, start, end or start + timedelta(minutes=DEFAULT_DURATION_MINUTES), rid) for bay, start, end, rid in rows]
+
+@app.get("/appointments/availability", response_model=List[Slot])
+async def availability(
+    date_from: datetime = Query(alias="from"),
+    date_to: datetime = Query(alias="to"),
+    bay: Optional[str] = None,
+    duration: Optional[int] = Query(default=None, ge=1, le=MAX_BOOKING_MINUTES),
+    service_ids: Optional[str] = None,
+):
+    """Free slots within opening hours, every SLOT_MINUTES, long enough for `duration` minutes,
+    the catalog duration of `service_ids`, or one slot."""
+    start, end = _naive_utc(date_from), _naive_utc(date_to)
+    if end <= start or end - start > timedelta(days=MAX_AVAILABILITY_DAYS):
+        raise HTTPException(status_code=400, detail=f"'to' must be after 'from' and at most {MAX_AVAILABILITY_DAYS} days later")
+    if bay is not None and bay not in BAYS:
+        raise HTTPException(status_code=404, detail=f"Unknown bay: {bay}")
+    if duration:
+        length = timedelta(minutes=duration)
+    elif service_ids:
+        length = await _duration([sid for sid in service_ids.split(",") if sid])
+    else:
+        length = timedelta(minutes=SLOT_MINUTES)
+
+    windows = opening_windows(start, end, SCHEDULE_TZ, OPENS, CLOSES, OPENING_DAYS)
+    if not windows:
+        return json_response([])
+    stale = _INDEX.days_to_load(windows[0][0], windows[-1][1])
+    if stale:
+        _INDEX.load(*stale, await run_db(_load_bookings, *stale))
+    step = timedelta(minutes=SLOT_MINUTES)
+    slots = [
+        {"bay": b, "start": slot_start, "end": slot_end}
+        for b in ([bay] if bay else BAYS)
+        for window in windows
+        for slot_start, slot_end in free_slots(_INDEX.busy(b, *window), window, length, step)
+        # Slots stay aligned to opening time; drop the ones outside the requested range
+        if slot_start >= start and slot_end <= end
+    ]
+    slots.sort(key=lambda slot: (slot["start"], BAYS.index(slot["bay"])))
+    return json_response(slots)
 
 @app.post("/appointments", response_model=Appointment, status_code=201)
-def create_appointment(payload: AppointmentCreate, x_user_id: str | None = Header(default=None)):
+async def create_appointment(payload: AppointmentCreate, x_user_id: str | None = Header(default=None)):
     if not x_user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
     aid = str(uuid4())
-    with SessionLocal() as s:
+    start, end = await _booking_window(payload)
+
+    def _create(s: Session):
         row = AppointmentRow(
             id=aid,
             owner_id=x_user_id,
             customer_name=payload.customer_name,
             service_ids=list(payload.service_ids or []),
             total_price=float(payload.total_price or 0.0),
-            scheduled_at=payload.scheduled_at,
+            scheduled_at=start,
             notes=payload.notes,
+            bay=_assign_bay(s, payload.bay, start, end),
+            ends_at=end,
+            version=1,
+            updated_at=datetime.utcnow(),
         )
         s.add(row)
+        _record_change(s, row, "upsert")
         s.commit()
         return to_model(row)
+    async with _BOOKING_LOCK:
+        appointment = await run_db(_create)
+    _INDEX.add(appointment.bay, start, end, appointment.id)
+    return appointment
 
-@app.get("/appointments/{appointment_id}", response_model=Appointment)
-def get_appointment(appointment_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
-    with SessionLocal() as s:
-        row = s.query(AppointmentRow).get(appointment_id)
-        if not row:
-            raise HTTPException(status_code=404, detail="Appointment not found")
-        if x_user_role == "admin" or (x_user_id and row.owner_id == x_user_id):
-            return to_model(row)
+def _get_authorized(s: Session, appointment_id: str, x_user_id: str | None, x_user_role: str | None) -> AppointmentRow:
+    row = s.get(AppointmentRow, appointment_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    if not (x_user_role == "admin" or (x_user_id and row.owner_id == x_user_id)):
         raise HTTPException(status_code=403, detail="Forbidden")
+    return row
+
+@app.get("/appointments/{appointment_id}", response_model=Appointment)
+async def get_appointment(appointment_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+    def _get(s: Session):
+        return to_model(_get_authorized(s, appointment_id, x_user_id, x_user_role))
+    return await run_db(_get)
 
 @app.put("/appointments/{appointment_id}", response_model=Appointment)
-def update_appointment(appointment_id: str, payload: AppointmentCreate, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
-    with SessionLocal() as s:
-        row = s.query(AppointmentRow).get(appointment_id)
-        if not row:
-            raise HTTPException(status_code=404, detail="Appointment not found")
-        if not (x_user_role == "admin" or (x_user_id and row.owner_id == x_user_id)):
-            raise HTTPException(status_code=403, detail="Forbidden")
+async def update_appointment(appointment_id: str, payload: AppointmentCreate, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+    start, end = await _booking_window(payload)
+
+    def _update(s: Session):
+        row = _get_authorized(s, appointment_id, x_user_id, x_user_role)
+        row.bay = _assign_bay(s, payload.bay, start, end, exclude_id=row.id, prefer=row.bay)
         row.customer_name = payload.customer_name
         row.service_ids = list(payload.service_ids or [])
         row.total_price = float(payload.total_price or 0.0)
-        row.scheduled_at = payload.scheduled_at
+        row.scheduled_at = start
+        row.ends_at = end
         row.notes = payload.notes
+        row.version = (row.version or 1) + 1
+        row.updated_at = datetime.utcnow()
+        _record_change(s, row, "upsert")
         s.commit()
         s.refresh(row)
         return to_model(row)
+    async with _BOOKING_LOCK:
+        appointment = await run_db(_update)
+    _INDEX.add(appointment.bay, start, end, appointment.id)
+    return appointment
 
 @app.delete("/appointments/{appointment_id}", status_code=204)
-def delete_appointment(appointment_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
-    with SessionLocal() as s:
-        row = s.query(AppointmentRow).get(appointment_id)
-        if not row:
-            raise HTTPException(status_code=404, detail="Appointment not found")
-        if not (x_user_role == "admin" or (x_user_id and row.owner_id == x_user_id)):
-            raise HTTPException(status_code=403, detail="Forbidden")
+async def delete_appointment(appointment_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+    def _delete(s: Session):
+        row = _get_authorized(s, appointment_id, x_user_id, x_user_role)
+        row.version = (row.version or 1) + 1
+        row.updated_at = datetime.utcnow()
+        _record_change(s, row, "delete")
         s.delete(row)
         s.commit()
-        return None
+    await run_db(_delete)
+    _INDEX.remove(appointment_id)
+    return None
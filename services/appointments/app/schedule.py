@@ -0,0 +1,144 @@
+"""Bay scheduling: an in-memory interval index over bookings and free-slot search.
+
+Bookings are kept per start day and bay, each list sorted by start, so finding the
+bookings that overlap a window is a bisect per day touched. Days are filled from the
+database with one range query on first use and re-read once older than ``ttl``, which
+is how bookings made through other replicas show up. Writes made by this process
+update the index straight away. The index only serves availability reads; conflict
+checks on booking run against the database.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+Booking = Tuple[datetime, datetime, str]  # (start, end, appointment id)
+
+class BookingIndex:
+    def __init__(self, ttl: float, max_duration: timedelta, max_days: int = 400):
+        self.ttl = ttl
+        self.max_duration = max_duration
+        self.max_days = max_days
+        # day -> bay -> bookings starting that day, sorted
+        self._days: "OrderedDict[date, Dict[str, List[Booking]]]" = OrderedDict()
+        self._loaded_at: Dict[date, float] = {}
+        self._where: Dict[str, Tuple[date, str, Booking]] = {}
+        self._lock = threading.Lock()
+
+    def days_to_load(self, start: datetime, end: datetime) -> Optional[Tuple[date, date]]:
+        """First and last day that must be (re)loaded to answer for [start, end), or None if all are fresh."""
+        now = time.monotonic()
+        day, last = (start - self.max_duration).date(), (end - timedelta(microseconds=1)).date()
+        stale = []
+        while day <= last:
+            if now - self._loaded_at.get(day, float("-inf")) >= self.ttl:
+                stale.append(day)
+            day += timedelta(days=1)
+        return (stale[0], stale[-1]) if stale else None
+
+    def load(self, first: date, last: date, rows: Iterable[Tuple[str, datetime, datetime, str]]) -> None:
+        """Replace days first..last with `rows` of (bay, start, end, id) read from the database."""
+        days: Dict[date, Dict[str, List[Booking]]] = {}
+        day = first
+        while day <= last:
+            days[day] = {}
+            day += timedelta(days=1)
+        for bay, start, end, booking_id in rows:
+            if start.date() in days:
+                days[start.date()].setdefault(bay, []).append((start, end, booking_id))
+        now = time.monotonic()
+        with self._lock:
+            for day, bays in days.items():
+                for old in self._days.pop(day, {}).values():
+                    for booking in old:
+                        self._where.pop(booking[2], None)
+                for bay, bookings in bays.items():
+                    bookings.sort()
+                    for booking in bookings:
+                        self._where[booking[2]] = (day, bay, booking)
+                self._days[day] = bays
+                self._loaded_at[day] = now
+            while len(self._days) > self.max_days:
+                day, bays = self._days.popitem(last=False)
+                self._loaded_at.pop(day, None)
+                for bookings in bays.values():
+                    for booking in bookings:
+                        self._where.pop(booking[2], None)
+
+    def add(self, bay: str, start: datetime, end: datetime, booking_id: str) -> None:
+        with self._lock:
+            self._remove(booking_id)
+            bays = self._days.get(start.date())
+            if bays is None:
+                # Day not loaded yet; it will be read from the database when first needed
+                return
+            booking = (start, end, booking_id)
+            insort(bays.setdefault(bay, []), booking)
+            self._where[booking_id] = (start.date(), bay, booking)
+
+    def remove(self, booking_id: str) -> None:
+        with self._lock:
+            self._remove(booking_id)
+
+    def _remove(self, booking_id: str) -> None:
+        entry = self._where.pop(booking_id, None)
+        if entry is None:
+            return
+        day, bay, booking = entry
+        bookings = self._days.get(day, {}).get(bay, [])
+        i = bisect_left(bookings, booking)
+        if i < len(bookings) and bookings[i] == booking:
+            del bookings[i]
+
+    def busy(self, bay: str, start: datetime, end: datetime) -> List[Booking]:
+        """Bookings in `bay` overlapping [start, end), sorted by start."""
+        out: List[Booking] = []
+        earliest = start - self.max_duration
+        day, last = earliest.date(), (end - timedelta(microseconds=1)).date()
+        with self._lock:
+            while day <= last:
+                bookings = self._days.get(day, {}).get(bay, [])
+                lo = bisect_left(bookings, (earliest,))
+                hi = bisect_left(bookings, (end,))
+                out.extend(b for b in bookings[lo:hi] if b[1] > start)
+                day += timedelta(days=1)
+        return out
+
+def opening_windows(start: datetime, end: datetime, tz: ZoneInfo, opens: dtime, closes: dtime,
+                    weekdays: set) -> List[Tuple[datetime, datetime]]:
+    """Opening hours (naive UTC) of each local day touching [start, end); `opens`, `closes` and `weekdays` are local to `tz`."""
+    utc = ZoneInfo("UTC")
+    windows = []
+    day = start.replace(tzinfo=utc).astimezone(tz).date()
+    last = end.replace(tzinfo=utc).astimezone(tz).date()
+    while day <= last:
+        if day.weekday() in weekdays:
+            w_start = datetime.combine(day, opens, tzinfo=tz).astimezone(utc).replace(tzinfo=None)
+            w_end = datetime.combine(day, closes, tzinfo=tz).astimezone(utc).replace(tzinfo=None)
+            if w_start < end and w_end > start:
+                windows.append((w_start, w_end))
+        day += timedelta(days=1)
+    return windows
+
+def free_slots(busy: List[Booking], window: Tuple[datetime, datetime], duration: timedelta,
+               step: timedelta) -> List[Tuple[datetime, datetime]]:
+    """Slot starts every `step` within `window` where `duration` fits between the `busy` bookings (sorted by start)."""
+    w_start, w_end = window
+    slots = []
+    t = w_start
+    i = 0
+    while t + duration <= w_end:
+        # Bookings before i are over by t, and none after busy[i] starts earlier than it
+        while i < len(busy) and busy[i][1] <= t:
+            i += 1
+        if i < len(busy) and busy[i][0] < t + duration:
+            # Jump to the first step boundary after that booking ends
+            steps = -((w_start - busy[i][1]) // step)
+            t = w_start + steps * step
+            continue
+        slots.append((t, t + duration))
+        t += step
+    return slots
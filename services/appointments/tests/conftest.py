@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+# Allow `pytest services/appointments/tests` from the repo root and run without Postgres by default
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# services/, for the shared testing_db helpers
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+if "DATABASE_URL" not in os.environ:
+    # Start from an empty database: bookings left by an earlier run would conflict with the slots the tests book
+    _db_path = os.path.join(tempfile.gettempdir(), "appointments-test.db")
+    if os.path.exists(_db_path):
+        os.remove(_db_path)
+    os.environ["DATABASE_URL"] = "sqlite:///" + _db_path
+# No catalog in tests: every service takes DEFAULT_DURATION_MINUTES
+os.environ.setdefault("CATALOG_URL", "http://127.0.0.1:9")
+# Serve change feed entries as soon as they are committed
+os.environ.setdefault("CHANGES_SETTLE_SEC", "0")
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from testing_db import query_plans  # noqa: F401 (fixture)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    # Startup work (migrations) runs in the background from the lifespan; wait until the service is ready
+    with TestClient(app) as c:
+        deadline = time.monotonic() + 10
+        while c.get("/readyz").status_code != 200:
+            assert time.monotonic() < deadline, c.get("/readyz").json()
+            time.sleep(0.05)
+        yield c
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+# A Monday, inside the default opening hours (08:00-18:00 UTC, Mon-Sat) with 3 bays and 60-minute bookings
+DAY = datetime(2033, 3, 7)
+
+def _book(client, when: datetime, bay: str | None = None):
+    body = {"customer_name": "Sam", "scheduled_at": when.isoformat()}
+    if bay:
+        body["bay"] = bay
+    return client.post("/appointments", json=body, headers={"x-user-id": str(uuid4())})
+
+def _free(client, **params):
+    resp = client.get("/appointments/availability", params={"from": DAY.isoformat(), "to": (DAY + timedelta(days=1)).isoformat(), **params})
+    assert resp.status_code == 200
+    return [(s["bay"], s["start"][11:16]) for s in resp.json()]
+
+def test_overlapping_booking_in_same_bay_is_rejected(client):
+    first = _book(client, DAY.replace(hour=9), bay="1")
+    assert first.status_code == 201
+    assert first.json()["ends_at"] == DAY.replace(hour=10).isoformat()
+
+    assert _book(client, DAY.replace(hour=9, minute=30), bay="1").status_code == 409
+    # Without a bay the next free one is assigned
+    assert _book(client, DAY.replace(hour=9, minute=30)).json()["bay"] == "2"
+
+def test_availability_skips_booked_slots(client):
+    _book(client, DAY.replace(hour=14), bay="3")
+    free = _free(client, bay="3", duration=60)
+    assert ("3", "13:00") in free and ("3", "15:00") in free
+    # 13:30 would run into the 14:00 booking, 14:00 and 14:30 overlap it
+    assert not {("3", "13:30"), ("3", "14:00"), ("3", "14:30")} & set(free)
+    assert free[0] == ("3", "08:00") and free[-1] == ("3", "17:00")
+
+def test_availability_respects_opening_days(client):
+    sunday = DAY - timedelta(days=1)
+    resp = client.get("/appointments/availability", params={"from": sunday.isoformat(), "to": DAY.isoformat()})
+    assert resp.status_code == 200
+    assert resp.json() == []
@@ -0,0 +1,39 @@
+from datetime import datetime
+from uuid import uuid4
+
+ADMIN = {"x-user-id": str(uuid4()), "x-user-role": "admin"}
+
+def _drain(client, since=None):
+    changes = []
+    while True:
+        body = client.get("/appointments/changes", params={"since": since} if since else {}, headers=ADMIN).json()
+        changes.extend(body["changes"])
+        since = body["cursor"]
+        if not body["has_more"]:
+            return changes, since
+
+def test_bulk_lookup_by_ids(client):
+    owner = {"x-user-id": str(uuid4())}
+    made = [
+        client.post("/appointments", json={"customer_name": "Jo", "scheduled_at": datetime(2037, 1, 5, 9 + i).isoformat()}, headers=owner).json()
+        for i in range(3)
+    ]
+    ids = ",".join([made[2]["id"], made[0]["id"], "missing"])
+    found = client.get("/appointments", params={"ids": ids}, headers=ADMIN).json()
+    assert [a["id"] for a in found] == [made[0]["id"], made[2]["id"]]
+    # Customers only see their own
+    assert client.get("/appointments", params={"ids": ids}, headers={"x-user-id": str(uuid4())}).json() == []
+
+def test_change_feed_reports_only_deltas(client):
+    _, cursor = _drain(client)
+    owner = {"x-user-id": str(uuid4())}
+    kept = client.post("/appointments", json={"customer_name": "Al", "scheduled_at": "2037-02-02T09:00:00"}, headers=owner).json()
+    gone = client.post("/appointments", json={"customer_name": "Bo", "scheduled_at": "2037-02-02T11:00:00"}, headers=owner).json()
+    moved = client.put(f"/appointments/{kept['id']}", json={"customer_name": "Al", "scheduled_at": "2037-02-02T13:00:00"}, headers=owner).json()
+    assert moved["version"] == 2
+    assert client.delete(f"/appointments/{gone['id']}", headers=owner).status_code == 204
+
+    changes, cursor = _drain(client, cursor)
+    assert [(c["id"], c["op"], c["version"]) for c in changes] == [(kept["id"], "upsert", 2), (gone["id"], "delete", 2)]
+    assert changes[0]["appointment"]["scheduled_at"] == "2037-02-02T13:00:00"
+    assert _drain(client, cursor) == ([], cursor)
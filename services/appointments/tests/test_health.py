@@ -7,3 +7,10 @@ def test_health():
     resp = client.get("/health")
     assert resp.status_code == 200
     assert resp.json()["status"] == "ok"
+
+def test_livez_and_readyz(client):
+    assert client.get("/livez").json()["status"] == "ok"
+    body = client.get("/readyz").json()
+    assert body["status"] == "ok"
+    assert body["checks"] == {"db": "ok"}
+    assert body["startup_seconds"] >= 0
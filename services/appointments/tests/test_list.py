@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+def _create(client, owner: str, when: datetime):
+    resp = client.post(
+        "/appointments",
+        json={"customer_name": "Pat", "scheduled_at": when.isoformat()},
+        headers={"x-user-id": owner},
+    )
+    assert resp.status_code == 201
+    return resp.json()
+
+def test_keyset_pagination_walks_all_rows_in_order(client):
+    owner = str(uuid4())
+    base = datetime(2030, 1, 1, 9, 0)
+    created = [_create(client, owner, base + timedelta(hours=i)) for i in range(5)]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/appointments", params=params, headers={"x-user-id": owner})
+        assert resp.status_code == 200
+        seen.extend(a["id"] for a in resp.json())
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == [a["id"] for a in created]
+
+def test_date_range_filter(client):
+    owner = str(uuid4())
+    base = datetime(2031, 6, 1, 9, 0)
+    for i in range(3):
+        _create(client, owner, base + timedelta(days=i))
+    resp = client.get(
+        "/appointments",
+        params={"from": (base + timedelta(days=1)).isoformat(), "to": (base + timedelta(days=2)).isoformat()},
+        headers={"x-user-id": owner},
+    )
+    assert resp.status_code == 200
+    assert len(resp.json()) == 1
+
+def test_owner_filter_ignored_for_customers(client):
+    owner = str(uuid4())
+    _create(client, owner, datetime(2032, 1, 1, 9, 0))
+    resp = client.get("/appointments", params={"owner_id": owner}, headers={"x-user-id": str(uuid4())})
+    assert resp.status_code == 200
+    assert resp.json() == []
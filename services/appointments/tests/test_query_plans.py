@@ -0,0 +1,59 @@
+import sqlite3
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.main import AppointmentRow, SessionLocal
+from testing_db import PLAN_CHECK_MIN_ROWS, _full_scans
+
+START = datetime(2034, 1, 2, 8, 0)
+
+def _seed(owners):
+    # Enough rows that a query reading the whole table fails the plan check
+    with SessionLocal() as s:
+        s.add_all(
+            AppointmentRow(id=str(uuid4()), owner_id=owners[i % len(owners)], customer_name="Seed", service_ids=[],
+                           total_price=0.0, scheduled_at=START + timedelta(hours=i), notes=None,
+                           bay="1", ends_at=START + timedelta(hours=i, minutes=30))
+            for i in range(PLAN_CHECK_MIN_ROWS * 2)
+        )
+        s.commit()
+
+def test_handler_queries_use_indexes(client, query_plans):
+    owners = [str(uuid4()) for _ in range(10)]
+    _seed(owners)
+    owner = {"x-user-id": owners[0]}
+    admin = {"x-user-id": str(uuid4()), "x-user-role": "admin"}
+    week = {"from": START.isoformat(), "to": (START + timedelta(days=7)).isoformat()}
+
+    assert client.get("/appointments", params={"limit": 20}, headers=owner).status_code == 200
+    page = client.get("/appointments", params={"limit": 20, **week}, headers=admin)
+    assert client.get("/appointments", params={"limit": 20, "cursor": page.headers["x-next-cursor"]}, headers=admin).status_code == 200
+    assert client.get("/appointments", params={"limit": 20, "owner_id": owners[1]}, headers=admin).status_code == 200
+    assert client.get("/appointments/availability", params=week).status_code == 200
+    ids = ",".join(a["id"] for a in page.json()[:5])
+    assert len(client.get("/appointments", params={"ids": ids}, headers=admin).json()) == 5
+    assert client.get("/appointments/changes", params={"limit": 20}, headers=admin).status_code == 200
+
+    created = client.post("/appointments", json={"customer_name": "Kim", "scheduled_at": (START + timedelta(minutes=30)).isoformat()}, headers=owner)
+    assert created.status_code == 201
+    appointment_id = created.json()["id"]
+    assert client.get(f"/appointments/{appointment_id}", headers=owner).status_code == 200
+    moved = {"customer_name": "Kim", "scheduled_at": (START + timedelta(days=1, minutes=30)).isoformat()}
+    assert client.put(f"/appointments/{appointment_id}", json=moved, headers=owner).status_code == 200
+    assert client.delete(f"/appointments/{appointment_id}", headers=owner).status_code == 204
+
+def test_index_walks_pass_only_when_they_give_the_order():
+    cursor = sqlite3.connect(":memory:").cursor()
+    cursor.execute("CREATE TABLE t (id, a, b)")
+    cursor.execute("CREATE INDEX ix_t_a_id ON t (a, id)")
+
+    def scans(statement):
+        return _full_scans(cursor, "sqlite", statement, (5,) * statement.count("?"))
+
+    # A keyset page stops walking the index after LIMIT rows
+    assert scans("SELECT t.id FROM t ORDER BY t.a DESC, t.id DESC LIMIT ? OFFSET ?") == []
+    # Having a LIMIT is not enough: these walk or sort everything first
+    assert scans("SELECT t.a FROM t LIMIT ?") == ["t"]
+    assert scans("SELECT t.id FROM t ORDER BY t.b LIMIT ?") == ["t"]
+    assert scans("SELECT t.id FROM t ORDER BY t.a, t.b LIMIT ?") == ["t"]
+    assert scans("SELECT t.id FROM t ORDER BY t.a") == ["t"]
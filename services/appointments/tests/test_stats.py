@@ -0,0 +1,25 @@
+from datetime import datetime
+from uuid import uuid4
+
+ADMIN = {"x-user-id": str(uuid4()), "x-user-role": "admin"}
+RANGE = {"from": "2036-05-01T00:00:00", "to": "2036-06-01T00:00:00"}
+
+def _book(client, when: datetime, service_ids, price: float):
+    body = {"customer_name": "Lee", "scheduled_at": when.isoformat(), "service_ids": service_ids, "total_price": price}
+    assert client.post("/appointments", json=body, headers={"x-user-id": str(uuid4())}).status_code == 201
+
+def test_stats_group_in_sql(client):
+    _book(client, datetime(2036, 5, 5, 9), ["oil", "tires"], 80.0)
+    _book(client, datetime(2036, 5, 5, 13), ["oil"], 50.0)
+    _book(client, datetime(2036, 5, 6, 9), [], 20.0)
+
+    by_day = client.get("/appointments/stats", params={"group_by": "day", **RANGE}, headers=ADMIN).json()
+    assert by_day == [
+        {"group": "2036-05-05", "count": 2, "total_price": 130.0},
+        {"group": "2036-05-06", "count": 1, "total_price": 20.0},
+    ]
+    by_service = client.get("/appointments/stats", params={"group_by": "service", **RANGE}, headers=ADMIN).json()
+    assert [(r["group"], r["count"]) for r in by_service] == [("oil", 2), ("tires", 1)]
+
+def test_stats_are_admin_only(client):
+    assert client.get("/appointments/stats", headers={"x-user-id": str(uuid4())}).status_code == 403
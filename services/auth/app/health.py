@@ -0,0 +1,167 @@
+"""Liveness/readiness probes and background startup.
+
+Copied into each service's build context like metrics.py; keep the copies identical.
+
+Startup work (waiting for the DB, create_all, seeding) runs in the background from the
+lifespan hook and is retried until it succeeds, so the process accepts connections at
+once. Until then /readyz and every other route answer 503; /livez is always 200.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from prometheus_client import Gauge
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+READY_CACHE_SEC = float(os.getenv("READY_CACHE_SEC", "2"))
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "2"))
+STARTUP_RETRY_SEC = float(os.getenv("STARTUP_RETRY_SEC", "2"))
+
+# Paths served before startup completes
+PROBE_PATHS = {"/livez", "/readyz", "/metrics", "/health"}
+
+STARTUP_SECONDS = Gauge("service_startup_seconds", "Time from process start until startup work completed")
+
+logger = logging.getLogger("health")
+
+Check = Callable[[], Awaitable[None]]
+
+class Health:
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.startup_seconds: Optional[float] = None
+        self.startup_error: Optional[str] = None
+        self._checks: Dict[str, Tuple[Check, bool]] = {}
+        self._cached: Optional[Tuple[float, int, dict]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self.startup_seconds is not None
+
+    def add_check(self, name: str, check: Check, critical: bool = True) -> None:
+        """Register a readiness check: an async callable that raises when the dependency is unusable.
+
+        Non-critical checks are reported in the /readyz body but do not make the service unready.
+        """
+        self._checks[name] = (check, critical)
+
+    def start(self, startup: Optional[Callable] = None) -> None:
+        """Run `startup` in the background, retrying every STARTUP_RETRY_SEC until it succeeds.
+
+        A plain function runs in the threadpool; a coroutine function is awaited.
+        """
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run_startup(startup))
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run_startup(self, startup) -> None:
+        while startup is not None:
+            try:
+                if asyncio.iscoroutinefunction(startup):
+                    await startup()
+                else:
+                    await run_in_threadpool(startup)
+                break
+            except Exception as e:
+                self.startup_error = str(e)
+                logger.warning("startup failed, retrying in %ss: %s", STARTUP_RETRY_SEC, e)
+                await asyncio.sleep(STARTUP_RETRY_SEC)
+        self.startup_error = None
+        self.startup_seconds = time.monotonic() - self.created_at
+        STARTUP_SECONDS.set(self.startup_seconds)
+        logger.info("startup completed in %.2fs", self.startup_seconds)
+
+    async def _run_check(self, check: Check) -> Optional[str]:
+        try:
+            await asyncio.wait_for(check(), READY_CHECK_TIMEOUT)
+            return None
+        except asyncio.TimeoutError:
+            return "timeout"
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+    async def readiness(self) -> Tuple[int, dict]:
+        if not self.started:
+            return 503, {"status": "starting", "error": self.startup_error}
+        now = time.monotonic()
+        if self._cached and self._cached[0] > now:
+            return self._cached[1], self._cached[2]
+        async with self._lock:
+            # Concurrent probes share one round of checks
+            if self._cached and self._cached[0] > time.monotonic():
+                return self._cached[1], self._cached[2]
+            names = list(self._checks)
+            errors = await asyncio.gather(*(self._run_check(self._checks[n][0]) for n in names))
+            checks = {n: ("ok" if err is None else err) for n, err in zip(names, errors)}
+            failed = [n for n, err in zip(names, errors) if err is not None]
+            critical = [n for n in failed if self._checks[n][1]]
+            status = "unavailable" if critical else ("degraded" if failed else "ok")
+            body = {"status": status, "checks": checks, "startup_seconds": round(self.startup_seconds, 3)}
+            code = 503 if critical else 200
+            self._cached = (time.monotonic() + READY_CACHE_SEC, code, body)
+            return code, body
+
+    async def livez(self, request) -> JSONResponse:
+        return JSONResponse({"status": "ok", "uptime_seconds": round(time.monotonic() - self.created_at, 3)})
+
+    async def readyz(self, request) -> JSONResponse:
+        code, body = await self.readiness()
+        return JSONResponse(body, status_code=code)
+
+class StartupGateMiddleware:
+    """Answers 503 (with Retry-After) for application routes until startup has completed."""
+
+    def __init__(self, app, health: Health):
+        self.app = app
+        self.health = health
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not self.health.started and scope["path"] not in PROBE_PATHS:
+            response = JSONResponse({"detail": "Service starting"}, status_code=503,
+                                    headers={"Retry-After": str(max(1, int(STARTUP_RETRY_SEC)))})
+            return await response(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+def setup_health(app) -> Health:
+    """Add /livez, /readyz and the startup gate; call ``health.start(...)`` from the lifespan."""
+    health = Health()
+    app.add_middleware(StartupGateMiddleware, health=health)
+    app.add_route("/livez", health.livez, include_in_schema=False)
+    app.add_route("/readyz", health.readyz, include_in_schema=False)
+    return health
+
+def db_check(engine) -> Check:
+    """Readiness check that checks out a pooled connection and runs SELECT 1 (sync or async engine)."""
+    from sqlalchemy import text
+
+    def _ping():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    async def check():
+        if hasattr(engine, "sync_engine"):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        else:
+            await run_in_threadpool(_ping)
+    return check
+
+def http_check(get_client: Callable, url: str) -> Check:
+    """Readiness check that GETs `url` (e.g. an upstream's /livez) with the httpx.AsyncClient from `get_client()`."""
+    async def check():
+        resp = await get_client().get(url, timeout=READY_CHECK_TIMEOUT)
+        if resp.status_code >= 500:
+            raise RuntimeError(f"HTTP {resp.status_code}")
+    return check
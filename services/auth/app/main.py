@@ -1,20 +1,50 @@
 import os
-import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from typing import Callable, TypeVar
 from uuid import uuid4
 
 import jwt
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from passlib.context import CryptContext
-from sqlalchemy import create_engine, String, text
-from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import create_engine, Column, MetaData, String, Table
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker, Session
+
+from .passwords import hash_password, verify_password, warm_up
+from .health import db_check, setup_health
+from .metrics import instrument, instrument_engine
+from .migrations import create_table, migrate
+from .tracing import setup_tracing, trace_engine
+
+T = TypeVar("T")
 
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 ALGO = "HS256"
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs in a dedicated process pool (HASH_WORKERS=0 falls back to the threadpool).
+# Beyond HASH_MAX_QUEUE waiting jobs, requests are rejected with 429 instead of piling up.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", str(max(HASH_WORKERS, 1) * 8)))
+
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_pending = 0
+
+async def _run_hash(fn: Callable[..., T], *args) -> T:
+    global _hash_pending
+    if _hash_pending >= HASH_WORKERS + HASH_MAX_QUEUE:
+        raise HTTPException(429, "Too many password operations in progress", headers={"Retry-After": "1"})
+    _hash_pending += 1
+    try:
+        if _hash_pool is None:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
+    finally:
+        _hash_pending -= 1
 
 class Register(BaseModel):
     username: str
@@ -25,14 +55,79 @@ class Login(BaseModel):
     username: str
     password: str
 
-app = FastAPI(title="Auth Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _hash_pool
+    if HASH_WORKERS > 0:
+        _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    _HEALTH.start(_startup)
+    try:
+        yield
+    finally:
+        await _HEALTH.stop()
+        if _hash_pool is not None:
+            _hash_pool.shutdown(cancel_futures=True)
+            _hash_pool = None
+        if async_engine is not None:
+            await async_engine.dispose()
+
+app = FastAPI(title="Auth Service", lifespan=lifespan)
+instrument(app)
+setup_tracing(app, "auth")
+_HEALTH = setup_health(app)
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg2://garage:garage@db:5432/garage")
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# DB_ASYNC serves requests from an asyncio engine (asyncpg); the sync engine is kept for startup and as fallback
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in {"1", "true", "yes"}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def _pool_kwargs(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_recycle": DB_POOL_RECYCLE, "pool_timeout": DB_POOL_TIMEOUT}
+
+def _async_url(url: str) -> str:
+    if os.getenv("ASYNC_DATABASE_URL"):
+        return os.environ["ASYNC_DATABASE_URL"]
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            # asyncpg spells libpq's sslmode as ssl
+            return async_prefix + url[len(sync_prefix):].replace("sslmode=", "ssl=")
+    return url
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_kwargs(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+async_engine: AsyncEngine | None = None
+AsyncSessionLocal: async_sessionmaker | None = None
+if DB_ASYNC:
+    async_engine = create_async_engine(_async_url(DATABASE_URL), pool_pre_ping=True, **_pool_kwargs(DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False)
+instrument_engine(engine, "sync")
+trace_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine, "async")
+    trace_engine(async_engine.sync_engine)
 Base = declarative_base()
 
+async def run_db(fn: Callable[..., T], *args) -> T:
+    """Run ``fn(session, *args)`` on the async engine when enabled, else on the sync engine in the threadpool."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as s:
+            return await s.run_sync(fn, *args)
+
+    def _call():
+        with SessionLocal() as s:
+            return fn(s, *args)
+    return await run_in_threadpool(_call)
+
 class User(Base):
     __tablename__ = "users"
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
@@ -40,57 +135,95 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255))
     role: Mapped[str] = mapped_column(String(32))
 
-def _wait_for_db(max_attempts: int = 30, delay_sec: float = 1.0) -> None:
-    attempts = 0
-    while attempts < max_attempts:
-        try:
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            return
-        except OperationalError:
-            attempts += 1
-            time.sleep(delay_sec)
-    # Final attempt (let it raise if still failing)
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-
-_wait_for_db()
-Base.metadata.create_all(bind=engine)
-
-# seed admin
-with SessionLocal() as s:
-    existing = s.query(User).filter(User.username == "admin").first()
-    if not existing:
-        uid = str(uuid4())
-        s.add(User(id=uid, username="admin", password_hash=pwd_ctx.hash("admin123"), role="admin"))
-        s.commit()
+# The table as create_all made it before migrations existed; later steps bring it up to User
+_USERS_V1 = Table(
+    "users", MetaData(),
+    Column("id", String(64), primary_key=True),
+    Column("username", String(120), nullable=False, unique=True, index=True),
+    Column("password_hash", String(255), nullable=False),
+    Column("role", String(32), nullable=False),
+)
+
+# Append new steps; never edit or renumber one that has shipped
+MIGRATIONS = [
+    (1, "users table", lambda conn: create_table(conn, _USERS_V1)),
+]
+
+def _init_db() -> None:
+    migrate(engine, "auth", MIGRATIONS)
+
+    # seed admin
+    with SessionLocal() as s:
+        existing = s.query(User).filter(User.username == "admin").first()
+        if not existing:
+            uid = str(uuid4())
+            s.add(User(id=uid, username="admin", password_hash=hash_password("admin123"), role="admin"))
+            s.commit()
+
+async def _startup() -> None:
+    # Runs from the lifespan hook and is retried until the DB is reachable
+    if _hash_pool is not None:
+        # Start the workers now rather than on the first login
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(_hash_pool, warm_up) for _ in range(HASH_WORKERS)))
+    await run_in_threadpool(_init_db)
+
+_HEALTH.add_check("db", db_check(async_engine or engine))
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+def _username_taken(e: IntegrityError) -> bool:
+    # Postgres names the violated index, SQLite the indexed column
+    message = str(e.orig)
+    return "ix_users_username" in message or "UNIQUE constraint failed: users.username" in message
+
 @app.post("/register")
-def register(body: Register):
-    with SessionLocal() as s:
-        existing = s.query(User).filter(User.username == body.username).first()
-        if existing:
+async def register(body: Register):
+    def _exists(s: Session) -> bool:
+        return s.query(User.id).filter(User.username == body.username).first() is not None
+    if await run_db(_exists):
+        raise HTTPException(400, "Username already exists")
+    password_hash = await _run_hash(hash_password, body.password)
+    uid = str(uuid4())
+
+    def _create(s: Session):
+        s.add(User(id=uid, username=body.username, password_hash=password_hash, role=body.role or "customer"))
+        try:
+            s.commit()
+        except IntegrityError as e:
+            # A concurrent registration took the name while we were hashing
+            s.rollback()
+            if not _username_taken(e):
+                raise
             raise HTTPException(400, "Username already exists")
-        uid = str(uuid4())
-        s.add(User(id=uid, username=body.username, password_hash=pwd_ctx.hash(body.password), role=body.role or "customer"))
-        s.commit()
-        return {"id": uid, "username": body.username}
+    await run_db(_create)
+    return {"id": uid, "username": body.username}
 
 @app.post("/login")
-def login(body: Login):
-    with SessionLocal() as s:
+async def login(body: Login):
+    def _get(s: Session):
         u = s.query(User).filter(User.username == body.username).first()
-        if not u or not pwd_ctx.verify(body.password, u.password_hash):
-            raise HTTPException(401, "Invalid credentials")
+        return (u.id, u.username, u.role, u.password_hash) if u else None
+    u = await run_db(_get)
+    if not u:
+        raise HTTPException(401, "Invalid credentials")
+    uid, username, role, password_hash = u
+    valid, new_hash = await _run_hash(verify_password, body.password, password_hash)
+    if not valid:
+        raise HTTPException(401, "Invalid credentials")
+    if new_hash:
+        # Stored hash used an older bcrypt cost; upgrade it transparently
+        def _rehash(s: Session):
+            s.query(User).filter(User.id == uid).update({User.password_hash: new_hash})
+            s.commit()
+        await run_db(_rehash)
     now = datetime.utcnow()
     payload = {
-        "sub": u.id,
-        "username": u.username,
-        "role": u.role,
+        "sub": uid,
+        "username": username,
+        "role": role,
         "iat": int(now.timestamp()),
         "exp": int((now + timedelta(hours=8)).timestamp()),
     }
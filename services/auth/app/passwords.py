@@ -0,0 +1,30 @@
+"""Password hashing run in the auth service's worker processes.
+
+Kept free of import-time side effects (no DB, no app) so pool workers only
+import passlib and this module.
+"""
+import os
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Pinning min/max to the configured cost makes needs_update() flag hashes made
+# with any other cost, so they are rehashed on the next successful login.
+pwd_ctx = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+def hash_password(password: str) -> str:
+    return pwd_ctx.hash(password)
+
+def verify_password(password: str, password_hash: str) -> tuple[bool, str | None]:
+    """Return (valid, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    return pwd_ctx.verify_and_update(password, password_hash)
+
+def warm_up() -> int:
+    return BCRYPT_ROUNDS
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+# Allow `pytest services/auth/tests` from the repo root and run without Postgres by default
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# services/, for the shared testing_db helpers
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+if "DATABASE_URL" not in os.environ:
+    _db_path = os.path.join(tempfile.gettempdir(), "auth-test.db")
+    if os.path.exists(_db_path):
+        os.remove(_db_path)
+    os.environ["DATABASE_URL"] = "sqlite:///" + _db_path
+# Cheap hashes, computed in-process
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("HASH_WORKERS", "0")
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from testing_db import query_plans  # noqa: F401 (fixture)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    # Startup work (migrations, admin seed) runs in the background from the lifespan; wait until the service is ready
+    with TestClient(app) as c:
+        deadline = time.monotonic() + 10
+        while c.get("/readyz").status_code != 200:
+            assert time.monotonic() < deadline, c.get("/readyz").json()
+            time.sleep(0.05)
+        yield c
@@ -0,0 +1,20 @@
+from prometheus_client import REGISTRY
+
+from app import main
+
+
+def test_db_pool_and_routes_are_reported(client):
+    def logins():
+        return REGISTRY.get_sample_value("http_requests_total", {"method": "POST", "route": "/login", "status": "401"}) or 0
+
+    engine = "sync" if main.async_engine is None else "async"
+    checkouts = REGISTRY.get_sample_value("db_pool_checkout_seconds_count", {"engine": engine}) or 0
+    before = logins()
+    assert client.post("/login", json={"username": "nobody", "password": "x"}).status_code == 401
+    assert logins() == before + 1
+    # The user lookup checked a connection out of the pool serving requests
+    assert REGISTRY.get_sample_value("db_pool_checkout_seconds_count", {"engine": engine}) == checkouts + 1
+
+    body = client.get("/metrics").text
+    assert f'db_pool_checkout_seconds_count{{engine="{engine}"}}' in body
+    assert 'route="/login"' in body
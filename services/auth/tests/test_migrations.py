@@ -0,0 +1,7 @@
+from app import main
+from testing_db import migrate_fresh, schema_differences
+
+def test_fresh_database_matches_model(tmp_path):
+    # Step 1 creates the original table; the later steps must bring it up to the current model
+    migrated = migrate_fresh(tmp_path / "auth.db", "auth", main.MIGRATIONS)
+    assert schema_differences(migrated, main.Base.metadata) == []
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import main
+
+
+def _stored_hash(username):
+    with main.SessionLocal() as s:
+        return s.query(main.User.password_hash).filter(main.User.username == username).scalar()
+
+
+def test_hashing_runs_in_the_process_pool(client, monkeypatch):
+    pool = ProcessPoolExecutor(max_workers=1)
+    monkeypatch.setattr(main, "_hash_pool", pool)
+    monkeypatch.setattr(main, "HASH_WORKERS", 1)
+    try:
+        assert asyncio.run(main._run_hash(os.getpid)) != os.getpid()
+        assert client.post("/register", json={"username": "pooled", "password": "pw-pooled"}).status_code == 200
+        assert client.post("/login", json={"username": "pooled", "password": "pw-pooled"}).status_code == 200
+        assert client.post("/login", json={"username": "pooled", "password": "wrong"}).status_code == 401
+    finally:
+        pool.shutdown()
+
+
+def test_full_queue_answers_429(client, monkeypatch):
+    monkeypatch.setattr(main, "_hash_pending", main.HASH_WORKERS + main.HASH_MAX_QUEUE)
+    for path, username in (("/register", "queued"), ("/login", "admin")):
+        r = client.post(path, json={"username": username, "password": "admin123"})
+        assert r.status_code == 429
+        assert r.headers["Retry-After"] == "1"
+
+
+def test_queue_bound_counts_running_and_waiting_jobs(monkeypatch):
+    monkeypatch.setattr(main, "HASH_WORKERS", 1)
+    monkeypatch.setattr(main, "HASH_MAX_QUEUE", 1)
+
+    async def _burst():
+        return await asyncio.gather(*(main._run_hash(time.sleep, 0.2) for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(_burst())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 2 and all(r.status_code == 429 for r in rejected)
+    assert main._hash_pending == 0
+
+
+def test_login_rehashes_outdated_cost(client):
+    old = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=5).hash("pw-old")
+    assert client.post("/register", json={"username": "old-cost", "password": "pw-old"}).status_code == 200
+    with main.SessionLocal() as s:
+        s.query(main.User).filter(main.User.username == "old-cost").update({main.User.password_hash: old})
+        s.commit()
+
+    assert client.post("/login", json={"username": "old-cost", "password": "pw-old"}).status_code == 200
+    new = _stored_hash("old-cost")
+    assert new != old and new.startswith("$2b$04$")
+    # The upgraded hash still verifies
+    assert client.post("/login", json={"username": "old-cost", "password": "pw-old"}).status_code == 200
+
+
+def test_concurrent_register_is_a_400(client):
+    def _rival_commits_first(session):
+        # Another request inserts the same name just before this one commits
+        if any(isinstance(o, main.User) and o.username == "contested" and o.id != "rival" for o in session.new):
+            with main.SessionLocal() as s:
+                s.add(main.User(id="rival", username="contested", password_hash="x", role="customer"))
+                s.commit()
+
+    event.listen(Session, "before_commit", _rival_commits_first)
+    try:
+        r = client.post("/register", json={"username": "contested", "password": "pw"})
+    finally:
+        event.remove(Session, "before_commit", _rival_commits_first)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Username already exists"
@@ -0,0 +1,22 @@
+from uuid import uuid4
+
+from app.main import SessionLocal, User
+from testing_db import PLAN_CHECK_MIN_ROWS
+
+def _seed():
+    # Enough rows that a query reading the whole table fails the plan check
+    with SessionLocal() as s:
+        s.add_all(
+            User(id=str(uuid4()), username=f"seed-{uuid4()}", password_hash="x", role="customer")
+            for _ in range(PLAN_CHECK_MIN_ROWS * 2)
+        )
+        s.commit()
+
+def test_handler_queries_use_indexes(client, query_plans):
+    _seed()
+    credentials = {"username": f"kim-{uuid4()}", "password": "s3cret"}
+    assert client.post("/register", json=credentials).status_code == 200
+    assert client.post("/register", json=credentials).status_code == 400
+    assert "token" in client.post("/login", json=credentials).json()
+    assert client.post("/login", json={**credentials, "password": "wrong"}).status_code == 401
+    assert client.post("/login", json={"username": "nobody", "password": "x"}).status_code == 401
@@ -1,49 +1,221 @@
-from typing import List, Dict
-from uuid import uuid4
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import os
+import time
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+from uuid import NAMESPACE_URL, uuid4, uuid5
+from fastapi import FastAPI, HTTPException, Header, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import create_engine, Column, MetaData, String, Float, DateTime, Integer, Table, Text, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker
+
+from .store import CatalogStore
+from .health import db_check, setup_health
+from .metrics import instrument, instrument_engine
+from .migrations import add_column, create_table, migrate
+from .tracing import setup_tracing, trace_engine
 
 class ServiceItemCreate(BaseModel):
     name: str
     description: str | None = None
     price: float
+    # Bay time the service takes; appointments use it to check availability
+    duration_minutes: int = Field(default=60, ge=1)
 
 class ServiceItem(ServiceItemCreate):
     id: str
 
-app = FastAPI(title="Services Catalog Service")
+class ServiceItemUpsert(ServiceItemCreate):
+    id: Optional[str] = None
 
-_STORE: Dict[str, ServiceItem] = {}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _HEALTH.start(_startup)
+    yield
+    await _HEALTH.stop()
 
-# seed a few (including requested booking services)
-for name, price in [
-    ("Book an MOT", 60.00),
-    ("Book a service", 120.00),
-    ("Book a repair work", 90.00),
-    ("Oil Change", 49.99),
-    ("Tire Rotation", 29.99),
-    ("Brake Inspection", 39.99),
-]:
-    sid = str(uuid4())
-    _STORE[sid] = ServiceItem(id=sid, name=name, description=f"{name} service", price=price)
+app = FastAPI(title="Services Catalog Service", lifespan=lifespan)
+instrument(app)
+setup_tracing(app, "catalog")
+_HEALTH = setup_health(app)
+
+# Storage: "memory" (per-process, default), "sqlite" (local testing) or "postgres" (shared, lets the service scale out).
+# With a database the CatalogStore stays as an in-memory index, reloaded when the table changes.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory").lower()
+_DEFAULT_DATABASE_URLS = {
+    "sqlite": "sqlite:///./catalog.db",
+    "postgres": "postgresql+psycopg2://garage:garage@db:5432/garage",
+}
+if STORAGE_BACKEND != "memory" and STORAGE_BACKEND not in _DEFAULT_DATABASE_URLS:
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+# How long a replica serves its index before checking the table for other replicas' writes
+CATALOG_REFRESH_SEC = float(os.getenv("CATALOG_REFRESH_SEC", "2"))
+
+Base = declarative_base()
+
+class CatalogServiceRow(Base):
+    __tablename__ = "catalog_services"
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    name: Mapped[str] = mapped_column(String(200))
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    price: Mapped[float] = mapped_column(Float)
+    duration_minutes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+# The table as create_all made it before migrations existed; later steps bring it up to CatalogServiceRow
+_CATALOG_SERVICES_V1 = Table(
+    "catalog_services", MetaData(),
+    Column("id", String(64), primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("description", Text, nullable=True),
+    Column("price", Float, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False, index=True),
+)
+
+# Append new steps; never edit or renumber one that has shipped
+MIGRATIONS = [
+    (1, "catalog services table", lambda conn: create_table(conn, _CATALOG_SERVICES_V1)),
+    # Rows from before durations existed read as 60 minutes
+    (2, "service durations", lambda conn: add_column(conn, "catalog_services", Column("duration_minutes", Integer))),
+]
+
+engine = None
+SessionLocal = None
+if STORAGE_BACKEND != "memory":
+    DATABASE_URL = os.getenv("DATABASE_URL", _DEFAULT_DATABASE_URLS[STORAGE_BACKEND])
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    instrument_engine(engine)
+    trace_engine(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+_STORE = CatalogStore()
+_sync_lock = threading.Lock()
+_synced_at = 0.0
+_table_marker = None
+
+def _sync(force: bool = False) -> None:
+    """Rebuild the in-memory index if the table changed since the last check (no-op for the memory backend)."""
+    global _STORE, _synced_at, _table_marker
+    if engine is None or (not force and time.monotonic() - _synced_at < CATALOG_REFRESH_SEC):
+        return
+    with _sync_lock, SessionLocal() as s:
+        marker = tuple(s.query(func.count(CatalogServiceRow.id), func.max(CatalogServiceRow.updated_at)).one())
+        if force or marker != _table_marker:
+            rows = s.query(CatalogServiceRow).order_by(CatalogServiceRow.created_at, CatalogServiceRow.id).all()
+            store = CatalogStore()
+            store.put_many(
+                ServiceItem(id=r.id, name=r.name, description=r.description, price=r.price, duration_minutes=r.duration_minutes or 60)
+                for r in rows
+            )
+            _STORE = store
+        _table_marker = marker
+        _synced_at = time.monotonic()
+
+def _save(items: List[ServiceItem]) -> List[ServiceItem]:
+    if engine is not None:
+        now = datetime.utcnow()
+        with SessionLocal() as s:
+            for item in items:
+                row = s.get(CatalogServiceRow, item.id)
+                if row is None:
+                    s.add(CatalogServiceRow(**item.model_dump(), created_at=now, updated_at=now))
+                else:
+                    row.name, row.description, row.price, row.updated_at = item.name, item.description, item.price, now
+                    row.duration_minutes = item.duration_minutes
+            s.commit()
+    return _STORE.put_many(items)
+
+def _remove(service_id: str) -> bool:
+    if engine is not None:
+        with SessionLocal() as s:
+            deleted = s.query(CatalogServiceRow).filter(CatalogServiceRow.id == service_id).delete()
+            s.commit()
+        _STORE.delete(service_id)
+        return bool(deleted)
+    return _STORE.delete(service_id)
+
+_SEED = [
+    ("Book an MOT", 60.00, 60),
+    ("Book a service", 120.00, 120),
+    ("Book a repair work", 90.00, 180),
+    ("Oil Change", 49.99, 30),
+    ("Tire Rotation", 29.99, 30),
+    ("Brake Inspection", 39.99, 45),
+]
+
+def _seed_id(name: str) -> str:
+    # Fixed per seed item, so replicas seeding an empty table at once collide on the primary key instead of duplicating
+    return str(uuid5(NAMESPACE_URL, f"catalog-seed/{name}"))
+
+def _startup() -> None:
+    # Runs from the lifespan hook and is retried until the DB is reachable
+    if engine is not None:
+        migrate(engine, "catalog", MIGRATIONS)
+        _sync(force=True)
+    # seed a few (including requested booking services); a shared table is only seeded once
+    if len(_STORE) == 0:
+        try:
+            _save([
+                ServiceItem(id=_seed_id(name), name=name, description=f"{name} service", price=price, duration_minutes=minutes)
+                for name, price, minutes in _SEED
+            ])
+        except IntegrityError:
+            # Another replica seeded the same ids first; serve its rows
+            _sync(force=True)
+
+if engine is not None:
+    _HEALTH.add_check("db", db_check(engine))
+
+def _json(body: bytes, etag: Optional[str] = None) -> Response:
+    headers = {"ETag": etag} if etag else None
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 @app.get("/services", response_model=List[ServiceItem])
-def list_services():
-    return list(_STORE.values())
+def list_services(
+    ids: Optional[str] = None,
+    q: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    if_none_match: Optional[str] = Header(default=None),
+):
+    _sync()
+    store = _STORE
+    # Items are pre-serialized by the store; responses are assembled from those bytes
+    if ids is not None:
+        # Bulk lookup: GET /services?ids=a,b,c returns the ones that exist
+        return _json(store.dump(i for i in ids.split(",") if i))
+    if q or name_prefix or min_price is not None or max_price is not None:
+        matches = store.search(name_prefix=name_prefix, name_contains=q, min_price=min_price, max_price=max_price)
+        return _json(store.dump(matches))
+    body, etag = store.snapshot()
+    if if_none_match and etag in {t.strip() for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers={"ETag": etag})
+    return _json(body, etag)
 
 @app.post("/services", response_model=ServiceItem, status_code=201)
 def create_service(payload: ServiceItemCreate):
     sid = str(uuid4())
     item = ServiceItem(id=sid, **payload.model_dump())
-    _STORE[sid] = item
-    return item
+    return _save([item])[0]
+
+@app.post("/services/bulk", response_model=List[ServiceItem])
+def upsert_services(payload: List[ServiceItemUpsert]):
+    """Create or replace many items at once; items without an id get a new one."""
+    items = [ServiceItem(**{**p.model_dump(), "id": p.id or str(uuid4())}) for p in payload]
+    return _save(items)
 
 @app.get("/services/{service_id}", response_model=ServiceItem)
 def get_service(service_id: str):
+    _sync()
     item = _STORE.get(service_id)
     if not item:
         raise HTTPException(status_code=404, detail="Service not found")
@@ -51,15 +223,15 @@ def get_service(service_id: str):
 
 @app.put("/services/{service_id}", response_model=ServiceItem)
 def update_service(service_id: str, payload: ServiceItemCreate):
+    _sync()
     if service_id not in _STORE:
         raise HTTPException(status_code=404, detail="Service not found")
     item = ServiceItem(id=service_id, **payload.model_dump())
-    _STORE[service_id] = item
-    return item
+    return _save([item])[0]
 
 @app.delete("/services/{service_id}", status_code=204)
 def delete_service(service_id: str):
-    if service_id not in _STORE:
+    _sync()
+    if not _remove(service_id):
         raise HTTPException(status_code=404, detail="Service not found")
-    del _STORE[service_id]
     return None
@@ -0,0 +1,137 @@
+"""In-memory catalog store with secondary indexes and pre-serialized JSON.
+
+Each item's JSON is serialized once when it is written. The full list is
+served from a snapshot rebuilt only after a change. Name and price lookups
+go through sorted/trigram indexes, so reads cost O(result) rather than
+re-serializing the whole catalog.
+"""
+import hashlib
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class CatalogStore:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items: Dict[str, BaseModel] = {}
+        self._json: Dict[str, bytes] = {}
+        # Insertion order, so lists and search results keep the catalog's order
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        self._by_name: List[Tuple[str, str]] = []     # (lowercase name, id), sorted
+        self._by_price: List[Tuple[float, str]] = []  # (price, id), sorted
+        self._by_trigram: Dict[str, Set[str]] = {}
+        self._snapshot: Optional[bytes] = None
+        self._etag: Optional[str] = None
+
+    # --- reads -----------------------------------------------------------
+
+    def get(self, item_id: str) -> Optional[BaseModel]:
+        return self._items.get(item_id)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def snapshot(self) -> Tuple[bytes, str]:
+        """JSON array of every item plus its ETag, rebuilt only after a write."""
+        with self._lock:
+            if self._snapshot is None:
+                ordered = sorted(self._items, key=self._seq.__getitem__)
+                self._snapshot = self.dump(ordered)
+                self._etag = '"%s"' % hashlib.sha1(self._snapshot).hexdigest()
+            return self._snapshot, self._etag
+
+    def dump(self, ids: Iterable[str]) -> bytes:
+        """JSON array of the given items from their pre-serialized forms (unknown ids are skipped)."""
+        parts = [self._json[i] for i in ids if i in self._json]
+        return b"[" + b",".join(parts) + b"]"
+
+    def search(
+        self,
+        name_prefix: Optional[str] = None,
+        name_contains: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ) -> List[str]:
+        """Ids matching every given filter, in catalog order."""
+        with self._lock:
+            candidates: Optional[Set[str]] = None
+            if name_prefix:
+                p = name_prefix.lower()
+                lo = bisect_left(self._by_name, (p, ""))
+                hi = bisect_left(self._by_name, (p + "\uffff", ""))
+                candidates = {i for _, i in self._by_name[lo:hi]}
+            if min_price is not None or max_price is not None:
+                lo = 0 if min_price is None else bisect_left(self._by_price, (min_price, ""))
+                hi = len(self._by_price) if max_price is None else bisect_right(self._by_price, (max_price, "\uffff"))
+                ids = {i for _, i in self._by_price[lo:hi]}
+                candidates = ids if candidates is None else candidates & ids
+            if name_contains:
+                needle = name_contains.lower()
+                grams = _trigrams(needle)
+                if grams:
+                    ids = set.intersection(*(self._by_trigram.get(g, set()) for g in grams))
+                else:
+                    # Needles shorter than a trigram: scan the (already lowercased) name index
+                    ids = {i for n, i in self._by_name if needle in n}
+                candidates = ids if candidates is None else candidates & ids
+                # Trigrams narrow the set; confirm the actual substring
+                candidates = {i for i in candidates if needle in self._items[i].name.lower()}
+            if candidates is None:
+                candidates = set(self._items)
+            return sorted(candidates, key=self._seq.__getitem__)
+
+    # --- writes ----------------------------------------------------------
+
+    def put(self, item: BaseModel) -> BaseModel:
+        with self._lock:
+            self._unindex(item.id)
+            self._items[item.id] = item
+            self._json[item.id] = item.model_dump_json().encode()
+            if item.id not in self._seq:
+                self._seq[item.id] = self._next_seq
+                self._next_seq += 1
+            name = item.name.lower()
+            insort(self._by_name, (name, item.id))
+            insort(self._by_price, (float(item.price), item.id))
+            for g in _trigrams(name):
+                self._by_trigram.setdefault(g, set()).add(item.id)
+            self._snapshot = None
+            return item
+
+    def put_many(self, items: Iterable[BaseModel]) -> List[BaseModel]:
+        with self._lock:
+            return [self.put(item) for item in items]
+
+    def delete(self, item_id: str) -> bool:
+        with self._lock:
+            if item_id not in self._items:
+                return False
+            self._unindex(item_id)
+            del self._items[item_id]
+            del self._json[item_id]
+            del self._seq[item_id]
+            self._snapshot = None
+            return True
+
+    def _unindex(self, item_id: str) -> None:
+        old = self._items.get(item_id)
+        if old is None:
+            return
+        name = old.name.lower()
+        del self._by_name[bisect_left(self._by_name, (name, item_id))]
+        del self._by_price[bisect_left(self._by_price, (float(old.price), item_id))]
+        for g in _trigrams(name):
+            ids = self._by_trigram.get(g)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self._by_trigram[g]
@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+
+# Allow `pytest services/catalog/tests` from the repo root; tests store to a temporary SQLite database
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# services/, for the shared testing_db helpers
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "catalog.db"))
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    # Startup work (migrations) runs in the background from the lifespan; wait until the service is ready
+    with TestClient(app) as c:
+        deadline = time.monotonic() + 10
+        while c.get("/readyz").status_code != 200:
+            assert time.monotonic() < deadline, c.get("/readyz").json()
+            time.sleep(0.05)
+        yield c
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+from app import main
+from app.migrations import migrate
+from testing_db import migrate_fresh, schema_differences
+
+def test_fresh_database_matches_model(tmp_path):
+    # Step 1 creates the original table; the later steps must bring it up to the current model
+    migrated = migrate_fresh(tmp_path / "catalog.db", "catalog", main.MIGRATIONS)
+    assert schema_differences(migrated, main.Base.metadata) == []
+
+def test_table_from_before_durations_is_adopted(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    with engine.begin() as conn:
+        main._CATALOG_SERVICES_V1.create(conn)
+        conn.execute(main._CATALOG_SERVICES_V1.insert().values(
+            id="svc-1", name="Oil Change", description=None, price=49.99, created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1)))
+    assert migrate(engine, "catalog", main.MIGRATIONS) == [1, 2]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name, duration_minutes FROM catalog_services")).all() == [("Oil Change", None)]
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from app import main
+from app.store import CatalogStore
+
+
+def test_list_answers_304_until_the_catalog_changes(client):
+    r = client.get("/services")
+    etag = r.headers["ETag"]
+    assert r.status_code == 200 and r.json()
+    r = client.get("/services", headers={"If-None-Match": f'"other", {etag}'})
+    assert r.status_code == 304 and r.headers["ETag"] == etag
+
+    client.post("/services", json={"name": "Wheel Alignment", "price": 59.0})
+    r = client.get("/services", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    assert "Wheel Alignment" in [s["name"] for s in r.json()]
+
+def test_bulk_upsert_and_lookup_by_ids(client):
+    r = client.post("/services/bulk", json=[
+        {"id": "bulk-1", "name": "Bulk One", "price": 10},
+        {"name": "Bulk Two", "price": 20, "duration_minutes": 15},
+    ])
+    assert r.status_code == 200
+    created = r.json()
+    second = created[1]["id"]
+    assert created[0]["id"] == "bulk-1" and second and created[1]["duration_minutes"] == 15
+
+    r = client.post("/services/bulk", json=[{"id": "bulk-1", "name": "Bulk One", "price": 12}])
+    assert r.json()[0]["price"] == 12
+
+    r = client.get("/services", params={"ids": f"{second},missing,bulk-1"})
+    assert [(s["id"], s["price"]) for s in r.json()] == [(second, 20), ("bulk-1", 12)]
+
+def test_search_filters(client):
+    client.post("/services/bulk", json=[
+        {"id": "search-1", "name": "Clutch Repair", "price": 300},
+        {"id": "search-2", "name": "Clutch Fluid", "price": 25},
+    ])
+    assert [s["id"] for s in client.get("/services", params={"q": "clutch r"}).json()] == ["search-1"]
+    assert [s["id"] for s in client.get("/services", params={"name_prefix": "clutch", "max_price": 100}).json()] == ["search-2"]
+    assert [s["id"] for s in client.get("/services", params={"name_prefix": "clutch", "min_price": 100}).json()] == ["search-1"]
+
+def test_writes_reach_the_table_and_other_replicas_writes_are_picked_up(client, monkeypatch):
+    sid = client.post("/services", json={"name": "Battery Check", "price": 15}).json()["id"]
+    with main.SessionLocal() as s:
+        assert s.get(main.CatalogServiceRow, sid).name == "Battery Check"
+        # Another replica adds a row and deletes this one
+        now = datetime.utcnow()
+        s.add(main.CatalogServiceRow(id="other-replica", name="Aircon Regas", price=80, duration_minutes=40, created_at=now, updated_at=now))
+        s.query(main.CatalogServiceRow).filter(main.CatalogServiceRow.id == sid).delete()
+        s.commit()
+
+    monkeypatch.setattr(main, "CATALOG_REFRESH_SEC", 0)
+    assert client.get(f"/services/{sid}").status_code == 404
+    assert client.get("/services/other-replica").json()["duration_minutes"] == 40
+
+def test_concurrent_replicas_seed_once(client, monkeypatch):
+    with main.SessionLocal() as s:
+        s.query(main.CatalogServiceRow).delete()
+        s.commit()
+    main._startup()
+    sync = main._sync
+
+    def _behind(force=False):
+        # This replica read the table before another one seeded it
+        sync(force)
+        monkeypatch.setattr(main, "_STORE", CatalogStore())
+    monkeypatch.setattr(main, "_sync", _behind)
+    main._startup()
+    monkeypatch.undo()
+
+    with main.SessionLocal() as s:
+        assert s.query(main.CatalogServiceRow).count() == len(main._SEED)
+    main._sync(force=True)
+    assert len(main._STORE) == len(main._SEED)
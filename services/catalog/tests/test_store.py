@@ -0,0 +1,63 @@
+import json
+
+from app.main import ServiceItem
+from app.store import CatalogStore
+
+
+def _item(item_id, name, price):
+    return ServiceItem(id=item_id, name=name, price=price)
+
+def _store():
+    store = CatalogStore()
+    store.put_many([
+        _item("oil", "Oil Change", 49.99),
+        _item("brake", "Brake Inspection", 39.99),
+        _item("brake-pads", "Brake Pads", 89.00),
+        _item("tyre", "Tire Rotation", 29.99),
+    ])
+    return store
+
+def test_contains_search_uses_trigrams_and_confirms_the_substring():
+    store = _store()
+    assert store.search(name_contains="CHANGE") == ["oil"]
+    assert store.search(name_contains="ake") == ["brake", "brake-pads"]
+    # Needles shorter than a trigram fall back to scanning names
+    assert store.search(name_contains="ti") == ["brake", "tyre"]
+    # Every trigram of the needle is present, but not the needle itself
+    store.put(_item("split", "abc-bcd", 1.0))
+    assert store.search(name_contains="abcd") == []
+
+def test_prefix_and_price_filters_combine():
+    store = _store()
+    assert store.search(name_prefix="br") == ["brake", "brake-pads"]
+    # Bounds are inclusive
+    assert store.search(min_price=39.99, max_price=49.99) == ["oil", "brake"]
+    assert store.search(name_prefix="br", max_price=50) == ["brake"]
+    assert store.search(name_prefix="zz") == []
+    assert store.search() == ["oil", "brake", "brake-pads", "tyre"]
+
+def test_updates_and_deletes_reindex():
+    store = _store()
+    store.put(_item("oil", "Engine Oil", 59.99))
+    assert store.search(name_contains="change") == []
+    assert store.search(name_prefix="engine", min_price=55) == ["oil"]
+    assert store.delete("brake")
+    assert not store.delete("brake")
+    assert store.search(name_prefix="brake") == ["brake-pads"]
+    assert store.search(max_price=40) == ["tyre"]
+
+def test_snapshot_keeps_catalog_order_and_changes_etag_only_on_writes():
+    store = _store()
+    body, etag = store.snapshot()
+    assert [i["id"] for i in json.loads(body)] == ["oil", "brake", "brake-pads", "tyre"]
+    assert store.snapshot() == (body, etag)
+    # Replacing an item keeps its place
+    store.put(_item("oil", "Oil Change", 54.99))
+    body2, etag2 = store.snapshot()
+    assert etag2 != etag
+    assert [i["id"] for i in json.loads(body2)] == ["oil", "brake", "brake-pads", "tyre"]
+    assert json.loads(body2)[0]["price"] == 54.99
+
+def test_dump_skips_unknown_ids():
+    store = _store()
+    assert [i["id"] for i in json.loads(store.dump(["tyre", "missing", "oil"]))] == ["tyre", "oil"]
@@ -0,0 +1,74 @@
+"""A reusable SMTP session for the outbox worker.
+
+The connection (and STARTTLS/login) is set up on the first send and kept
+open for the following ones. It is dropped after an error or when idle,
+and re-established on the next send.
+"""
+import smtplib
+import time
+from email.message import EmailMessage
+from typing import Optional
+
+# Errors that only concern one message; the session itself is still usable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+class SmtpMailer:
+    def __init__(self, host: str, port: int, use_ssl: bool = False, user: Optional[str] = None,
+                 password: Optional[str] = None, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl or port == 465
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.connects = 0
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                server.starttls()
+            except Exception:
+                # Some servers may not support STARTTLS; continue without it
+                pass
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        self.connects += 1
+        return server
+
+    def send(self, msg: EmailMessage) -> None:
+        reused = self._server is not None
+        if not reused:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            if not reused:
+                raise
+            # The server dropped the idle session; retry once on a fresh one
+            self._server = self._connect()
+            self._server.send_message(msg)
+        except MESSAGE_ERRORS:
+            raise
+        except Exception:
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self, idle_sec: float) -> None:
+        if self._server is not None and time.monotonic() - self._last_used >= idle_sec:
+            self.close()
+
+    def close(self) -> None:
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
@@ -1,11 +1,25 @@
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timedelta
+import logging
 import os
-import smtplib
+import threading
 from email.message import EmailMessage
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
+from sqlalchemy import create_engine, update, Column, Index, Integer, MetaData, String, DateTime, Table, Text
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker
+
+from .mailer import MESSAGE_ERRORS, SmtpMailer
+from .fastjson import json_response
+from .health import db_check, setup_health
+from .metrics import instrument, instrument_engine
+from .migrations import add_column, create_index, create_table, migrate
+from .tracing import setup_tracing, trace_engine
+
+logger = logging.getLogger("contactus")
 
 class ContactMessageCreate(BaseModel):
     name: str
@@ -18,66 +32,321 @@ class ContactMessage(ContactMessageCreate):
 
 class ContactMessageResponse(ContactMessage):
     email_sent: bool = False
+    # pending (queued in the outbox), sent, failed (gave up after retries) or disabled (SMTP not configured)
+    email_status: str = "pending"
+    email_attempts: int = 0
     email_error: Optional[str] = None
+    email_sent_at: Optional[datetime] = None
+
+# Email notification settings
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_SSL = os.getenv("SMTP_SSL", "false").lower() in {"1", "true", "yes"}
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+# Close the persistent SMTP connection after this long without mail
+SMTP_IDLE_SEC = float(os.getenv("SMTP_IDLE_SEC", "60"))
+CONTACT_NOTIFY_EMAIL = os.getenv("CONTACT_NOTIFY_EMAIL")
+EMAIL_ENABLED = bool(SMTP_HOST and CONTACT_NOTIFY_EMAIL)
+
+# Outbox delivery
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SEC = float(os.getenv("OUTBOX_RETRY_BASE_SEC", "10"))
+OUTBOX_RETRY_MAX_SEC = float(os.getenv("OUTBOX_RETRY_MAX_SEC", "3600"))
+# A claimed message is left alone by other workers for this long (covers a worker dying mid-send)
+OUTBOX_LEASE_SEC = float(os.getenv("OUTBOX_LEASE_SEC", "120"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _HEALTH.start(_startup)
+    yield
+    await _HEALTH.stop()
+    # Joining the worker can wait out an SMTP timeout; keep the event loop free meanwhile
+    await run_in_threadpool(_OUTBOX.stop)
+
+app = FastAPI(title="Contact Us Service", lifespan=lifespan)
+instrument(app)
+setup_tracing(app, "contactus")
+_HEALTH = setup_health(app)
+
+# Storage: "memory" (per-process, default), "sqlite" (local testing) or "postgres" (shared, lets the service scale out)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory").lower()
+_DEFAULT_DATABASE_URLS = {
+    "sqlite": "sqlite:///./contactus.db",
+    "postgres": "postgresql+psycopg2://garage:garage@db:5432/garage",
+}
+if STORAGE_BACKEND != "memory" and STORAGE_BACKEND not in _DEFAULT_DATABASE_URLS:
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+Base = declarative_base()
+
+class ContactMessageRow(Base):
+    __tablename__ = "contact_messages"
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    name: Mapped[str] = mapped_column(String(200))
+    email: Mapped[str] = mapped_column(String(320))
+    message: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    email_status: Mapped[str] = mapped_column(String(16), default="pending")
+    email_attempts: Mapped[int] = mapped_column(Integer, default=0)
+    email_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    email_sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    __table_args__ = (Index("ix_contact_messages_outbox", "email_status", "next_attempt_at"),)
+
+# The table as create_all made it before migrations existed; later steps bring it up to ContactMessageRow
+_CONTACT_MESSAGES_V1 = Table(
+    "contact_messages", MetaData(),
+    Column("id", String(64), primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("email", String(320), nullable=False),
+    Column("message", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+)
+
+def _add_outbox(conn) -> None:
+    add_column(conn, "contact_messages", Column("email_status", String(16)))
+    add_column(conn, "contact_messages", Column("email_attempts", Integer))
+    add_column(conn, "contact_messages", Column("email_error", Text))
+    add_column(conn, "contact_messages", Column("email_sent_at", DateTime))
+    add_column(conn, "contact_messages", Column("next_attempt_at", DateTime))
+    create_index(conn, "contact_messages", "ix_contact_messages_outbox", "email_status", "next_attempt_at")
+    # Older messages were emailed inline when submitted (the outcome wasn't stored); never queue them again
+    conn.execute(update(ContactMessageRow).where(ContactMessageRow.email_status.is_(None)).values(email_status="sent", email_attempts=1))
+
+# Append new steps; never edit or renumber one that has shipped
+MIGRATIONS = [
+    (1, "contact messages table", lambda conn: create_table(conn, _CONTACT_MESSAGES_V1)),
+    (2, "email outbox", _add_outbox),
+]
+
+engine = None
+SessionLocal = None
+if STORAGE_BACKEND != "memory":
+    DATABASE_URL = os.getenv("DATABASE_URL", _DEFAULT_DATABASE_URLS[STORAGE_BACKEND])
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    instrument_engine(engine)
+    trace_engine(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+def _startup() -> None:
+    # Runs from the lifespan hook and is retried until the DB is reachable
+    if engine is not None:
+        migrate(engine, "contactus", MIGRATIONS)
+    # Deliver the outbox only once its table exists
+    if EMAIL_ENABLED:
+        _OUTBOX.start()
+
+if engine is not None:
+    _HEALTH.add_check("db", db_check(engine))
+
+class MemoryMessageStore:
+    def __init__(self):
+        self._items: Dict[str, ContactMessageResponse] = {}
+        self._due: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def add(self, msg: ContactMessageResponse) -> ContactMessageResponse:
+        with self._lock:
+            self._items[msg.id] = msg
+            if msg.email_status == "pending":
+                self._due[msg.id] = msg.created_at
+        return msg
+
+    def get(self, message_id: str) -> Optional[ContactMessageResponse]:
+        return self._items.get(message_id)
+
+    def list(self) -> List[ContactMessageResponse]:
+        return list(self._items.values())
+
+    def claim_due(self, now: datetime, limit: int) -> List[ContactMessageResponse]:
+        with self._lock:
+            ids = sorted((i for i, at in self._due.items() if at <= now), key=self._due.__getitem__)[:limit]
+            for i in ids:
+                self._due[i] = now + timedelta(seconds=OUTBOX_LEASE_SEC)
+            return [self._items[i] for i in ids]
+
+    def record(self, message_id: str, next_attempt_at: Optional[datetime] = None, **fields) -> None:
+        with self._lock:
+            self._items[message_id] = self._items[message_id].model_copy(update=fields)
+            if next_attempt_at is None:
+                self._due.pop(message_id, None)
+            else:
+                self._due[message_id] = next_attempt_at
+
+def _from_row(r: ContactMessageRow) -> ContactMessageResponse:
+    return ContactMessageResponse(
+        id=r.id, name=r.name, email=r.email, message=r.message, created_at=r.created_at,
+        email_sent=r.email_status == "sent", email_status=r.email_status, email_attempts=r.email_attempts,
+        email_error=r.email_error, email_sent_at=r.email_sent_at,
+    )
 
-_STORE: Dict[str, ContactMessage] = {}
-app = FastAPI(title="Contact Us Service")
+class SqlMessageStore:
+    def add(self, msg: ContactMessageResponse) -> ContactMessageResponse:
+        with SessionLocal() as s:
+            s.add(ContactMessageRow(
+                **msg.model_dump(exclude={"email_sent"}),
+                next_attempt_at=msg.created_at if msg.email_status == "pending" else None,
+            ))
+            s.commit()
+        return msg
 
-_STORE: Dict[str, ContactMessage] = {}
+    def get(self, message_id: str) -> Optional[ContactMessageResponse]:
+        with SessionLocal() as s:
+            r = s.get(ContactMessageRow, message_id)
+            return _from_row(r) if r else None
+
+    def list(self) -> List[ContactMessageResponse]:
+        with SessionLocal() as s:
+            rows = s.query(ContactMessageRow).order_by(ContactMessageRow.created_at, ContactMessageRow.id).all()
+            return [_from_row(r) for r in rows]
+
+    def claim_due(self, now: datetime, limit: int) -> List[ContactMessageResponse]:
+        """Lease up to `limit` due messages; the conditional update keeps two replicas from sending the same one."""
+        lease_until = now + timedelta(seconds=OUTBOX_LEASE_SEC)
+        claimed = []
+        with SessionLocal() as s:
+            rows = (
+                s.query(ContactMessageRow)
+                .filter(ContactMessageRow.email_status == "pending", ContactMessageRow.next_attempt_at <= now)
+                .order_by(ContactMessageRow.next_attempt_at)
+                .limit(limit)
+                .all()
+            )
+            for r in rows:
+                updated = (
+                    s.query(ContactMessageRow)
+                    .filter(
+                        ContactMessageRow.id == r.id,
+                        ContactMessageRow.email_status == "pending",
+                        ContactMessageRow.next_attempt_at == r.next_attempt_at,
+                    )
+                    .update({ContactMessageRow.next_attempt_at: lease_until}, synchronize_session=False)
+                )
+                if updated:
+                    claimed.append(_from_row(r))
+            s.commit()
+        return claimed
+
+    def record(self, message_id: str, next_attempt_at: Optional[datetime] = None, **fields) -> None:
+        fields.pop("email_sent", None)
+        with SessionLocal() as s:
+            s.query(ContactMessageRow).filter(ContactMessageRow.id == message_id).update(
+                {**fields, "next_attempt_at": next_attempt_at}, synchronize_session=False
+            )
+            s.commit()
+
+_STORE = MemoryMessageStore() if engine is None else SqlMessageStore()
+
+def _build_email(msg: ContactMessageResponse) -> EmailMessage:
+    email_msg = EmailMessage()
+    email_msg["Subject"] = f"New contact from {msg.name}"
+    email_msg["From"] = SMTP_USER or CONTACT_NOTIFY_EMAIL
+    email_msg["To"] = CONTACT_NOTIFY_EMAIL
+    email_msg.set_content(
+        f"Name: {msg.name}\nEmail: {msg.email}\n\nMessage:\n{msg.message}"
+    )
+    return email_msg
+
+def _retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_MAX_SEC, OUTBOX_RETRY_BASE_SEC * 2 ** (attempts - 1))
+
+class OutboxWorker:
+    """Background thread that delivers queued messages in batches over one SMTP session."""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="contactus-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=SMTP_TIMEOUT + 5)
+        self._thread = None
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        mailer = SmtpMailer(SMTP_HOST, SMTP_PORT, use_ssl=SMTP_SSL, user=SMTP_USER, password=SMTP_PASS, timeout=SMTP_TIMEOUT)
+        try:
+            while not self._stop.is_set():
+                try:
+                    batch = _STORE.claim_due(datetime.utcnow(), OUTBOX_BATCH_SIZE)
+                    if batch:
+                        self._deliver(mailer, batch)
+                        continue
+                except Exception:
+                    logger.exception("outbox delivery failed")
+                mailer.close_if_idle(SMTP_IDLE_SEC)
+                self._wake.wait(OUTBOX_POLL_SEC)
+                self._wake.clear()
+        finally:
+            mailer.close()
+
+    def _deliver(self, mailer: SmtpMailer, batch: List[ContactMessageResponse]) -> None:
+        connection_error: Optional[Exception] = None
+        for msg in batch:
+            if connection_error is not None:
+                # Not tried: only its next attempt moves, its attempt count and last error stay as they were
+                retry_at = datetime.utcnow() + timedelta(seconds=_retry_delay(msg.email_attempts + 1))
+                _STORE.record(msg.id, next_attempt_at=retry_at)
+                continue
+            error: Optional[Exception] = None
+            try:
+                mailer.send(_build_email(msg))
+            except MESSAGE_ERRORS as e:
+                error = e
+            except Exception as e:
+                # The server is unreachable: requeue the rest of the batch instead of reconnecting for each
+                error = connection_error = e
+            attempts = msg.email_attempts + 1
+            if error is None:
+                _STORE.record(msg.id, email_status="sent", email_sent=True, email_attempts=attempts,
+                              email_error=None, email_sent_at=datetime.utcnow())
+            elif attempts >= OUTBOX_MAX_ATTEMPTS:
+                _STORE.record(msg.id, email_status="failed", email_attempts=attempts, email_error=str(error))
+            else:
+                retry_at = datetime.utcnow() + timedelta(seconds=_retry_delay(attempts))
+                _STORE.record(msg.id, next_attempt_at=retry_at, email_attempts=attempts, email_error=str(error))
+
+_OUTBOX = OutboxWorker()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
-@app.get("/contactus", response_model=List[ContactMessage])
+@app.get("/contactus", response_model=List[ContactMessageResponse])
 def list_messages():
-    return list(_STORE.values())
+    return json_response(_STORE.list())
 
 @app.post("/contactus", response_model=ContactMessageResponse, status_code=201)
 def create_message(payload: ContactMessageCreate):
     mid = str(uuid4())
-    msg = ContactMessage(id=mid, created_at=datetime.utcnow(), **payload.model_dump())
-    _STORE[mid] = msg
-    # Attempt to send email notification if configured
-    SMTP_HOST = os.getenv("SMTP_HOST")
-    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-    SMTP_SSL = os.getenv("SMTP_SSL", "false").lower() in {"1", "true", "yes"}
-    SMTP_USER = os.getenv("SMTP_USER")
-    SMTP_PASS = os.getenv("SMTP_PASS")
-    CONTACT_NOTIFY_EMAIL = os.getenv("CONTACT_NOTIFY_EMAIL")
-    email_sent = False
-    email_error: Optional[str] = None
-    if not (SMTP_HOST and CONTACT_NOTIFY_EMAIL):
-        email_error = "Email not configured"
+    # The email notification goes through the outbox; poll GET /contactus/{id} for its delivery status
+    if EMAIL_ENABLED:
+        msg = ContactMessageResponse(id=mid, created_at=datetime.utcnow(), **payload.model_dump())
     else:
-        try:
-            email_msg = EmailMessage()
-            email_msg["Subject"] = f"New contact from {payload.name}"
-            email_msg["From"] = SMTP_USER or CONTACT_NOTIFY_EMAIL
-            email_msg["To"] = CONTACT_NOTIFY_EMAIL
-            email_msg.set_content(
-                f"Name: {payload.name}\nEmail: {payload.email}\n\nMessage:\n{payload.message}"
-            )
+        msg = ContactMessageResponse(id=mid, created_at=datetime.utcnow(), email_status="disabled",
+                                     email_error="Email not configured", **payload.model_dump())
+    _STORE.add(msg)
+    _OUTBOX.notify()
+    return msg
 
-            if SMTP_SSL or SMTP_PORT == 465:
-                with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=10) as server:
-                    if SMTP_USER and SMTP_PASS:
-                        server.login(SMTP_USER, SMTP_PASS)
-                    server.send_message(email_msg)
-                    email_sent = True
-            else:
-                with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as server:
-                    try:
-                        server.starttls()
-                    except Exception:
-                        # Some servers may not support STARTTLS; continue without it
-                        pass
-                    if SMTP_USER and SMTP_PASS:
-                        server.login(SMTP_USER, SMTP_PASS)
-                    server.send_message(email_msg)
-                    email_sent = True
-        except Exception as e:
-            # Do not fail the API if email sending fails; report status
-            email_error = str(e)
-
-    return ContactMessageResponse(**msg.model_dump(), email_sent=email_sent, email_error=email_error)
+@app.get("/contactus/{message_id}", response_model=ContactMessageResponse)
+def get_message(message_id: str):
+    msg = _STORE.get(message_id)
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return msg
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# Allow `pytest services/contactus/tests` from the repo root; the outbox talks to a local SMTP stub
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# services/, for the shared testing_db helpers
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "contactus.db"))
+os.environ.setdefault("SMTP_HOST", "127.0.0.1")
+os.environ.setdefault("SMTP_PORT", "8025")
+os.environ.setdefault("CONTACT_NOTIFY_EMAIL", "garage@example.com")
+os.environ.setdefault("OUTBOX_POLL_SEC", "0.05")
+os.environ.setdefault("OUTBOX_RETRY_BASE_SEC", "0.05")
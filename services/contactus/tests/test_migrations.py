@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+
+from app import main
+from app.migrations import migrate
+from testing_db import migrate_fresh, schema_differences
+
+def test_fresh_database_matches_model(tmp_path):
+    # Step 1 creates the original table; the later steps must bring it up to the current model
+    migrated = migrate_fresh(tmp_path / "contactus.db", "contactus", main.MIGRATIONS)
+    assert schema_differences(migrated, main.Base.metadata) == []
+
+def test_messages_from_before_the_outbox_are_not_queued(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'contactus.db'}")
+    with engine.begin() as conn:
+        main._CONTACT_MESSAGES_V1.create(conn)
+        conn.execute(main._CONTACT_MESSAGES_V1.insert().values(
+            id="msg-1", name="Kim", email="kim@example.com", message="Hi", created_at=datetime(2024, 1, 1)))
+    assert migrate(engine, "contactus", main.MIGRATIONS) == [1, 2]
+    row = main.ContactMessageRow
+    with engine.connect() as conn:
+        assert conn.execute(select(row.email_status, row.next_attempt_at)).all() == [("sent", None)]
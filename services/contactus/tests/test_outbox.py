@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+
+controller = pytest.importorskip("aiosmtpd.controller")
+
+from app.main import app
+
+
+class Handler:
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.sessions = set()
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_first:
+            self.fail_first -= 1
+            return "451 Try again later"
+        self.sessions.add(id(session))
+        self.messages.append(envelope.content)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp():
+    def start(**kwargs):
+        handler = Handler(**kwargs)
+        ctl = controller.Controller(handler, hostname="127.0.0.1", port=int(os.environ["SMTP_PORT"]))
+        ctl.start()
+        started.append(ctl)
+        return handler
+
+    started = []
+    yield start
+    for ctl in started:
+        ctl.stop()
+
+
+def _wait_for(client, mid, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f"/contactus/{mid}").json()
+        if body["email_status"] == status:
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"message {mid} stayed {body['email_status']}")
+
+
+def _started(client):
+    # Startup (create_all, starting the outbox) runs in the background from the lifespan
+    deadline = time.monotonic() + 5
+    while client.get("/readyz").status_code != 200:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return client
+
+
+def _post(client, n):
+    r = client.post("/contactus", json={"name": f"User {n}", "email": "user@example.com", "message": "Hello"})
+    assert r.status_code == 201
+    return r.json()
+
+
+def test_messages_are_delivered_over_one_connection(smtp):
+    handler = smtp()
+    with TestClient(app) as client:
+        _started(client)
+        created = [_post(client, n) for n in range(3)]
+        assert all(m["email_status"] in {"pending", "sent"} for m in created)
+        for m in created:
+            body = _wait_for(client, m["id"], "sent")
+            assert body["email_sent"] is True
+            assert body["email_attempts"] == 1
+    assert len(handler.messages) == 3
+    assert len(handler.sessions) == 1
+
+
+def test_temporary_failures_are_retried(smtp):
+    handler = smtp(fail_first=2)
+    with TestClient(app) as client:
+        _started(client)
+        mid = _post(client, 0)["id"]
+        body = _wait_for(client, mid, "sent")
+    assert body["email_attempts"] == 3
+    assert len(handler.messages) == 1
+
+
+class _UnreachableMailer:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, email):
+        self.sent.append(email)
+        raise ConnectionRefusedError("connection refused")
+
+
+def test_connection_error_requeues_untried_messages():
+    from app.main import Base, ContactMessageResponse, OutboxWorker, _STORE, engine
+
+    # Not through the app: no outbox thread racing this test for the messages
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    batch = [
+        ContactMessageResponse(id=str(uuid4()), created_at=now, name=f"User {n}", email="user@example.com", message="Hello")
+        for n in range(3)
+    ]
+    for msg in batch:
+        _STORE.add(msg)
+    mailer = _UnreachableMailer()
+    OutboxWorker()._deliver(mailer, batch)
+
+    assert len(mailer.sent) == 1
+    tried, *untried = (_STORE.get(msg.id) for msg in batch)
+    assert (tried.email_status, tried.email_attempts, tried.email_error) == ("pending", 1, "connection refused")
+    for msg in untried:
+        assert (msg.email_status, msg.email_attempts, msg.email_error) == ("pending", 0, None)
+    # All three wait for the retry delay before being claimed again
+    assert _STORE.claim_due(datetime.utcnow(), 10) == []
+    assert {m.id for m in _STORE.claim_due(datetime.utcnow() + timedelta(hours=1), 10)} == {m.id for m in batch}
+
+
+def test_shutdown_joins_the_worker_off_the_event_loop(monkeypatch):
+    from app import main
+
+    class _SlowToStop:
+        def start(self):
+            pass
+
+        def notify(self):
+            pass
+
+        def stop(self):
+            # A worker stuck in an SMTP call until its timeout
+            time.sleep(0.3)
+
+    monkeypatch.setattr(main, "_OUTBOX", _SlowToStop())
+
+    async def _start_and_stop():
+        async with main.lifespan(main.app):
+            pass
+
+    async def _ticks_until_stopped():
+        stopping = asyncio.create_task(_start_and_stop())
+        ticks = 0
+        while not stopping.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        await stopping
+        return ticks
+
+    # Other coroutines keep running while the outbox thread is joined
+    assert asyncio.run(_ticks_until_stopped()) >= 10
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app import main
+
+
+@pytest.fixture(params=[main.MemoryMessageStore, main.SqlMessageStore])
+def store(request):
+    main.migrate(main.engine, "contactus", main.MIGRATIONS)
+    return request.param()
+
+def _message(created_at, **fields):
+    return main.ContactMessageResponse(id=str(uuid4()), name="User", email="user@example.com", message="Hello",
+                                       created_at=created_at, **fields)
+
+def test_due_messages_are_leased_until_recorded(store):
+    # Dates well in the past keep other tests' messages out of these claims
+    now = datetime(2001, 1, 1)
+    first = store.add(_message(now - timedelta(minutes=2)))
+    second = store.add(_message(now - timedelta(minutes=1)))
+    store.add(_message(now - timedelta(minutes=3), email_status="disabled"))
+    store.add(_message(now + timedelta(days=1)))
+
+    assert [m.id for m in store.claim_due(now, 10)] == [first.id, second.id]
+    # Leased: not handed out again until the lease runs out
+    assert store.claim_due(now, 10) == []
+    lease_end = now + timedelta(seconds=main.OUTBOX_LEASE_SEC)
+    assert {m.id for m in store.claim_due(lease_end, 10)} == {first.id, second.id}
+
+    store.record(first.id, email_status="sent", email_sent=True, email_attempts=1, email_sent_at=now)
+    store.record(second.id, next_attempt_at=now, email_attempts=1, email_error="451 Try again later")
+    assert [m.id for m in store.claim_due(lease_end, 10)] == [second.id]
+    sent = store.get(first.id)
+    assert (sent.email_status, sent.email_sent, sent.email_attempts) == ("sent", True, 1)
+    assert store.get(second.id).email_error == "451 Try again later"
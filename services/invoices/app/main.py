@@ -1,17 +1,66 @@
 import os
+import io
 import time
-from typing import List, Optional
+import base64
+import asyncio
+import logging
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, TypeVar
 from uuid import uuid4
-from datetime import datetime
-from fastapi import FastAPI, Header, HTTPException
+from datetime import datetime, timezone
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 import httpx
-from fastapi.responses import Response
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from weasyprint import HTML
-from sqlalchemy import create_engine, String, Float, DateTime, JSON, text
-from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker
-from sqlalchemy.exc import OperationalError
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import create_engine, delete, func, inspect, literal_column, select, text, Column, MetaData, String, Float, DateTime, Integer, JSON, Index, Table, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker, Session
+from pydantic import BaseModel, ConfigDict, Field
+
+from .pdf import cached_pdf_path, discard_pdfs, ensure_pdf, warm_up
+from .fastjson import json_response
+from .health import db_check, http_check, setup_health
+from .metrics import instrument, instrument_engine
+from .migrations import create_index, create_table, drop_index, migrate
+from .tracing import client_span, setup_tracing, trace_engine, tracer
+
+T = TypeVar("T")
+logger = logging.getLogger("invoices")
+
+# PDF rendering runs in a warm process pool (PDF_WORKERS=0 falls back to the threadpool)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+# Renders in flight per bulk export; keeps the pool busy without queueing the whole month at once
+PDF_EXPORT_CONCURRENCY = int(os.getenv("PDF_EXPORT_CONCURRENCY", str(max(PDF_WORKERS, 1) * 2)))
+
+_pdf_pool: ProcessPoolExecutor | None = None
+
+# Outbound calls to appointments/catalog share one pooled client
+_http: httpx.AsyncClient | None = None
+
+def _http_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_connections=50, max_keepalive_connections=10))
+    return _http
+
+# Appointments per POST /invoices/batch; they are fetched in bulk calls of up to APPOINTMENTS_BULK_SIZE ids.
+# The appointments service refuses more than its MAX_PAGE_SIZE ids per call (422); keep this at or below it.
+# If it is set higher, refused calls are split in half and retried, and the smaller size is kept from then on.
+INVOICE_BATCH_MAX = int(os.getenv("INVOICE_BATCH_MAX", "1000"))
+APPOINTMENTS_BULK_SIZE = int(os.getenv("APPOINTMENTS_BULK_SIZE", "500"))
+_appointments_bulk_size = APPOINTMENTS_BULK_SIZE
+# Times a batch is retried after losing the unique (appointment_id) race to a concurrent request
+BATCH_CONFLICT_RETRIES = 2
+
+# Short-lived cache of catalog service id -> {"name", "price"} used to enrich invoice items
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+CATALOG_CACHE_MAX = 1024
+_catalog_cache: Dict[str, tuple[float, dict]] = {}
 
 class InvoiceItem(BaseModel):
     description: str
@@ -34,16 +83,111 @@ class Invoice(InvoiceCreate):
     issued_at: datetime
     owner_id: str
 
-app = FastAPI(title="Invoices Service")
+class InvoiceBatchCreate(BaseModel):
+    """Appointments to invoice: listed by id, or every completed one scheduled within from/to."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    appointment_ids: List[str] = []
+    date_from: Optional[datetime] = Field(default=None, alias="from")
+    date_to: Optional[datetime] = Field(default=None, alias="to")
+    currency: str = "USD"
+    admin_create: bool = False
+
+class InvoiceBatchResult(BaseModel):
+    appointment_id: str
+    status: str  # created, skipped or failed
+    invoice_id: Optional[str] = None
+    detail: Optional[str] = None
+
+class InvoiceStats(BaseModel):
+    group: str
+    currency: str
+    count: int
+    amount: float
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _pdf_pool
+    if PDF_WORKERS > 0:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=warm_up)
+    _HEALTH.start(_startup)
+    try:
+        yield
+    finally:
+        await _HEALTH.stop()
+        if _http is not None:
+            await _http.aclose()
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(cancel_futures=True)
+            _pdf_pool = None
+        if async_engine is not None:
+            await async_engine.dispose()
+
+app = FastAPI(title="Invoices Service", lifespan=lifespan)
+instrument(app)
+setup_tracing(app, "invoices")
+_HEALTH = setup_health(app)
 
 # DB setup
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg2://garage:garage@db:5432/garage")
 APPOINTMENTS_URL = os.getenv("APPOINTMENTS_URL", "http://appointments:8000")
 CATALOG_URL = os.getenv("CATALOG_URL", "http://catalog:8000")
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# DB_ASYNC serves requests from an asyncio engine (asyncpg); the sync engine is kept for startup and as fallback
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in {"1", "true", "yes"}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def _pool_kwargs(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_recycle": DB_POOL_RECYCLE, "pool_timeout": DB_POOL_TIMEOUT}
+
+def _async_url(url: str) -> str:
+    if os.getenv("ASYNC_DATABASE_URL"):
+        return os.environ["ASYNC_DATABASE_URL"]
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            # asyncpg spells libpq's sslmode as ssl
+            return async_prefix + url[len(sync_prefix):].replace("sslmode=", "ssl=")
+    return url
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_kwargs(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+async_engine: AsyncEngine | None = None
+AsyncSessionLocal: async_sessionmaker | None = None
+if DB_ASYNC:
+    async_engine = create_async_engine(_async_url(DATABASE_URL), pool_pre_ping=True, **_pool_kwargs(DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False)
+instrument_engine(engine, "sync")
+trace_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine, "async")
+    trace_engine(async_engine.sync_engine)
 Base = declarative_base()
 
+async def run_db(fn: Callable[..., T], *args) -> T:
+    """Run ``fn(session, *args)`` on the async engine when enabled, else on the sync engine in the threadpool."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as s:
+            return await s.run_sync(fn, *args)
+
+    def _call():
+        with SessionLocal() as s:
+            return fn(s, *args)
+    return await run_in_threadpool(_call)
+
+def _naive_utc(dt: datetime | None) -> datetime | None:
+    # Columns are timezone-naive UTC; asyncpg rejects aware values for them
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
 class InvoiceRow(Base):
     __tablename__ = "invoices"
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
@@ -52,25 +196,229 @@ class InvoiceRow(Base):
     currency: Mapped[str] = mapped_column(String(16))
     items: Mapped[List[dict]] = mapped_column(JSON)
     customer_name: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
-    owner_id: Mapped[str] = mapped_column(String(64), index=True)
+    owner_id: Mapped[str] = mapped_column(String(64))
     status: Mapped[str] = mapped_column(String(32))
     issued_at: Mapped[datetime] = mapped_column(DateTime)
 
-def _wait_for_db(max_attempts: int = 30, delay_sec: float = 1.0) -> None:
-    attempts = 0
-    while attempts < max_attempts:
+    # Keyset pagination indexes: admin listing, per-owner listing and the admin status filter;
+    # at most one invoice per appointment, which also serves appointment_id lookups
+    __table_args__ = (
+        Index("ux_invoices_appointment_id", "appointment_id", unique=True, postgresql_where=text("appointment_id IS NOT NULL")),
+        Index("ix_invoices_issued_at_id", "issued_at", "id"),
+        Index("ix_invoices_owner_issued_at_id", "owner_id", "issued_at", "id"),
+        Index("ix_invoices_status_issued_at_id", "status", "issued_at", "id"),
+    )
+
+class InvoiceRollupRow(Base):
+    """Invoice count and amount per UTC issue day, currency and (lower-case) status.
+
+    Updated in the same transaction as every invoice write, so it is always in step with the table.
+    """
+    __tablename__ = "invoice_rollup"
+    day: Mapped[str] = mapped_column(String(10), primary_key=True)  # YYYY-MM-DD
+    currency: Mapped[str] = mapped_column(String(16), primary_key=True)
+    status: Mapped[str] = mapped_column(String(32), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer)
+    amount: Mapped[float] = mapped_column(Float)
+
+def _period(column, unit: str, dialect: str):
+    """`column` as text truncated to its day ("2024-05-31") or month ("2024-05")."""
+    # Formats are inlined rather than bound: with server-side parameters (asyncpg) the SELECT and
+    # GROUP BY copies of the expression would get different placeholders and no longer match
+    if dialect == "postgresql":
+        return func.to_char(column, literal_column("'YYYY-MM-DD'" if unit == "day" else "'YYYY-MM'"))
+    return func.strftime(literal_column("'%Y-%m-%d'" if unit == "day" else "'%Y-%m'"), column)
+
+def _bump_rollup(s: Session, issued_at: datetime, currency: str, status: str, count: int, amount: Optional[float]) -> None:
+    insert = pg_insert if s.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(InvoiceRollupRow).values(
+        day=issued_at.strftime("%Y-%m-%d"), currency=currency, status=status.lower(), count=count, amount=amount or 0.0,
+    )
+    s.execute(stmt.on_conflict_do_update(
+        index_elements=["day", "currency", "status"],
+        set_={"count": InvoiceRollupRow.count + stmt.excluded.count, "amount": InvoiceRollupRow.amount + stmt.excluded.amount},
+    ))
+
+def _build_rollup(conn) -> None:
+    create_table(conn, InvoiceRollupRow.__table__)
+    conn.execute(delete(InvoiceRollupRow))
+    day = _period(InvoiceRow.issued_at, "day", conn.dialect.name)
+    status = func.lower(InvoiceRow.status)
+    conn.execute(InvoiceRollupRow.__table__.insert().from_select(
+        ["day", "currency", "status", "count", "amount"],
+        select(day, InvoiceRow.currency, status, func.count(), func.sum(func.coalesce(InvoiceRow.amount, 0.0)))
+        .group_by(day, InvoiceRow.currency, status),
+    ))
+
+# The table as create_all made it before migrations existed; later steps bring it up to InvoiceRow
+_INVOICES_V1 = Table(
+    "invoices", MetaData(),
+    Column("id", String(64), primary_key=True),
+    Column("appointment_id", String(64), nullable=False),
+    Column("amount", Float, nullable=True),
+    Column("currency", String(16), nullable=False),
+    Column("items", JSON, nullable=False),
+    Column("customer_name", String(200), nullable=True),
+    Column("owner_id", String(64), nullable=False, index=True),
+    Column("status", String(32), nullable=False),
+    Column("issued_at", DateTime, nullable=False),
+)
+
+def _unique_appointment_index(conn) -> None:
+    """Make appointment_id unique, unless existing appointments already have several invoices.
+
+    Which of those invoices to keep is a business decision, so they are left to an operator: the
+    plain index stays, and ``_init_db`` tries again on every start until they are resolved.
+    """
+    duplicated = conn.execute(
+        select(func.count()).select_from(
+            select(InvoiceRow.appointment_id).where(InvoiceRow.appointment_id.is_not(None))
+            .group_by(InvoiceRow.appointment_id).having(func.count() > 1).subquery()
+        )
+    ).scalar_one()
+    if duplicated:
+        logger.error("%d appointments have more than one invoice; one invoice per appointment is not "
+                     "enforced until they are resolved", duplicated)
+        return
+    # SQLite won't match `appointment_id = ?` to a partial index, so it gets a plain one there
+    where = "appointment_id IS NOT NULL" if conn.dialect.name == "postgresql" else None
+    create_index(conn, "invoices", "ux_invoices_appointment_id", "appointment_id", unique=True, where=where)
+    drop_index(conn, "invoices", "ix_invoices_appointment_id")
+
+def _appointment_invoiced(e: IntegrityError) -> bool:
+    """Whether `e` is ux_invoices_appointment_id refusing a second invoice for an appointment."""
+    # Postgres names the violated index, SQLite the indexed column
+    message = str(e.orig)
+    return "ux_invoices_appointment_id" in message or "UNIQUE constraint failed: invoices.appointment_id" in message
+
+# Append new steps; never edit or renumber one that has shipped
+MIGRATIONS = [
+    (1, "invoices table", lambda conn: create_table(conn, _INVOICES_V1)),
+    (2, "keyset pagination indexes", lambda conn: (
+        create_index(conn, "invoices", "ix_invoices_issued_at_id", "issued_at", "id"),
+        create_index(conn, "invoices", "ix_invoices_owner_issued_at_id", "owner_id", "issued_at", "id"),
+    )),
+    (3, "appointment and status filter indexes", lambda conn: (
+        create_index(conn, "invoices", "ix_invoices_appointment_id", "appointment_id"),
+        create_index(conn, "invoices", "ix_invoices_status_issued_at_id", "status", "issued_at", "id"),
+    )),
+    # Every owner_id lookup is served by the (owner_id, issued_at, id) index
+    (4, "drop ix_invoices_owner_id", lambda conn: drop_index(conn, "invoices", "ix_invoices_owner_id")),
+    (5, "daily invoice rollup", _build_rollup),
+    # Concurrent batches can no longer invoice an appointment twice
+    (6, "unique invoice per appointment", _unique_appointment_index),
+]
+
+def _init_db() -> None:
+    migrate(engine, "invoices", MIGRATIONS)
+    # Step 6 leaves the index out while duplicate invoices exist; add it once they are resolved
+    if "ux_invoices_appointment_id" not in {i["name"] for i in inspect(engine).get_indexes("invoices")}:
         try:
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            return
-        except OperationalError:
-            attempts += 1
-            time.sleep(delay_sec)
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-
-_wait_for_db()
-Base.metadata.create_all(bind=engine)
+            with engine.begin() as conn:
+                _unique_appointment_index(conn)
+        except Exception:
+            # Not worth holding startup for: the service works without it, as it did before step 6
+            logger.exception("Creating ux_invoices_appointment_id failed")
+
+async def _startup() -> None:
+    # Runs from the lifespan hook and is retried until the DB is reachable
+    await run_in_threadpool(_init_db)
+    if _pdf_pool is not None:
+        # Spawn every worker now so the first requests don't pay WeasyPrint's startup
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(_pdf_pool, os.getpid) for _ in range(PDF_WORKERS)))
+        except Exception:
+            logger.exception("Warming up the PDF pool failed")
+
+_HEALTH.add_check("db", db_check(async_engine or engine))
+# Upstreams are reported but don't make invoices unready; only invoice creation depends on them
+_HEALTH.add_check("appointments", http_check(_http_client, f"{APPOINTMENTS_URL}/livez"), critical=False)
+_HEALTH.add_check("catalog", http_check(_http_client, f"{CATALOG_URL}/livez"), critical=False)
+
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+# /invoices/stats reads whole-day ranges from invoice_rollup; false always aggregates the invoices table
+INVOICE_STATS_ROLLUP = os.getenv("INVOICE_STATS_ROLLUP", "true").lower() in {"1", "true", "yes"}
+
+def encode_cursor(ts: datetime, row_id: str) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), row_id
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+async def render_pdf_file(invoice: dict) -> str:
+    """Path of the cached PDF for this invoice version, rendering it in the PDF pool if needed."""
+    path = cached_pdf_path(invoice)
+    if os.path.exists(path):
+        return path
+    with tracer.start_as_current_span("render invoice pdf", attributes={"invoice.id": invoice["id"]}):
+        if _pdf_pool is None:
+            return await run_in_threadpool(ensure_pdf, invoice)
+        return await asyncio.get_running_loop().run_in_executor(_pdf_pool, ensure_pdf, invoice)
+
+async def _prerender_pdf(invoice: dict) -> None:
+    try:
+        await render_pdf_file(invoice)
+    except Exception:
+        logger.exception("Pre-rendering PDF for invoice %s failed", invoice.get("id"))
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable sink: zipfile streams into it and we drain it chunk by chunk."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def _zip_invoices(invoices: List[dict]):
+    sink = _ZipSink()
+    # PDFs are already compressed; storing them keeps the export CPU-light
+    zf = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    slots = asyncio.Semaphore(PDF_EXPORT_CONCURRENCY)
+
+    async def _render(inv: dict):
+        async with slots:
+            try:
+                return inv, await render_pdf_file(inv), None
+            except Exception as e:
+                logger.exception("Rendering PDF for invoice %s failed", inv["id"])
+                return inv, None, str(e)
+
+    tasks = [asyncio.create_task(_render(inv)) for inv in invoices]
+    try:
+        # Emit each PDF as soon as it is rendered, in completion order
+        for fut in asyncio.as_completed(tasks):
+            inv, path, error = await fut
+            if path:
+                zf.writestr(f"invoice-{inv['id']}.pdf", await run_in_threadpool(_read_file, path))
+            else:
+                zf.writestr(f"invoice-{inv['id']}.error.txt", error or "render failed")
+            yield sink.drain()
+        zf.close()
+        yield sink.drain()
+    finally:
+        for t in tasks:
+            t.cancel()
 
 def to_model(row: InvoiceRow) -> Invoice:
     return Invoice(
@@ -90,18 +438,146 @@ def health():
     return {"status": "ok"}
 
 @app.get("/invoices", response_model=List[Invoice])
-def list_invoices(x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+async def list_invoices(
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = Query(default=None, alias="from"),
+    date_to: Optional[datetime] = Query(default=None, alias="to"),
+    status: Optional[str] = None,
+    owner_id: Optional[str] = None,
+    appointment_id: Optional[str] = None,
+    x_user_id: str | None = Header(default=None),
+    x_user_role: str | None = Header(default=None),
+):
     if not x_user_id:
         raise HTTPException(401, "Unauthorized")
-    with SessionLocal() as s:
+    before = decode_cursor(cursor) if cursor else None
+
+    def _query(s: Session):
+        q = s.query(InvoiceRow)
         if x_user_role == "admin":
-            rows = s.query(InvoiceRow).all()
+            if owner_id:
+                q = q.filter(InvoiceRow.owner_id == owner_id)
+        else:
+            q = q.filter(InvoiceRow.owner_id == x_user_id)
+        if date_from:
+            q = q.filter(InvoiceRow.issued_at >= _naive_utc(date_from))
+        if date_to:
+            q = q.filter(InvoiceRow.issued_at < _naive_utc(date_to))
+        if status:
+            # Stored statuses are mixed case ("unpaid", "Paid"); match either spelling
+            q = q.filter(InvoiceRow.status.in_({status, status.lower(), status.capitalize()}))
+        if appointment_id:
+            q = q.filter(InvoiceRow.appointment_id == appointment_id)
+        if before:
+            q = q.filter(tuple_(InvoiceRow.issued_at, InvoiceRow.id) < tuple_(*before))
+        # Newest first
+        q = q.order_by(InvoiceRow.issued_at.desc(), InvoiceRow.id.desc())
+        if limit is None:
+            # No page requested: keep returning the full (ordered) list
+            return [to_model(r) for r in q.all()], None
+        # Fetch one extra row to learn whether another page exists
+        rows = q.limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].issued_at, rows[-1].id)
+        return [to_model(r) for r in rows], next_cursor
+
+    items, next_cursor = await run_db(_query)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return json_response(items, response)
+
+def _check_completed(appt: dict) -> None:
+    # Verify appointment is completed (use scheduled_at in the past as proxy)
+    # expected key 'scheduled_at' as ISO8601
+    scheduled = appt.get("scheduled_at")
+    if not scheduled:
+        raise HTTPException(400, "Appointment missing scheduled time")
+    try:
+        # FastAPI typically serializes datetime to ISO format
+        scheduled_dt = datetime.fromisoformat(scheduled.replace("Z", "+00:00"))
+    except Exception:
+        raise HTTPException(400, "Invalid appointment date")
+    if scheduled_dt > datetime.utcnow().replace(tzinfo=scheduled_dt.tzinfo):
+        raise HTTPException(409, "Appointment not completed yet")
+
+async def _fetch_appointment(appointment_id: str) -> Optional[dict]:
+    headers = {"x-user-role": "admin"}
+    with client_span("GET appointments", headers) as span:
+        resp = await _http_client().get(f"{APPOINTMENTS_URL}/appointments/{appointment_id}", headers=headers)
+        span.set_attribute("http.response.status_code", resp.status_code)
+    return resp.json() if resp.status_code == 200 else None
+
+async def _verify_appointment_completed(appointment_id: str) -> None:
+    try:
+        appt = await _fetch_appointment(appointment_id)
+        if appt is None:
+            raise HTTPException(404, "Appointment not found")
+        _check_completed(appt)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(500, "Failed to verify appointment status")
+
+def _needs_catalog_lookup(it: InvoiceItem) -> bool:
+    if not it.description:
+        return True
+    # Heuristic: fallback descriptions that are IDs/UUID-like tend to be long or equal to service_id
+    return bool(it.service_id and (it.description == it.service_id or len(it.description) >= 32))
+
+async def _fetch_catalog_items(ids: set[str]) -> Dict[str, dict]:
+    """Name and price per catalog service id: cached entries first, then one bulk call for the rest."""
+    now = time.time()
+    found: Dict[str, dict] = {}
+    missing: List[str] = []
+    for sid in ids:
+        hit = _catalog_cache.get(sid)
+        if hit and hit[0] > now:
+            found[sid] = hit[1]
         else:
-            rows = s.query(InvoiceRow).filter(InvoiceRow.owner_id == x_user_id).all()
-        return [to_model(r) for r in rows]
+            missing.append(sid)
+    if not missing:
+        return found
+
+    client = _http_client()
+    fetched: Dict[str, dict] | None = None
+    try:
+        headers = {}
+        with client_span("GET catalog", headers, **{"catalog.ids": len(missing)}) as span:
+            resp = await client.get(f"{CATALOG_URL}/services", params={"ids": ",".join(missing)}, headers=headers, timeout=5.0)
+            span.set_attribute("http.response.status_code", resp.status_code)
+        if resp.status_code == 200:
+            fetched = {svc["id"]: svc for svc in resp.json() if svc.get("id") in missing}
+    except Exception:
+        pass
+    if fetched is None:
+        # Bulk lookup unavailable: fall back to concurrent single-item lookups
+        async def _one(sid: str):
+            try:
+                headers = {}
+                with client_span("GET catalog", headers) as span:
+                    r = await client.get(f"{CATALOG_URL}/services/{sid}", headers=headers, timeout=5.0)
+                    span.set_attribute("http.response.status_code", r.status_code)
+                return sid, (r.json() if r.status_code == 200 else None)
+            except Exception:
+                return sid, None
+        fetched = {sid: svc for sid, svc in await asyncio.gather(*(_one(sid) for sid in missing)) if svc}
+
+    if len(_catalog_cache) >= CATALOG_CACHE_MAX:
+        for sid in [k for k, (exp, _) in _catalog_cache.items() if exp <= now]:
+            del _catalog_cache[sid]
+    for sid, svc in fetched.items():
+        entry = {"name": svc.get("name"), "price": svc.get("price")}
+        if len(_catalog_cache) < CATALOG_CACHE_MAX:
+            _catalog_cache[sid] = (now + CATALOG_CACHE_TTL, entry)
+        found[sid] = entry
+    return found
 
 @app.post("/invoices", response_model=Invoice, status_code=201)
-def create_invoice(payload: InvoiceCreate, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+async def create_invoice(payload: InvoiceCreate, background_tasks: BackgroundTasks, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
     if not x_user_id:
         raise HTTPException(401, "Unauthorized")
     # Only admin may create invoices; normal users cannot
@@ -110,58 +586,30 @@ def create_invoice(payload: InvoiceCreate, x_user_id: str | None = Header(defaul
     # Admin must indicate explicit create intention
     if not payload.admin_create:
         raise HTTPException(400, "admin_create flag required")
-    # Verify appointment is completed (use scheduled_at in the past as proxy)
-    try:
-        with httpx.Client(timeout=10.0) as client:
-            resp = client.get(f"{APPOINTMENTS_URL}/appointments/{payload.appointment_id}", headers={"x-user-role": "admin"})
-        if resp.status_code != 200:
-            raise HTTPException(404, "Appointment not found")
-        appt = resp.json()
-        # expected key 'scheduled_at' as ISO8601
-        scheduled = appt.get("scheduled_at")
-        if not scheduled:
-            raise HTTPException(400, "Appointment missing scheduled time")
-        try:
-            # FastAPI typically serializes datetime to ISO format
-            scheduled_dt = datetime.fromisoformat(scheduled.replace("Z", "+00:00"))
-        except Exception:
-            raise HTTPException(400, "Invalid appointment date")
-        if scheduled_dt > datetime.utcnow().replace(tzinfo=scheduled_dt.tzinfo):
-            raise HTTPException(409, "Appointment not completed yet")
-    except HTTPException:
-        raise
-    except Exception:
-        raise HTTPException(500, "Failed to verify appointment status")
-
-    iid = str(uuid4())
     # Admin may create invoice for a customer (owner_id required)
     target_owner = payload.owner_id if payload.owner_id else x_user_id
+    lookup_ids = {it.service_id for it in (payload.items or []) if it.service_id and _needs_catalog_lookup(it)}
+    # Appointment check and catalog lookups are independent: one round trip for both
+    _, services = await asyncio.gather(
+        _verify_appointment_completed(payload.appointment_id),
+        _fetch_catalog_items(lookup_ids),
+    )
+
+    iid = str(uuid4())
     # Enrich items with names from catalog when missing or when description looks like an ID
     enriched_items: List[dict] = []
     for it in (payload.items or []):
         desc = it.description
         price = it.price
         sid = it.service_id
-        needs_lookup = False
-        if not desc:
-            needs_lookup = True
-        elif sid and (desc == sid or len(desc) >= 32):
-            # Heuristic: fallback descriptions that are IDs/UUID-like tend to be long or equal to service_id
-            needs_lookup = True
-        if sid and needs_lookup:
-            try:
-                with httpx.Client(timeout=5.0) as client:
-                    sresp = client.get(f"{CATALOG_URL}/services/{sid}")
-                if sresp.status_code == 200:
-                    svc = sresp.json()
-                    desc = svc.get("name") or desc
-                    if price is None:
-                        try:
-                            price = float(svc.get("price"))
-                        except Exception:
-                            pass
-            except Exception:
-                pass
+        svc = services.get(sid) if sid and _needs_catalog_lookup(it) else None
+        if svc:
+            desc = svc.get("name") or desc
+            if price is None:
+                try:
+                    price = float(svc.get("price"))
+                except Exception:
+                    pass
         enriched_items.append({
             "description": desc if desc else (sid or ""),
             "price": float(price) if price is not None else 0.0,
@@ -169,7 +617,8 @@ def create_invoice(payload: InvoiceCreate, x_user_id: str | None = Header(defaul
         })
     # Calculate amount if not provided
     amount = payload.amount if payload.amount is not None else sum(max(0.0, float(i.get("price", 0))) for i in enriched_items)
-    with SessionLocal() as s:
+
+    def _create(s: Session):
         row = InvoiceRow(
             id=iid,
             issued_at=datetime.utcnow(),
@@ -182,76 +631,294 @@ def create_invoice(payload: InvoiceCreate, x_user_id: str | None = Header(defaul
             status="unpaid",
         )
         s.add(row)
-        s.commit()
+        _bump_rollup(s, row.issued_at, row.currency, row.status, 1, row.amount)
+        try:
+            s.commit()
+        except IntegrityError as e:
+            s.rollback()
+            if not _appointment_invoiced(e):
+                raise
+            raise HTTPException(409, "Appointment already invoiced")
         s.refresh(row)
         return to_model(row)
+    inv = await run_db(_create)
+    # Pre-render the PDF after responding so the first download is a file send
+    background_tasks.add_task(_prerender_pdf, inv.model_dump())
+    return inv
+
+async def _fetch_appointments(ids: List[str]) -> Dict[str, Optional[dict]]:
+    """Appointment per id (None when not found), via GET /appointments?ids= in chunks."""
+    headers = {"x-user-id": "invoices", "x-user-role": "admin"}
+
+    async def _chunk(chunk: List[str]) -> List[dict]:
+        global _appointments_bulk_size
+        with client_span("GET appointments", headers, **{"appointments.ids": len(chunk)}) as span:
+            resp = await _http_client().get(f"{APPOINTMENTS_URL}/appointments", params={"ids": ",".join(chunk)}, headers=headers)
+            span.set_attribute("http.response.status_code", resp.status_code)
+        if resp.status_code == 422 and len(chunk) > 1:
+            # More ids than the appointments service's MAX_PAGE_SIZE
+            half = (len(chunk) + 1) // 2
+            first, second = await asyncio.gather(_chunk(chunk[:half]), _chunk(chunk[half:]))
+            _appointments_bulk_size = min(_appointments_bulk_size, half)
+            return first + second
+        if resp.status_code != 200:
+            raise HTTPException(502, "Failed to fetch appointments")
+        return resp.json()
+
+    size = _appointments_bulk_size
+    chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+    found = {a["id"]: a for batch in await asyncio.gather(*(_chunk(c) for c in chunks)) for a in batch}
+    return {i: found.get(i) for i in ids}
+
+async def _list_appointments(date_from: Optional[datetime], date_to: Optional[datetime]) -> List[dict]:
+    """Every appointment scheduled in [date_from, date_to), in one call."""
+    headers = {"x-user-id": "invoices", "x-user-role": "admin"}
+    params = {k: _naive_utc(v).isoformat() for k, v in (("from", date_from), ("to", date_to)) if v}
+    with client_span("GET appointments", headers) as span:
+        resp = await _http_client().get(f"{APPOINTMENTS_URL}/appointments", params=params, headers=headers, timeout=30.0)
+        span.set_attribute("http.response.status_code", resp.status_code)
+    if resp.status_code != 200:
+        raise HTTPException(502, "Failed to list appointments")
+    return resp.json()
+
+async def _prerender_pdfs(invoices: List[dict]) -> None:
+    slots = asyncio.Semaphore(PDF_EXPORT_CONCURRENCY)
+
+    async def _one(inv: dict):
+        async with slots:
+            await _prerender_pdf(inv)
+    await asyncio.gather(*(_one(inv) for inv in invoices))
+
+@app.post("/invoices/batch", response_model=List[InvoiceBatchResult])
+async def create_invoice_batch(payload: InvoiceBatchCreate, background_tasks: BackgroundTasks, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+    """Invoice many completed appointments at once: one transaction, one result per appointment.
+
+    Items come from each appointment's services (names and prices from the catalog), the amount
+    from its total price. Appointments that already have an invoice are skipped, so the job can be re-run.
+    """
+    if not x_user_id:
+        raise HTTPException(401, "Unauthorized")
+    if x_user_role != "admin":
+        raise HTTPException(403, "Only admin can create invoices")
+    if not payload.admin_create:
+        raise HTTPException(400, "admin_create flag required")
+    if bool(payload.appointment_ids) == bool(payload.date_from or payload.date_to):
+        raise HTTPException(400, "Give either appointment_ids or a from/to range")
+
+    try:
+        if payload.appointment_ids:
+            ids = list(dict.fromkeys(payload.appointment_ids))
+            if len(ids) > INVOICE_BATCH_MAX:
+                raise HTTPException(422, f"At most {INVOICE_BATCH_MAX} appointments per batch")
+            appointments = await _fetch_appointments(ids)
+        else:
+            listed = await _list_appointments(payload.date_from, payload.date_to)
+            if len(listed) > INVOICE_BATCH_MAX:
+                raise HTTPException(422, f"More than {INVOICE_BATCH_MAX} appointments in range; narrow it")
+            appointments = {a["id"]: a for a in listed}
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(502, "Failed to fetch appointments")
+
+    results: Dict[str, InvoiceBatchResult] = {}
+    ready: List[dict] = []
+    for appointment_id, appt in appointments.items():
+        if appt is None:
+            results[appointment_id] = InvoiceBatchResult(appointment_id=appointment_id, status="failed", detail="Appointment not found")
+            continue
+        try:
+            _check_completed(appt)
+        except HTTPException as e:
+            # A range naturally includes later bookings of the day; only listed ids count as failures
+            status = "failed" if payload.appointment_ids else "skipped"
+            results[appointment_id] = InvoiceBatchResult(appointment_id=appointment_id, status=status, detail=e.detail)
+            continue
+        ready.append(appt)
+
+    services = await _fetch_catalog_items({sid for appt in ready for sid in appt.get("service_ids") or []})
+
+    def _insert(s: Session) -> List[dict]:
+        ids = [appt["id"] for appt in ready]
+        invoiced = set(s.scalars(select(InvoiceRow.appointment_id).where(InvoiceRow.appointment_id.in_(ids)))) if ids else set()
+        now = datetime.utcnow()
+        created = []
+        for appt in ready:
+            if appt["id"] in invoiced:
+                results[appt["id"]] = InvoiceBatchResult(appointment_id=appt["id"], status="skipped", detail="Already invoiced")
+                continue
+            items = []
+            for sid in appt.get("service_ids") or []:
+                svc = services.get(sid) or {}
+                try:
+                    price = float(svc.get("price") or 0.0)
+                except (TypeError, ValueError):
+                    price = 0.0
+                items.append({"description": svc.get("name") or sid, "price": price, "service_id": sid})
+            amount = appt.get("total_price") or sum(max(0.0, i["price"]) for i in items)
+            row = InvoiceRow(
+                id=str(uuid4()),
+                issued_at=now,
+                owner_id=appt["owner_id"],
+                appointment_id=appt["id"],
+                amount=amount,
+                currency=payload.currency,
+                items=items,
+                customer_name=appt.get("customer_name"),
+                status="unpaid",
+            )
+            s.add(row)
+            created.append(to_model(row).model_dump())
+        if created:
+            # Same day, currency and status for the whole batch: one rollup update
+            _bump_rollup(s, now, payload.currency, "unpaid", len(created), sum(inv["amount"] or 0.0 for inv in created))
+        s.commit()
+        return created
+
+    def _create(s: Session) -> List[dict]:
+        for attempt in range(BATCH_CONFLICT_RETRIES + 1):
+            try:
+                created = _insert(s)
+                break
+            except IntegrityError as e:
+                # Another request invoiced some of these since we looked; re-read and skip them
+                s.rollback()
+                if not _appointment_invoiced(e):
+                    raise
+                if attempt == BATCH_CONFLICT_RETRIES:
+                    raise HTTPException(409, "Appointments are being invoiced concurrently; retry")
+        for inv in created:
+            results[inv["appointment_id"]] = InvoiceBatchResult(appointment_id=inv["appointment_id"], status="created", invoice_id=inv["id"])
+        return created
+    created = await run_db(_create)
+    if created:
+        background_tasks.add_task(_prerender_pdfs, created)
+    return json_response([results[i] for i in appointments])
+
+@app.get("/invoices/export")
+async def export_invoices(
+    date_from: Optional[datetime] = Query(default=None, alias="from"),
+    date_to: Optional[datetime] = Query(default=None, alias="to"),
+    status: Optional[str] = None,
+    x_user_id: str | None = Header(default=None),
+    x_user_role: str | None = Header(default=None),
+):
+    """Render every matching invoice in parallel and stream them back as a ZIP of PDFs."""
+    if not x_user_id:
+        raise HTTPException(401, "Unauthorized")
+
+    def _query(s: Session):
+        q = s.query(InvoiceRow)
+        if x_user_role != "admin":
+            q = q.filter(InvoiceRow.owner_id == x_user_id)
+        if date_from:
+            q = q.filter(InvoiceRow.issued_at >= _naive_utc(date_from))
+        if date_to:
+            q = q.filter(InvoiceRow.issued_at < _naive_utc(date_to))
+        if status:
+            q = q.filter(InvoiceRow.status.in_({status, status.lower(), status.capitalize()}))
+        return [to_model(r).model_dump() for r in q.order_by(InvoiceRow.issued_at, InvoiceRow.id)]
+    invoices = await run_db(_query)
+    span = "-".join(d.strftime("%Y%m%d") for d in (date_from, date_to) if d) or "all"
+    return StreamingResponse(_zip_invoices(invoices), media_type="application/zip", headers={
+        "Content-Disposition": f"attachment; filename=invoices-{span}.zip"
+    })
+
+def _whole_days(*bounds: Optional[datetime]) -> bool:
+    return all(b is None or b.time() == datetime.min.time() for b in bounds)
+
+@app.get("/invoices/stats", response_model=List[InvoiceStats])
+async def invoice_stats(
+    group_by: str = Query(default="day", pattern="^(day|month|status|currency)$"),
+    date_from: Optional[datetime] = Query(default=None, alias="from"),
+    date_to: Optional[datetime] = Query(default=None, alias="to"),
+    x_user_role: str | None = Header(default=None),
+):
+    """Invoice count and amount per group and currency, computed in the database (days are UTC)."""
+    if x_user_role != "admin":
+        raise HTTPException(403, "Only admin can view invoice stats")
+    start, end = _naive_utc(date_from), _naive_utc(date_to)
+
+    def _query(s: Session):
+        if INVOICE_STATS_ROLLUP and _whole_days(start, end):
+            r = InvoiceRollupRow
+            month = func.substr(r.day, literal_column("1"), literal_column("7"))
+            group = {"day": r.day, "month": month, "status": r.status, "currency": r.currency}[group_by]
+            currency = r.currency
+            q = s.query(group, currency, func.sum(r.count), func.sum(r.amount))
+            if start:
+                q = q.filter(r.day >= start.strftime("%Y-%m-%d"))
+            if end:
+                q = q.filter(r.day < end.strftime("%Y-%m-%d"))
+            # Rows marked paid leave zero-count rows behind
+            q = q.group_by(group, currency).having(func.sum(r.count) > 0)
+        else:
+            dialect = s.get_bind().dialect.name
+            group = {
+                "day": _period(InvoiceRow.issued_at, "day", dialect),
+                "month": _period(InvoiceRow.issued_at, "month", dialect),
+                "status": func.lower(InvoiceRow.status),
+                "currency": InvoiceRow.currency,
+            }[group_by]
+            currency = InvoiceRow.currency
+            q = s.query(group, currency, func.count(), func.sum(func.coalesce(InvoiceRow.amount, 0.0)))
+            if start:
+                q = q.filter(InvoiceRow.issued_at >= start)
+            if end:
+                q = q.filter(InvoiceRow.issued_at < end)
+            q = q.group_by(group, currency)
+        return [
+            InvoiceStats(group=g, currency=c, count=int(n), amount=round(float(a or 0.0), 2))
+            for g, c, n, a in q.order_by(group, currency).all()
+        ]
+    return json_response(await run_db(_query))
 
 @app.get("/invoices/{invoice_id}", response_model=Invoice)
-def get_invoice(invoice_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
-    with SessionLocal() as s:
-        row = s.query(InvoiceRow).get(invoice_id)
+async def get_invoice(invoice_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+    def _get(s: Session):
+        row = s.get(InvoiceRow, invoice_id)
         if not row:
             raise HTTPException(404, "Not found")
         if x_user_role == "admin" or row.owner_id == x_user_id:
             return to_model(row)
         raise HTTPException(403, "Forbidden")
+    return await run_db(_get)
 
 @app.post("/invoices/{invoice_id}/mark-paid", response_model=Invoice)
-def mark_invoice_paid(invoice_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+async def mark_invoice_paid(invoice_id: str, background_tasks: BackgroundTasks, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
     if x_user_role != "admin":
         raise HTTPException(403, "Only admin can mark invoices as paid")
-    with SessionLocal() as s:
-        row = s.query(InvoiceRow).get(invoice_id)
+
+    def _mark(s: Session):
+        row = s.get(InvoiceRow, invoice_id)
         if not row:
             raise HTTPException(404, "Not found")
+        if row.status.lower() != "paid":
+            _bump_rollup(s, row.issued_at, row.currency, row.status, -1, -(row.amount or 0.0))
+            _bump_rollup(s, row.issued_at, row.currency, "paid", 1, row.amount)
         row.status = "Paid"
         s.commit()
         s.refresh(row)
         return to_model(row)
+    inv = await run_db(_mark)
+    # The status is printed on the PDF: drop the stale render (file I/O, off the event loop) and prepare the new one
+    await run_in_threadpool(discard_pdfs, invoice_id)
+    background_tasks.add_task(_prerender_pdf, inv.model_dump())
+    return inv
 
 @app.get("/invoices/{invoice_id}/pdf")
-def get_invoice_pdf(invoice_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
-    with SessionLocal() as s:
-        row = s.query(InvoiceRow).get(invoice_id)
-    inv = to_model(row) if row else None
+async def get_invoice_pdf(invoice_id: str, x_user_id: str | None = Header(default=None), x_user_role: str | None = Header(default=None)):
+    def _get(s: Session):
+        row = s.get(InvoiceRow, invoice_id)
+        return to_model(row) if row else None
+    inv = await run_db(_get)
     if not inv:
         raise HTTPException(404, "Not found")
     if not (x_user_role == "admin" or inv.owner_id == x_user_id):
         raise HTTPException(403, "Forbidden")
 
-    # Company details from env (with safe defaults)
-    company_name = os.getenv("COMPANY_NAME", "Garage Ltd.")
-    company_address = os.getenv("COMPANY_ADDRESS", "123 Service Lane\nAuto City, AC 12345\n+1 (555) 123-4567")
-    company_logo_path = os.getenv("COMPANY_LOGO_PATH")  # optional
-
-    # Render HTML via Jinja2
-    templates_dir = os.path.join(os.path.dirname(__file__), 'templates')
-    env = Environment(
-        loader=FileSystemLoader(templates_dir),
-        autoescape=select_autoescape(['html', 'xml'])
-    )
-    template = env.get_template('invoice.html')
-    # Friendly references for display (keep raw IDs in API)
-    def fmt(prefix: str, uid: str, dt: datetime | None):
-        head = (uid or "")[:8].upper()
-        date = (dt or datetime.utcnow()).strftime('%Y%m%d')
-        return f"{prefix}-{date}-{head}"
-    invoice_ref = fmt("INV", inv.id, inv.issued_at)
-    appointment_ref = fmt("APT", inv.appointment_id, inv.issued_at)
-    items = list(inv.items or [])
-    total = inv.amount if inv.amount is not None else sum(max(0.0, i.price) for i in items)
-    html = template.render(
-        invoice=inv,
-        total=total,
-        invoice_ref=invoice_ref,
-        appointment_ref=appointment_ref,
-        company_name=company_name,
-        company_address=company_address,
-        company_logo=company_logo_path if company_logo_path and os.path.exists(company_logo_path) else None,
-    )
-
-    # Convert HTML to PDF with WeasyPrint
-    pdf_bytes = HTML(string=html, base_url=templates_dir).write_pdf()
-    return Response(content=pdf_bytes, media_type="application/pdf", headers={
+    # Rendered once per invoice version, then served from the on-disk cache
+    path = await render_pdf_file(inv.model_dump())
+    return FileResponse(path, media_type="application/pdf", headers={
         "Content-Disposition": f"inline; filename=invoice-{invoice_id}.pdf"
     })
@@ -0,0 +1,97 @@
+"""Invoice PDF rendering and the on-disk PDF cache.
+
+Kept free of DB/app imports so it stays cheap to load wherever PDFs are
+rendered. Invoices are passed in as plain dicts (``Invoice.model_dump()``).
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from weasyprint import HTML
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "garage-invoice-pdfs"))
+
+# Built once per process; Jinja2 caches the compiled template on the environment
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(['html', 'xml'])
+)
+with open(os.path.join(TEMPLATES_DIR, 'invoice.html'), 'rb') as _f:
+    _TEMPLATE_HASH = hashlib.sha1(_f.read()).hexdigest()
+
+def _company() -> dict:
+    # Company details from env (with safe defaults)
+    company_logo_path = os.getenv("COMPANY_LOGO_PATH")  # optional
+    return {
+        "company_name": os.getenv("COMPANY_NAME", "Garage Ltd."),
+        "company_address": os.getenv("COMPANY_ADDRESS", "123 Service Lane\nAuto City, AC 12345\n+1 (555) 123-4567"),
+        "company_logo": company_logo_path if company_logo_path and os.path.exists(company_logo_path) else None,
+    }
+
+def content_version(invoice: dict) -> str:
+    """Hash of everything that affects the rendered PDF: invoice fields, branding and template."""
+    h = hashlib.sha1()
+    h.update(json.dumps(invoice, sort_keys=True, default=str).encode())
+    h.update(json.dumps(_company(), sort_keys=True).encode())
+    h.update(_TEMPLATE_HASH.encode())
+    return h.hexdigest()[:16]
+
+def render_html(invoice: dict) -> str:
+    inv = SimpleNamespace(**{**invoice, "items": [SimpleNamespace(**it) for it in invoice.get("items") or []]})
+    # Friendly references for display (keep raw IDs in API)
+    def fmt(prefix: str, uid: str, dt: datetime | None):
+        head = (uid or "")[:8].upper()
+        date = (dt or datetime.utcnow()).strftime('%Y%m%d')
+        return f"{prefix}-{date}-{head}"
+    invoice_ref = fmt("INV", inv.id, inv.issued_at)
+    appointment_ref = fmt("APT", inv.appointment_id, inv.issued_at)
+    items = list(inv.items or [])
+    total = inv.amount if inv.amount is not None else sum(max(0.0, i.price) for i in items)
+    return _env.get_template('invoice.html').render(
+        invoice=inv,
+        total=total,
+        invoice_ref=invoice_ref,
+        appointment_ref=appointment_ref,
+        **_company(),
+    )
+
+def render_pdf(invoice: dict) -> bytes:
+    return HTML(string=render_html(invoice), base_url=TEMPLATES_DIR).write_pdf()
+
+def warm_up() -> None:
+    """Process-pool initializer: compile the template and load WeasyPrint's fonts before the first job."""
+    _env.get_template('invoice.html')
+    HTML(string="<p></p>").write_pdf()
+
+def cached_pdf_path(invoice: dict) -> str:
+    return os.path.join(PDF_CACHE_DIR, f"{invoice['id']}-{content_version(invoice)}.pdf")
+
+def ensure_pdf(invoice: dict) -> str:
+    """Return the path of the cached PDF for this invoice version, rendering it if missing."""
+    path = cached_pdf_path(invoice)
+    if os.path.exists(path):
+        return path
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    pdf_bytes = render_pdf(invoice)
+    # Write then rename so concurrent readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, path)
+    discard_pdfs(invoice["id"], keep=path)
+    return path
+
+def discard_pdfs(invoice_id: str, keep: str | None = None) -> None:
+    """Remove cached PDFs of older versions of an invoice."""
+    for path in glob.glob(os.path.join(PDF_CACHE_DIR, f"{glob.escape(invoice_id)}-*.pdf")):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,129 @@
+"""OpenTelemetry tracing: a server span per request, client spans for outbound calls, SQL spans.
+
+Copied into each service's build context like metrics.py; keep the copies identical.
+Spans are only exported when OTEL_TRACES_EXPORTER is set (console, file or otlp);
+trace context is propagated with W3C ``traceparent`` headers either way.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+OTEL_TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none").lower()
+OTEL_TRACES_FILE = os.getenv("OTEL_TRACES_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("garage")
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+def _exporter() -> Optional[SpanExporter]:
+    if OTEL_TRACES_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if OTEL_TRACES_EXPORTER == "file":
+        return FileSpanExporter(OTEL_TRACES_FILE)
+    if OTEL_TRACES_EXPORTER == "otlp":
+        # Endpoint, headers etc. come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if OTEL_TRACES_EXPORTER in {"", "none"}:
+        return None
+    raise RuntimeError(f"Unknown OTEL_TRACES_EXPORTER: {OTEL_TRACES_EXPORTER}")
+
+class TracingMiddleware:
+    """Continues the caller's trace (or starts one) and records a server span per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(method, context=propagate.extract(carrier), kind=SpanKind.SERVER) as span:
+            span.set_attribute("http.request.method", method)
+            span.set_attribute("url.path", scope["path"])
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.update_name(f"{method} {route}")
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status)
+                if status >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
+
+def setup_tracing(app, service_name: str) -> None:
+    """Install the exporter chosen by OTEL_TRACES_EXPORTER and trace every request to `app`."""
+    exporter = _exporter()
+    if exporter is not None:
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+    app.add_middleware(TracingMiddleware)
+
+@contextmanager
+def client_span(name: str, headers: Optional[dict] = None, **attributes):
+    """Span for an outbound call; injects its trace context into `headers` so the callee continues the trace."""
+    with tracer.start_as_current_span(name, kind=SpanKind.CLIENT, attributes=attributes) as span:
+        if headers is not None:
+            propagate.inject(headers)
+        yield span
+
+def trace_engine(engine) -> None:
+    """Record a span per SQL statement run on a SQLAlchemy engine (``AsyncEngine.sync_engine`` for async ones).
+
+    Only statements run inside a traced request get spans, so startup DDL and pool pings stay out of the traces.
+    """
+    from sqlalchemy import event
+
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and trace.get_current_span().get_span_context().is_valid:
+            op = statement.split(None, 1)[0].upper() if statement.strip() else "SQL"
+            context._otel_span = tracer.start_span(
+                f"{op} {system}", kind=SpanKind.CLIENT, attributes={"db.system": system, "db.statement": statement}
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_otel_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        span = getattr(exception_context.execution_context, "_otel_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
@@ -0,0 +1,109 @@
+import os
+import sys
+import tempfile
+import types
+
+# Allow `pytest services/invoices/tests` from the repo root and run without Postgres by default
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# services/, for the shared testing_db helpers
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+if "DATABASE_URL" not in os.environ:
+    _db_path = os.path.join(tempfile.gettempdir(), "invoices-test.db")
+    if os.path.exists(_db_path):
+        os.remove(_db_path)
+    os.environ["DATABASE_URL"] = "sqlite:///" + _db_path
+os.environ.setdefault("PDF_CACHE_DIR", tempfile.mkdtemp(prefix="invoice-pdfs-"))
+# Render in-process so the stub renderer below is the one used
+os.environ.setdefault("PDF_WORKERS", "0")
+# Upstreams are answered by the `upstream` fixture, never over the network
+os.environ.setdefault("APPOINTMENTS_URL", "http://appointments.test")
+os.environ.setdefault("CATALOG_URL", "http://catalog.test")
+
+# WeasyPrint needs Pango and friends; the tests only care when and how often a PDF is rendered
+RENDERED = []
+
+class _HTML:
+    def __init__(self, string=None, base_url=None):
+        self.string = string or ""
+
+    def write_pdf(self, target=None):
+        RENDERED.append(self.string)
+        return b"%PDF-1.7 stub " + str(len(RENDERED)).encode()
+
+sys.modules["weasyprint"] = types.SimpleNamespace(HTML=_HTML)
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from testing_db import query_plans  # noqa: F401 (fixture)
+
+ADMIN = {"x-user-id": "admin-1", "x-user-role": "admin"}
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    # Startup work (migrations) runs in the background from the lifespan; wait until the service is ready
+    with TestClient(app) as c:
+        deadline = time.monotonic() + 10
+        while c.get("/readyz").status_code != 200:
+            assert time.monotonic() < deadline, c.get("/readyz").json()
+            time.sleep(0.05)
+        yield c
+
+def appointment(owner_id: str = "user-1", days_ago: int = 1, service_ids=("svc-oil",), total_price: float = 80.0) -> dict:
+    """An appointment as the appointments service returns it; completed unless days_ago is negative."""
+    scheduled = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    return {
+        "id": f"appt-{time.monotonic_ns()}",
+        "owner_id": owner_id,
+        "customer_name": "Pat Doe",
+        "scheduled_at": scheduled.isoformat(),
+        "service_ids": list(service_ids),
+        "total_price": total_price,
+    }
+
+class FakeUpstreams:
+    """Appointments and catalog services behind an httpx.MockTransport; records every request."""
+
+    def __init__(self):
+        self.appointments: dict = {}
+        self.services: dict = {"svc-oil": {"id": "svc-oil", "name": "Oil change", "price": 80.0}}
+        self.requests: list = []
+        self.bulk_catalog = True
+        # Like the appointments service's MAX_PAGE_SIZE
+        self.max_ids = 500
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path, params = request.url.path, request.url.params
+        if request.url.host == "appointments.test":
+            if path == "/appointments":
+                if "ids" in params:
+                    ids = params["ids"].split(",")
+                    if len(ids) > self.max_ids:
+                        return httpx.Response(422, json={"detail": f"At most {self.max_ids} ids per request"})
+                    return httpx.Response(200, json=[self.appointments[i] for i in ids if i in self.appointments])
+                return httpx.Response(200, json=list(self.appointments.values()))
+            appt = self.appointments.get(path.rsplit("/", 1)[-1])
+            return httpx.Response(200, json=appt) if appt else httpx.Response(404, json={"detail": "Not found"})
+        if path == "/services" and self.bulk_catalog:
+            ids = params.get("ids", "").split(",")
+            return httpx.Response(200, json=[self.services[i] for i in ids if i in self.services])
+        if path.startswith("/services/"):
+            svc = self.services.get(path.rsplit("/", 1)[-1])
+            return httpx.Response(200, json=svc) if svc else httpx.Response(404, json={"detail": "Not found"})
+        return httpx.Response(404, json={"detail": "Not found"})
+
+@pytest.fixture
+def upstream(client):
+    from app import main
+
+    fake = FakeUpstreams()
+    main._http = httpx.AsyncClient(transport=httpx.MockTransport(fake.handle))
+    main._catalog_cache.clear()
+    yield fake
+    main._catalog_cache.clear()
@@ -0,0 +1,115 @@
+from sqlalchemy import event, insert, select
+
+from app import main
+from conftest import ADMIN, appointment
+
+def _batch(client, **body):
+    return client.post("/invoices/batch", json={"admin_create": True, **body}, headers=ADMIN)
+
+def _by_id(resp) -> dict:
+    assert resp.status_code == 200, resp.text
+    return {r["appointment_id"]: r for r in resp.json()}
+
+def _request_engine():
+    # Handlers run on the async engine when DB_ASYNC is set
+    return main.async_engine.sync_engine if main.async_engine is not None else main.engine
+
+def _rollup_count() -> int:
+    with main.SessionLocal() as s:
+        return sum(s.scalars(select(main.InvoiceRollupRow.count)))
+
+def test_ids_or_range_required(client, upstream):
+    assert _batch(client).status_code == 400
+    assert _batch(client, appointment_ids=["a"], **{"from": "2024-05-01T00:00:00"}).status_code == 400
+    assert client.post("/invoices/batch", json={"appointment_ids": ["a"]}, headers=ADMIN).status_code == 400
+    assert _batch(client, appointment_ids=["a"] * 2 + [str(i) for i in range(main.INVOICE_BATCH_MAX)]).status_code == 422
+
+def test_unknown_and_pending_ids_fail(client, upstream):
+    done, later = appointment(), appointment(days_ago=-1)
+    upstream.appointments.update({a["id"]: a for a in (done, later)})
+    results = _by_id(_batch(client, appointment_ids=[done["id"], later["id"], "no-such-appointment"]))
+    assert results[done["id"]]["status"] == "created"
+    assert results[later["id"]]["status"] == "failed"
+    assert results["no-such-appointment"] == {
+        "appointment_id": "no-such-appointment", "status": "failed", "invoice_id": None, "detail": "Appointment not found"}
+
+def test_range_skips_pending(client, upstream):
+    done, later = appointment(), appointment(days_ago=-1)
+    upstream.appointments.update({a["id"]: a for a in (done, later)})
+    results = _by_id(_batch(client, **{"from": "2000-01-01T00:00:00", "to": "2100-01-01T00:00:00"}))
+    assert results[done["id"]]["status"] == "created"
+    assert results[later["id"]]["status"] == "skipped"
+
+def test_rerun_skips_invoiced(client, upstream):
+    appt = appointment(service_ids=["svc-oil"])
+    upstream.appointments[appt["id"]] = appt
+    first = _by_id(_batch(client, appointment_ids=[appt["id"]]))[appt["id"]]
+    assert first["status"] == "created"
+    invoice = client.get(f"/invoices/{first['invoice_id']}", headers=ADMIN).json()
+    assert invoice["items"] == [{"description": "Oil change", "price": 80.0, "service_id": "svc-oil"}]
+    assert invoice["owner_id"] == appt["owner_id"]
+
+    second = _by_id(_batch(client, appointment_ids=[appt["id"]]))[appt["id"]]
+    assert second == {"appointment_id": appt["id"], "status": "skipped", "invoice_id": None, "detail": "Already invoiced"}
+
+def test_one_rollup_update_per_batch(client, upstream):
+    appts = [appointment() for _ in range(3)]
+    upstream.appointments.update({a["id"]: a for a in appts})
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if "invoice_rollup" in statement:
+            statements.append(statement)
+
+    before = _rollup_count()
+    event.listen(_request_engine(), "before_cursor_execute", _record)
+    try:
+        results = _by_id(_batch(client, appointment_ids=[a["id"] for a in appts]))
+    finally:
+        event.remove(_request_engine(), "before_cursor_execute", _record)
+    assert {r["status"] for r in results.values()} == {"created"}
+    assert len(statements) == 1
+    assert _rollup_count() == before + 3
+
+def test_concurrent_invoice_is_skipped(client, upstream):
+    raced, free = appointment(), appointment()
+    upstream.appointments.update({a["id"]: a for a in (raced, free)})
+    rival = main.InvoiceRow(
+        id="rival-invoice", appointment_id=raced["id"], amount=1.0, currency="USD", items=[],
+        owner_id=raced["owner_id"], status="unpaid", issued_at=main.datetime.utcnow(),
+    )
+
+    def _invoice_first(conn, cursor, statement, parameters, context, executemany):
+        # Another request commits an invoice for `raced` right after the batch checked for one
+        if statement.lstrip().startswith("SELECT invoices.appointment_id") and not statements:
+            statements.append(statement)
+            with main.engine.begin() as other:
+                other.execute(insert(main.InvoiceRow).values(
+                    {c.name: getattr(rival, c.key) for c in main.InvoiceRow.__table__.columns}))
+
+    statements = []
+    event.listen(_request_engine(), "after_cursor_execute", _invoice_first)
+    try:
+        results = _by_id(_batch(client, appointment_ids=[raced["id"], free["id"]]))
+    finally:
+        event.remove(_request_engine(), "after_cursor_execute", _invoice_first)
+    assert statements
+    assert results[raced["id"]]["status"] == "skipped"
+    assert results[free["id"]]["status"] == "created"
+
+def test_bulk_size_above_upstream_limit_splits(client, upstream, monkeypatch):
+    appts = [appointment() for _ in range(7)]
+    upstream.appointments.update({a["id"]: a for a in appts})
+    upstream.max_ids = 2
+    monkeypatch.setattr(main, "_appointments_bulk_size", 5)
+    results = _by_id(_batch(client, appointment_ids=[a["id"] for a in appts]))
+    assert {r["status"] for r in results.values()} == {"created"}
+    assert main._appointments_bulk_size == 2
+
+    # Later batches start at the learned size
+    upstream.requests.clear()
+    more = [appointment() for _ in range(4)]
+    upstream.appointments.update({a["id"]: a for a in more})
+    _batch(client, appointment_ids=[a["id"] for a in more])
+    sizes = [len(r.url.params["ids"].split(",")) for r in upstream.requests if "ids" in r.url.params and r.url.path == "/appointments"]
+    assert sizes == [2, 2]
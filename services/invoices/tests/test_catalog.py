@@ -0,0 +1,69 @@
+import asyncio
+
+import httpx
+
+from app import main
+
+def _fetch(*ids: str) -> dict:
+    return asyncio.run(main._fetch_catalog_items(set(ids)))
+
+def _catalog_calls(upstream) -> list:
+    return [r.url.path + (f"?ids={','.join(sorted(r.url.params['ids'].split(',')))}" if "ids" in r.url.params else "")
+            for r in upstream.requests if r.url.host == "catalog.test"]
+
+def test_bulk_lookup_then_cache_hit(client, upstream):
+    upstream.services["svc-brakes"] = {"id": "svc-brakes", "name": "Brake pads", "price": "120.5"}
+    found = _fetch("svc-oil", "svc-brakes", "svc-gone")
+    assert found == {"svc-oil": {"name": "Oil change", "price": 80.0}, "svc-brakes": {"name": "Brake pads", "price": "120.5"}}
+    assert _catalog_calls(upstream) == ["/services?ids=svc-brakes,svc-gone,svc-oil"]
+
+    upstream.requests.clear()
+    assert _fetch("svc-oil", "svc-brakes") == found
+    assert _catalog_calls(upstream) == []
+    # Only ids missing from the cache are looked up
+    _fetch("svc-oil", "svc-gone")
+    assert _catalog_calls(upstream) == ["/services?ids=svc-gone"]
+
+def test_cached_entries_expire(client, upstream, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(main.time, "time", lambda: now[0])
+    _fetch("svc-oil")
+    upstream.services["svc-oil"] = {"id": "svc-oil", "name": "Synthetic oil change", "price": 95.0}
+
+    now[0] += main.CATALOG_CACHE_TTL - 1
+    assert _fetch("svc-oil")["svc-oil"]["name"] == "Oil change"
+    now[0] += 2
+    assert _fetch("svc-oil")["svc-oil"] == {"name": "Synthetic oil change", "price": 95.0}
+    assert len(_catalog_calls(upstream)) == 2
+
+def test_falls_back_to_single_lookups(client, upstream):
+    # A catalog without the bulk ?ids= lookup
+    upstream.bulk_catalog = False
+    upstream.services["svc-tyres"] = {"id": "svc-tyres", "name": "Tyre swap", "price": 40.0}
+    found = _fetch("svc-oil", "svc-tyres", "svc-gone")
+    assert found == {"svc-oil": {"name": "Oil change", "price": 80.0}, "svc-tyres": {"name": "Tyre swap", "price": 40.0}}
+    assert sorted(_catalog_calls(upstream)) == [
+        "/services/svc-gone", "/services/svc-oil", "/services/svc-tyres", "/services?ids=svc-gone,svc-oil,svc-tyres"]
+
+def test_unreachable_catalog_returns_nothing(client, upstream):
+    def refuse(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("refused")
+
+    main._http = httpx.AsyncClient(transport=httpx.MockTransport(refuse))
+    assert _fetch("svc-oil") == {}
+    # Nothing cached from the failed lookup
+    assert main._catalog_cache == {}
+
+def test_invoice_items_are_named_from_the_catalog(client, upstream):
+    from conftest import ADMIN, appointment
+
+    appt = appointment()
+    upstream.appointments[appt["id"]] = appt
+    body = {"appointment_id": appt["id"], "owner_id": appt["owner_id"], "admin_create": True,
+            "items": [{"description": "svc-oil", "price": 80.0, "service_id": "svc-oil"},
+                      {"description": "Wiper fluid", "price": 5.0, "service_id": "svc-wipers"}]}
+    resp = client.post("/invoices", json=body, headers=ADMIN)
+    assert resp.status_code == 201
+    assert [it["description"] for it in resp.json()["items"]] == ["Oil change", "Wiper fluid"]
+    # Items with a real description are not looked up
+    assert _catalog_calls(upstream) == ["/services?ids=svc-oil"]
@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import main
+from conftest import ADMIN, appointment
+
+def _body(appt: dict) -> dict:
+    return {"appointment_id": appt["id"], "items": [], "amount": 10.0, "owner_id": appt["owner_id"], "admin_create": True}
+
+def test_second_invoice_for_appointment_conflicts(client, upstream):
+    appt = appointment()
+    upstream.appointments[appt["id"]] = appt
+    assert client.post("/invoices", json=_body(appt), headers=ADMIN).status_code == 201
+    resp = client.post("/invoices", json=_body(appt), headers=ADMIN)
+    assert resp.status_code == 409
+    assert resp.json()["detail"] == "Appointment already invoiced"
+    listed = client.get("/invoices", params={"appointment_id": appt["id"]}, headers=ADMIN).json()
+    assert len(listed) == 1
+
+def test_other_integrity_errors_are_not_conflicts(client, upstream, monkeypatch):
+    first, second = appointment(), appointment()
+    upstream.appointments.update({a["id"]: a for a in (first, second)})
+    monkeypatch.setattr(main, "uuid4", lambda: "same-invoice-id")
+    assert client.post("/invoices", json=_body(first), headers=ADMIN).status_code == 201
+    # A clashing primary key is a bug, not "already invoiced"
+    with pytest.raises(IntegrityError):
+        client.post("/invoices", json=_body(second), headers=ADMIN)
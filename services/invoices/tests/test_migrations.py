@@ -0,0 +1,38 @@
+from sqlalchemy import delete, insert, inspect, text
+
+from app import main
+from app.migrations import SCHEMA_MIGRATIONS
+from testing_db import migrate_fresh, schema_differences
+
+def _indexes() -> set:
+    return {i["name"] for i in inspect(main.engine).get_indexes("invoices")}
+
+def _invoice(invoice_id: str, appointment_id: str) -> dict:
+    return {"id": invoice_id, "appointment_id": appointment_id, "amount": 10.0, "currency": "USD", "items": [],
+            "customer_name": None, "owner_id": "user-1", "status": "unpaid", "issued_at": main.datetime.utcnow()}
+
+def test_duplicate_invoices_defer_unique_index(client):
+    # A database from before step 6, in which one appointment was invoiced twice
+    with main.engine.begin() as conn:
+        conn.execute(text("DROP INDEX ux_invoices_appointment_id"))
+        conn.execute(text("CREATE INDEX ix_invoices_appointment_id ON invoices (appointment_id)"))
+        conn.execute(delete(SCHEMA_MIGRATIONS).where(SCHEMA_MIGRATIONS.c.service == "invoices", SCHEMA_MIGRATIONS.c.version == 6))
+        conn.execute(insert(main.InvoiceRow), [_invoice("dup-1", "appt-twice"), _invoice("dup-2", "appt-twice")])
+
+    # Startup goes through; the step is recorded and the plain index kept
+    main._init_db()
+    assert "ux_invoices_appointment_id" not in _indexes()
+    assert "ix_invoices_appointment_id" in _indexes()
+    main._init_db()
+    assert "ux_invoices_appointment_id" not in _indexes()
+
+    # Once an operator resolved the duplicates, the next start adds the index
+    with main.engine.begin() as conn:
+        conn.execute(delete(main.InvoiceRow).where(main.InvoiceRow.id == "dup-2"))
+    main._init_db()
+    assert "ux_invoices_appointment_id" in _indexes()
+    assert "ix_invoices_appointment_id" not in _indexes()
+
+def test_fresh_database_matches_model(tmp_path):
+    migrated = migrate_fresh(tmp_path / "invoices.db", "invoices", main.MIGRATIONS)
+    assert schema_differences(migrated, main.Base.metadata) == []
@@ -0,0 +1,108 @@
+import glob
+import io
+import os
+import zipfile
+from datetime import datetime
+from uuid import uuid4
+
+from app import pdf
+from conftest import ADMIN, RENDERED, appointment
+
+def _invoice(client, upstream, owner_id: str) -> dict:
+    appt = appointment(owner_id=owner_id)
+    upstream.appointments[appt["id"]] = appt
+    body = {"appointment_id": appt["id"], "items": [{"description": "Oil change", "price": 80.0}],
+            "owner_id": owner_id, "admin_create": True}
+    resp = client.post("/invoices", json=body, headers=ADMIN)
+    assert resp.status_code == 201, resp.text
+    return resp.json()
+
+def _cached(invoice_id: str) -> list:
+    return sorted(glob.glob(os.path.join(pdf.PDF_CACHE_DIR, f"{invoice_id}-*.pdf")))
+
+def _download(client, invoice_id: str, headers=ADMIN) -> bytes:
+    resp = client.get(f"/invoices/{invoice_id}/pdf", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/pdf"
+    return resp.content
+
+def test_created_invoice_is_prerendered_and_served_from_cache(client, upstream):
+    owner = str(uuid4())
+    inv = _invoice(client, upstream, owner)
+    # The background pre-render ran before the response completed
+    [path] = _cached(inv["id"])
+    rendered = len(RENDERED)
+
+    assert _download(client, inv["id"], {"x-user-id": owner}) == open(path, "rb").read()
+    assert len(RENDERED) == rendered
+    assert client.get(f"/invoices/{inv['id']}/pdf", headers={"x-user-id": "someone-else"}).status_code == 403
+
+    os.remove(path)
+    _download(client, inv["id"])
+    assert len(RENDERED) == rendered + 1
+    assert _cached(inv["id"]) == [path]
+
+def test_branding_and_template_changes_render_a_new_version(client, upstream, monkeypatch):
+    inv = _invoice(client, upstream, str(uuid4()))
+    [original] = _cached(inv["id"])
+
+    monkeypatch.setenv("COMPANY_NAME", "Garage & Sons")
+    rebranded = _download(client, inv["id"])
+    [path] = _cached(inv["id"])
+    assert path != original
+    assert "Garage &amp; Sons" in RENDERED[-1]
+
+    monkeypatch.setattr(pdf, "_TEMPLATE_HASH", "edited-template")
+    assert _download(client, inv["id"]) != rebranded
+    # Each new version replaces the previous file
+    assert len(_cached(inv["id"])) == 1
+    assert _cached(inv["id"]) != [path]
+
+def test_pdf_is_written_atomically(monkeypatch):
+    invoice = {"id": str(uuid4()), "appointment_id": "a", "amount": 1.0, "currency": "USD", "items": [],
+               "customer_name": None, "owner_id": "o", "status": "unpaid", "issued_at": datetime(2024, 5, 31, 9, 0), "admin_create": False}
+    target = pdf.cached_pdf_path(invoice)
+    replaced = []
+    real_replace = os.replace
+
+    def _replace(src, dst):
+        # The final name only ever appears complete, by rename from a temp file in the same directory
+        assert not os.path.exists(dst)
+        assert os.path.dirname(src) == pdf.PDF_CACHE_DIR
+        assert open(src, "rb").read().startswith(b"%PDF")
+        replaced.append((src, dst))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(pdf.os, "replace", _replace)
+    assert pdf.ensure_pdf(invoice) == target
+    assert [dst for _, dst in replaced] == [target]
+    assert not glob.glob(os.path.join(pdf.PDF_CACHE_DIR, "*.tmp"))
+    # Already cached: no second render or rename
+    assert pdf.ensure_pdf(invoice) == target
+    assert len(replaced) == 1
+
+def test_marking_paid_replaces_the_cached_pdf(client, upstream):
+    inv = _invoice(client, upstream, str(uuid4()))
+    [unpaid] = _cached(inv["id"])
+    resp = client.post(f"/invoices/{inv['id']}/mark-paid", headers=ADMIN)
+    assert resp.status_code == 200
+    [paid] = _cached(inv["id"])
+    assert paid != unpaid
+    assert "Status: Paid" in RENDERED[-1]
+    # The pre-rendered file is the one the next download serves
+    rendered = len(RENDERED)
+    assert _download(client, inv["id"]) == open(paid, "rb").read()
+    assert len(RENDERED) == rendered
+
+def test_export_zips_one_pdf_per_invoice(client, upstream):
+    owner = str(uuid4())
+    invoices = [_invoice(client, upstream, owner) for _ in range(3)]
+    _invoice(client, upstream, str(uuid4()))
+    resp = client.get("/invoices/export", headers={"x-user-id": owner})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert sorted(zf.namelist()) == sorted(f"invoice-{inv['id']}.pdf" for inv in invoices)
+        for inv in invoices:
+            [path] = _cached(inv["id"])
+            assert zf.read(f"invoice-{inv['id']}.pdf") == open(path, "rb").read()
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.main import InvoiceRow, SessionLocal
+from conftest import ADMIN, appointment
+from testing_db import PLAN_CHECK_MIN_ROWS
+
+START = datetime(2034, 1, 2, 8, 0)
+
+def _seed(owners):
+    # Enough rows that a query reading the whole table fails the plan check
+    with SessionLocal() as s:
+        s.add_all(
+            InvoiceRow(id=str(uuid4()), appointment_id=str(uuid4()), amount=50.0, currency="USD", items=[],
+                       customer_name="Seed", owner_id=owners[i % len(owners)], status="unpaid" if i % 3 else "Paid",
+                       issued_at=START + timedelta(hours=i))
+            for i in range(PLAN_CHECK_MIN_ROWS * 2)
+        )
+        s.commit()
+
+def test_handler_queries_use_indexes(client, upstream, query_plans):
+    owners = [str(uuid4()) for _ in range(10)]
+    _seed(owners)
+    owner = {"x-user-id": owners[0]}
+    week = {"from": START.isoformat(), "to": (START + timedelta(days=7)).isoformat()}
+
+    assert client.get("/invoices", params={"limit": 20}, headers=owner).status_code == 200
+    page = client.get("/invoices", params={"limit": 20, **week}, headers=ADMIN)
+    assert client.get("/invoices", params={"limit": 20, "cursor": page.headers["x-next-cursor"]}, headers=ADMIN).status_code == 200
+    assert client.get("/invoices", params={"limit": 20, "owner_id": owners[1]}, headers=ADMIN).status_code == 200
+    assert client.get("/invoices", params={"limit": 20, "status": "paid"}, headers=ADMIN).status_code == 200
+    first = page.json()[0]
+    assert client.get("/invoices", params={"appointment_id": first["appointment_id"]}, headers=ADMIN).json() == [first]
+    assert client.get(f"/invoices/{first['id']}", headers=ADMIN).status_code == 200
+
+    # Whole days are answered from the rollup, anything else from the invoices table
+    assert client.get("/invoices/stats", params={"group_by": "status", **week}, headers=ADMIN).status_code == 200
+    hours = {"from": (START + timedelta(hours=1)).isoformat(), "to": (START + timedelta(hours=30)).isoformat()}
+    assert client.get("/invoices/stats", params={"group_by": "day", **hours}, headers=ADMIN).status_code == 200
+
+    # The batch looks up existing invoices by appointment id
+    appts = [appointment() for _ in range(3)]
+    upstream.appointments.update({a["id"]: a for a in appts})
+    batch = client.post("/invoices/batch", json={"appointment_ids": [a["id"] for a in appts], "admin_create": True}, headers=ADMIN)
+    assert [r["status"] for r in batch.json()] == ["created"] * 3
+    assert client.post(f"/invoices/{batch.json()[0]['invoice_id']}/mark-paid", headers=ADMIN).status_code == 200
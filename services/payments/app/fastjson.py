@@ -0,0 +1,32 @@
+"""JSON responses for models the service built itself.
+
+Copied into each service's build context like metrics.py; keep the copies identical.
+
+FastAPI re-validates whatever a route returns against its response_model and then
+runs it through jsonable_encoder. Our handlers already return validated models
+(``to_model``), so ``json_response`` serializes them in one pass with pydantic-core's
+encoder and returns a finished Response, which FastAPI sends as is. The route's
+response_model still documents the schema. FAST_JSON=false restores the default path.
+"""
+import os
+from typing import Any, Optional
+
+from pydantic_core import to_json
+from starlette.responses import Response
+
+FAST_JSON = os.getenv("FAST_JSON", "true").lower() in {"1", "true", "yes"}
+
+def json_response(content: Any, response: Optional[Response] = None) -> Any:
+    """Serialize models/lists of models straight to a JSON Response.
+
+    `response` is the route's injected Response; its status code and headers (e.g. X-Next-Cursor,
+    Set-Cookie) are carried over, since FastAPI ignores them once the route returns a Response of
+    its own. Unless a status code was set on it the answer is 200, whatever the route declares.
+    """
+    if not FAST_JSON:
+        return content
+    status_code = response.status_code if response is not None and response.status_code else 200
+    out = Response(to_json(content), status_code=status_code, media_type="application/json")
+    if response is not None:
+        out.raw_headers.extend((k, v) for k, v in response.raw_headers if k not in {b"content-length", b"content-type"})
+    return out
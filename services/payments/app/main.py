@@ -1,8 +1,17 @@
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
 from uuid import uuid4
 from datetime import datetime
 from fastapi import FastAPI
 from pydantic import BaseModel
+from sqlalchemy import create_engine, Column, MetaData, String, Float, DateTime, Table
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker
+
+from .fastjson import json_response
+from .health import db_check, setup_health
+from .metrics import instrument, instrument_engine
+from .migrations import create_table, migrate
+from .tracing import setup_tracing, trace_engine
 
 class PaymentCreate(BaseModel):
     invoice_id: str
@@ -23,9 +32,100 @@ try:
     import stripe
 except Exception:
     stripe = None
-app = FastAPI(title="Payments Service")
 
-_STORE: Dict[str, Payment] = {}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _HEALTH.start(_startup)
+    yield
+    await _HEALTH.stop()
+
+app = FastAPI(title="Payments Service", lifespan=lifespan)
+instrument(app)
+setup_tracing(app, "payments")
+_HEALTH = setup_health(app)
+
+# Storage: "memory" (per-process, default), "sqlite" (local testing) or "postgres" (shared, lets the service scale out)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory").lower()
+_DEFAULT_DATABASE_URLS = {
+    "sqlite": "sqlite:///./payments.db",
+    "postgres": "postgresql+psycopg2://garage:garage@db:5432/garage",
+}
+if STORAGE_BACKEND != "memory" and STORAGE_BACKEND not in _DEFAULT_DATABASE_URLS:
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+Base = declarative_base()
+
+class PaymentRow(Base):
+    __tablename__ = "payments"
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    invoice_id: Mapped[str] = mapped_column(String(64), index=True)
+    amount: Mapped[float] = mapped_column(Float)
+    currency: Mapped[str] = mapped_column(String(16))
+    method: Mapped[str] = mapped_column(String(32))
+    status: Mapped[str] = mapped_column(String(32))
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+# The table as create_all made it before migrations existed; later steps bring it up to PaymentRow
+_PAYMENTS_V1 = Table(
+    "payments", MetaData(),
+    Column("id", String(64), primary_key=True),
+    Column("invoice_id", String(64), nullable=False, index=True),
+    Column("amount", Float, nullable=False),
+    Column("currency", String(16), nullable=False),
+    Column("method", String(32), nullable=False),
+    Column("status", String(32), nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+)
+
+# Append new steps; never edit or renumber one that has shipped
+MIGRATIONS = [
+    (1, "payments table", lambda conn: create_table(conn, _PAYMENTS_V1)),
+]
+
+engine = None
+SessionLocal = None
+if STORAGE_BACKEND != "memory":
+    DATABASE_URL = os.getenv("DATABASE_URL", _DEFAULT_DATABASE_URLS[STORAGE_BACKEND])
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    instrument_engine(engine)
+    trace_engine(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+def _startup() -> None:
+    # Runs from the lifespan hook and is retried until the DB is reachable
+    if engine is not None:
+        migrate(engine, "payments", MIGRATIONS)
+
+if engine is not None:
+    _HEALTH.add_check("db", db_check(engine))
+
+class MemoryPaymentStore:
+    def __init__(self):
+        self._items: Dict[str, Payment] = {}
+
+    def add(self, payment: Payment) -> Payment:
+        self._items[payment.id] = payment
+        return payment
+
+    def list(self) -> List[Payment]:
+        return list(self._items.values())
+
+class SqlPaymentStore:
+    def add(self, payment: Payment) -> Payment:
+        with SessionLocal() as s:
+            s.add(PaymentRow(**payment.model_dump()))
+            s.commit()
+        return payment
+
+    def list(self) -> List[Payment]:
+        with SessionLocal() as s:
+            rows = s.query(PaymentRow).order_by(PaymentRow.created_at, PaymentRow.id).all()
+            return [
+                Payment(id=r.id, invoice_id=r.invoice_id, amount=r.amount, currency=r.currency, method=r.method, status=r.status, created_at=r.created_at)
+                for r in rows
+            ]
+
+_STORE = MemoryPaymentStore() if engine is None else SqlPaymentStore()
 
 @app.get("/health")
 def health():
@@ -105,11 +205,10 @@ async def verify_session(req: VerifySessionRequest):
 
 @app.get("/payments", response_model=List[Payment])
 def list_payments():
-    return list(_STORE.values())
+    return json_response(_STORE.list())
 
 @app.post("/payments", response_model=Payment, status_code=201)
 def create_payment(payload: PaymentCreate):
     pid = str(uuid4())
     payment = Payment(id=pid, created_at=datetime.utcnow(), **payload.model_dump())
-    _STORE[pid] = payment
-    return payment
+    return _STORE.add(payment)
@@ -0,0 +1,82 @@
+"""Versioned schema migrations.
+
+Copied into each service's build context like metrics.py; keep the copies identical.
+
+A service lists its migrations in order as ``(version, description, step)``, where
+``step(conn)`` changes the schema on an open connection. ``migrate`` runs the ones not
+yet recorded in ``schema_migrations`` for that service, each in its own transaction
+together with its bookkeeping row, so a failed step rolls back and is retried on the
+next start. On Postgres a transaction-level advisory lock keeps replicas that start
+together from running the same step twice.
+
+The helpers below skip what already exists, so a database created with create_all
+before migrations existed is adopted by running every step: the ones it already
+reflects do nothing.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger("migrations")
+
+Migration = Tuple[int, str, Callable[[Connection], None]]
+
+_metadata = MetaData()
+SCHEMA_MIGRATIONS = Table(
+    "schema_migrations", _metadata,
+    Column("service", String(64), primary_key=True),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime),
+)
+
+def migrate(engine: Engine, service: str, migrations: Iterable[Migration]) -> List[int]:
+    """Apply the pending migrations in version order; returns the versions applied."""
+    migrations = list(migrations)
+    versions = [m[0] for m in migrations]
+    if versions != sorted(set(versions)):
+        raise RuntimeError(f"{service} migrations must have unique, increasing versions")
+    SCHEMA_MIGRATIONS.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        done = set(conn.execute(select(SCHEMA_MIGRATIONS.c.version).where(SCHEMA_MIGRATIONS.c.service == service)).scalars())
+    applied = []
+    for version, description, step in migrations:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"schema_migrations:{service}"})
+                # Another replica may have applied it while we waited for the lock
+                already = conn.execute(select(SCHEMA_MIGRATIONS.c.version).where(
+                    SCHEMA_MIGRATIONS.c.service == service, SCHEMA_MIGRATIONS.c.version == version)).first()
+                if already is not None:
+                    continue
+            step(conn)
+            conn.execute(SCHEMA_MIGRATIONS.insert().values(
+                service=service, version=version, description=description,
+                applied_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+        logger.info("applied %s migration %d: %s", service, version, description)
+        applied.append(version)
+    return applied
+
+def create_table(conn: Connection, table: Table) -> None:
+    """Create `table` with its indexes unless it exists."""
+    table.create(conn, checkfirst=True)
+
+def add_column(conn: Connection, table: str, column: Column) -> None:
+    if column.name not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"))
+
+def create_index(conn: Connection, table: str, name: str, *columns: str, unique: bool = False, where: str | None = None) -> None:
+    """Create the index unless it exists; `where` makes it partial (SQLite and Postgres both support it)."""
+    if name not in {i["name"] for i in inspect(conn).get_indexes(table)}:
+        cols = ", ".join(columns)
+        predicate = f" WHERE {where}" if where else ""
+        conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({cols}){predicate}"))
+
+def drop_index(conn: Connection, table: str, name: str) -> None:
+    if name in {i["name"] for i in inspect(conn).get_indexes(table)}:
+        conn.execute(text(f"DROP INDEX {name}"))
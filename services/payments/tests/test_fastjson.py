@@ -0,0 +1,38 @@
+from typing import List
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app import fastjson
+from app.fastjson import json_response
+from app.main import Payment
+
+app = FastAPI()
+
+@app.get("/plain", response_model=List[Payment])
+def plain():
+    return json_response([])
+
+@app.get("/partial", response_model=List[Payment])
+def partial(response: Response):
+    response.status_code = 206
+    response.headers["X-Next-Cursor"] = "abc"
+    response.set_cookie("seen", "1")
+    response.set_cookie("theme", "dark")
+    return json_response([{"id": "p1"}], response)
+
+def test_status_and_headers_of_the_injected_response_are_kept():
+    client = TestClient(app)
+    r = client.get("/partial")
+    assert r.status_code == 206
+    assert r.json() == [{"id": "p1"}]
+    assert r.headers["x-next-cursor"] == "abc"
+    assert r.headers["content-type"] == "application/json"
+    assert {c.name for c in r.cookies.jar} == {"seen", "theme"}
+
+    r = client.get("/plain")
+    assert r.status_code == 200 and r.content == b"[]"
+
+def test_fast_json_off_returns_the_content(monkeypatch):
+    monkeypatch.setattr(fastjson, "FAST_JSON", False)
+    assert json_response([1, 2]) == [1, 2]
@@ -0,0 +1,6 @@
+from app import main
+from testing_db import migrate_fresh, schema_differences
+
+def test_fresh_database_matches_model(tmp_path):
+    migrated = migrate_fresh(tmp_path / "payments.db", "payments", main.MIGRATIONS)
+    assert schema_differences(migrated, main.Base.metadata) == []
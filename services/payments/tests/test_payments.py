@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import main
+
+
+def _payment(pid, created_at):
+    return main.Payment(id=pid, invoice_id="inv-1", amount=10.5, created_at=created_at)
+
+@pytest.mark.parametrize("store", [main.MemoryPaymentStore, main.SqlPaymentStore])
+def test_stores_list_payments_in_creation_order(client, store):
+    s = store()
+    start = datetime(2024, 1, 1)
+    s.add(_payment(f"{store.__name__}-a", start))
+    s.add(_payment(f"{store.__name__}-b", start + timedelta(seconds=1)))
+    mine = [p for p in s.list() if p.id.startswith(store.__name__)]
+    assert [p.id for p in mine] == [f"{store.__name__}-a", f"{store.__name__}-b"]
+    assert mine[0] == _payment(f"{store.__name__}-a", start)
+
+def test_payments_are_stored_in_the_table(client):
+    r = client.post("/payments", json={"invoice_id": "inv-2", "amount": 99.0})
+    assert r.status_code == 201
+    created = r.json()
+    assert created["status"] == "completed" and created["currency"] == "USD"
+
+    with main.SessionLocal() as s:
+        row = s.get(main.PaymentRow, created["id"])
+        assert (row.invoice_id, row.amount, row.method) == ("inv-2", 99.0, "card")
+    listed = {p["id"]: p for p in client.get("/payments").json()}
+    assert listed[created["id"]] == created
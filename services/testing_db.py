@@ -0,0 +1,112 @@
+"""Database helpers shared by the service test suites.
+
+Each suite's conftest puts ``services/`` on sys.path and imports from here, including the
+``query_plans`` fixture. They work on the ``app`` package of the suite being run.
+"""
+import os
+import re
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+
+# Tables at least this big must not be read in full by a handler's query
+PLAN_CHECK_MIN_ROWS = int(os.getenv("PLAN_CHECK_MIN_ROWS", "500"))
+
+def migrate_fresh(path, service: str, migrations) -> Engine:
+    """A new SQLite database at `path` with every migration applied."""
+    from app.migrations import migrate
+
+    engine = create_engine(f"sqlite:///{path}")
+    migrate(engine, service, migrations)
+    return engine
+
+def schema_differences(engine: Engine, metadata) -> list:
+    """Tables, columns and indexes of `metadata` that the database lacks, or has besides them."""
+    db = inspect(engine)
+    differences = []
+    present = set(db.get_table_names())
+    for name, table in metadata.tables.items():
+        if name not in present:
+            differences.append(f"missing table {name}")
+            continue
+        for kind, expected, actual in (
+            ("column", {c.name for c in table.columns}, {c["name"] for c in db.get_columns(name)}),
+            ("index", {i.name for i in table.indexes}, {i["name"] for i in db.get_indexes(name)}),
+        ):
+            differences += [f"{name}: missing {kind} {n}" for n in sorted(expected - actual)]
+            differences += [f"{name}: unexpected {kind} {n}" for n in sorted(actual - expected)]
+    return differences
+
+def _order_by(statement: str) -> list:
+    """Column names of the statement's last ORDER BY, without table prefixes or directions."""
+    clauses = re.findall(r"\bORDER BY\s+(.*?)(?:\s+LIMIT\b|\s+OFFSET\b|\)|$)", statement, re.IGNORECASE | re.DOTALL)
+    if not clauses:
+        return []
+    return [term.split()[0].rsplit(".", 1)[-1].strip('"') for term in clauses[-1].split(",")]
+
+def _sqlite_full_scans(cursor, statement: str, parameters) -> list:
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    details = [row[-1] for row in cursor.fetchall()]
+    # "SCAN t" reads the table. "SCAN t USING INDEX ix" walks the whole index, which only stays
+    # cheap when the index yields the ORDER BY and a LIMIT stops the walk early (a keyset page)
+    order = _order_by(statement)
+    in_order = bool(order) and re.search(r"\bLIMIT\b", statement, re.IGNORECASE) is not None \
+        and not any("TEMP B-TREE FOR" in d and "ORDER BY" in d for d in details)
+    tables = []
+    for detail in details:
+        if not detail.startswith("SCAN "):
+            continue
+        walk = re.match(r"SCAN \S+(?: AS \S+)? USING (?:COVERING )?INDEX (\S+)", detail)
+        if walk and in_order:
+            cursor.execute(f"PRAGMA index_info({walk.group(1)})")
+            if [name for _, _, name in sorted(cursor.fetchall())][:len(order)] == order:
+                continue
+        tables.append(detail.split()[1])
+    return tables
+
+def _full_scans(cursor, dialect: str, statement: str, parameters) -> list:
+    """Tables the statement would read in full, from the database's own EXPLAIN."""
+    if dialect == "sqlite":
+        return _sqlite_full_scans(cursor, statement, parameters)
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    tables, nodes = [], [cursor.fetchone()[0][0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            tables.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return tables
+
+@pytest.fixture
+def query_plans():
+    """EXPLAIN every SELECT/UPDATE/DELETE the app runs during the test; fail on full scans of large tables."""
+    from app.main import Base, async_engine, engine
+
+    problems = []
+
+    def _check(conn, cursor, statement, parameters, context, executemany):
+        if executemany or statement.lstrip().split(None, 1)[0].upper() not in {"SELECT", "UPDATE", "DELETE"}:
+            return
+        plan_cursor = conn.connection.cursor()
+        try:
+            for table in _full_scans(plan_cursor, conn.dialect.name, statement, parameters):
+                if table not in Base.metadata.tables:
+                    continue
+                plan_cursor.execute(f"SELECT count(*) FROM {table}")
+                rows = plan_cursor.fetchone()[0]
+                if rows >= PLAN_CHECK_MIN_ROWS:
+                    problems.append(f"full scan of {table} ({rows} rows): {statement}")
+        finally:
+            plan_cursor.close()
+
+    # With DB_ASYNC the handlers' queries run on the async engine; startup and tests still use the sync one
+    engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    for e in engines:
+        event.listen(e, "before_cursor_execute", _check)
+    try:
+        yield problems
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", _check)
+    assert not problems, "\n".join(problems)